@@ -0,0 +1,381 @@
+import asyncio
+import hashlib
+import inspect
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import wraps
+from time import monotonic
+from urllib.parse import urlencode
+
+import orjson
+from fastapi_cache import FastAPICache
+from fastapi_cache.coder import Coder
+from fastapi_cache.types import Backend
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse, Response
+
+from config import (CACHE_L1_MAX_ENTRIES, CACHE_L1_TTL,
+                    CACHE_POPULAR_FLUSH_INTERVAL, CACHE_SINGLE_FLIGHT_TIMEOUT,
+                    CACHE_VERSION_TTL, CACHE_WARMUP_TRACKED, REDIS_URL)
+from metrics import REGISTRY, Counter, Gauge
+
+# Ключ Redis с версией данных: парсер увеличивает её после каждой загрузки в БД
+DATA_VERSION_KEY = "spimex:data_version"
+
+# Отсортированное множество Redis: адрес кэшируемого запроса API -> число обращений
+POPULAR_REQUESTS_KEY = "spimex:popular_requests"
+
+
+async def get_data_version(redis) -> int:
+    """
+    Возвращает текущую версию данных (0, если загрузок ещё не было).
+    """
+    return int(await redis.get(DATA_VERSION_KEY) or 0)
+
+
+async def bump_data_version(redis_url=REDIS_URL) -> int:
+    """
+    Увеличивает версию данных, после чего все закэшированные ответы API устаревают.
+
+    Returns:
+        int: Новая версия данных.
+    """
+    redis = aioredis.from_url(redis_url)
+    try:
+        return await redis.incr(DATA_VERSION_KEY)
+    finally:
+        await redis.aclose()
+
+
+def request_url(request):
+    """
+    Возвращает адрес запроса с отсортированными параметрами (как в versioned_key_builder),
+    поэтому запросы, отличающиеся только порядком параметров, считаются одним.
+    """
+    params = sorted(request.query_params.multi_items())
+    return f"{request.url.path}?{urlencode(params)}" if params else request.url.path
+
+
+async def popular_requests(limit, redis_url=REDIS_URL, tracked=CACHE_WARMUP_TRACKED):
+    """
+    Возвращает `limit` самых частых адресов кэшируемых запросов API (от частых к редким).
+
+    Заодно удаляет из учёта всё, кроме `tracked` самых частых адресов,
+    чтобы множество не росло без ограничения.
+    """
+    redis = aioredis.from_url(redis_url)
+    try:
+        await redis.zremrangebyrank(POPULAR_REQUESTS_KEY, 0, -tracked - 1)
+        urls = await redis.zrevrange(POPULAR_REQUESTS_KEY, 0, limit - 1)
+    finally:
+        await redis.aclose()
+    return [url.decode() for url in urls]
+
+
+class PopularRequests:
+    """
+    Счётчики обращений к адресам кэшируемых запросов API в текущем процессе.
+
+    Счётчики копятся в памяти и переносятся в Redis (POPULAR_REQUESTS_KEY) не чаще
+    раза в `flush_interval` секунд, поэтому учёт не добавляет обращений к Redis
+    в каждый запрос. По ним парсер прогревает кэш после загрузки новых данных.
+    """
+
+    def __init__(self, flush_interval=CACHE_POPULAR_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.counts = {}  # адрес -> обращений с последнего переноса
+        self.flushed_at = monotonic()
+        self.flushing = None  # задача переноса счётчиков в Redis
+
+    def record(self, url, redis=None):
+        """
+        Учитывает обращение к адресу и, если пора, запускает перенос счётчиков в Redis.
+        """
+        self.counts[url] = self.counts.get(url, 0) + 1
+        if (
+            redis is not None
+            and self.flushing is None
+            and monotonic() - self.flushed_at >= self.flush_interval
+        ):
+            self.flushing = asyncio.create_task(self.flush(redis))
+
+    async def flush(self, redis):
+        """
+        Переносит накопленные счётчики в Redis.
+        """
+        counts, self.counts = self.counts, {}
+        self.flushed_at = monotonic()
+        try:
+            if counts:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for url, count in counts.items():
+                        pipe.zincrby(POPULAR_REQUESTS_KEY, count, url)
+                    await pipe.execute()
+        except RedisError as e:
+            print(f"Не удалось сохранить счётчики запросов в Redis: {e}")
+        finally:
+            self.flushing = None
+
+
+class ORJsonCoder(Coder):
+    """
+    Кодировщик fastapi-cache для эндпоинтов, возвращающих готовый JSON-ответ.
+
+    В кэш попадает тело ответа как есть, а при попадании оно отдаётся клиенту
+    без разбора и повторной сериализации.
+    """
+
+    @classmethod
+    def encode(cls, value):
+        if isinstance(value, JSONResponse):
+            return value.body
+        return orjson.dumps(value)
+
+    @classmethod
+    def decode(cls, value):
+        return orjson.loads(value)
+
+    @classmethod
+    def decode_as_type(cls, value, *, type_):
+        return Response(content=value, media_type="application/json")
+
+
+def with_cache_headers(endpoint):
+    """
+    Переносит заголовки fastapi-cache в ответ эндпоинта, обёрнутого декоратором cache().
+
+    fastapi-cache записывает Cache-Control, ETag и X-FastAPI-Cache во внедрённый
+    объект Response, а FastAPI его не использует, если эндпоинт вернул готовый ответ
+    (ORJSONResponse или Response из ORJsonCoder.decode_as_type). Без переноса
+    клиенты не получают ETag и не могут получить ответ 304 Not Modified.
+    """
+    names = [
+        parameter.name
+        for parameter in inspect.signature(endpoint).parameters.values()
+        if isinstance(parameter.annotation, type)
+        and issubclass(parameter.annotation, Response)
+    ]
+    if not names:
+        # эндпоинт не обёрнут cache() (например, кэширование отключено в тестах)
+        return endpoint
+
+    @wraps(endpoint)
+    async def inner(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        response = kwargs.get(names[0])
+        if (
+            isinstance(result, Response)
+            and response is not None
+            and result is not response
+        ):
+            result.headers.update(response.headers)
+        return result
+
+    return inner
+
+
+@dataclass
+class CacheStats:
+    """
+    Счётчики обращений к уровням кэша в текущем процессе.
+    """
+
+    l1_hits: int = 0  # ответов из памяти процесса
+    l1_misses: int = 0
+    l2_hits: int = 0  # ответов из Redis
+    l2_misses: int = 0
+    coalesced: int = 0  # запросов, дождавшихся ответа, вычисленного другим запросом
+
+    def as_dict(self):
+        """
+        Возвращает счётчики в виде словаря.
+        """
+        return asdict(self)
+
+
+class LayeredBackend(Backend):
+    """
+    Двухуровневый бэкенд fastapi-cache: LRU-кэш с TTL в памяти процесса (L1) перед Redis (L2).
+
+    При промахе обоих уровней первый запрос по ключу вычисляет ответ, а одновременные
+    запросы по тому же ключу ждут его результата (single-flight) вместо обращения к БД.
+    Если первый запрос завершился, не сохранив ответ (например, с ошибкой), ожидающие
+    запросы вычисляют ответ сами. Запрос, не дождавшийся ответа за `wait_timeout` секунд,
+    вычисляет ответ сам, а остальные продолжают ждать первый запрос.
+    Версия данных (см. versioned_key_builder) тоже кэшируется в процессе на `version_ttl` секунд.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_entries=CACHE_L1_MAX_ENTRIES,
+        ttl=CACHE_L1_TTL,
+        version_ttl=CACHE_VERSION_TTL,
+        wait_timeout=CACHE_SINGLE_FLIGHT_TIMEOUT,
+    ):
+        self.backend = backend
+        self.redis = getattr(backend, "redis", None)
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.wait_timeout = wait_timeout
+        self.entries = OrderedDict()  # ключ -> (момент истечения, значение)
+        self.inflight = {}  # ключ -> Future с (ttl, значение) вычисляемого ответа
+        self.version = (0.0, 0)  # (момент истечения, версия данных)
+        self.stats = CacheStats()
+
+    def _get_local(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        ttl = expires_at - monotonic()
+        if ttl <= 0:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return int(ttl), value
+
+    def _set_local(self, key, value, expire):
+        ttl = min(self.ttl, expire) if expire and expire > 0 else self.ttl
+        self.entries[key] = (monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _resolve(self, key, future, result):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        if not future.done():
+            future.set_result(result)
+
+    async def data_version(self):
+        """
+        Возвращает версию данных, запрашивая её из Redis не чаще раза в `version_ttl` секунд.
+        """
+        expires_at, version = self.version
+        if expires_at <= monotonic():
+            version = await get_data_version(self.redis)
+            self.version = (monotonic() + self.version_ttl, version)
+        return version
+
+    async def get_with_ttl(self, key):
+        local = self._get_local(key)
+        if local is not None:
+            self.stats.l1_hits += 1
+            return local
+        self.stats.l1_misses += 1
+
+        future = self.inflight.get(key)
+        if future is not None:
+            try:
+                ttl, value = await asyncio.wait_for(
+                    asyncio.shield(future), self.wait_timeout
+                )
+            except asyncio.TimeoutError:
+                # промах только для этого запроса: остальные продолжают ждать первый
+                return 0, None
+            if value is not None:
+                self.stats.coalesced += 1
+            return ttl, value
+
+        # текущий запрос вычисляет ответ; если он завершится, не вызвав set,
+        # ожидающие запросы получат промах и вычислят ответ сами
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        task = asyncio.current_task()
+        if task is not None:
+            task.add_done_callback(lambda _: self._resolve(key, future, (0, None)))
+
+        try:
+            ttl, value = await self.backend.get_with_ttl(key)
+        except Exception:
+            self.stats.l2_misses += 1
+            raise
+        if value is None:
+            self.stats.l2_misses += 1
+            return ttl, value
+
+        self.stats.l2_hits += 1
+        self._set_local(key, value, ttl)
+        self._resolve(key, future, (ttl, value))
+        return ttl, value
+
+    async def get(self, key):
+        local = self._get_local(key)
+        if local is not None:
+            return local[1]
+        return await self.backend.get(key)
+
+    async def set(self, key, value, expire=None):
+        self._set_local(key, value, expire)
+        future = self.inflight.get(key)
+        if future is not None:
+            self._resolve(key, future, (expire or int(self.ttl), value))
+        await self.backend.set(key, value, expire)
+
+    async def clear(self, namespace=None, key=None):
+        if namespace:
+            for cached_key in [k for k in self.entries if k.startswith(namespace)]:
+                del self.entries[cached_key]
+        elif key:
+            self.entries.pop(key, None)
+        return await self.backend.clear(namespace, key)
+
+
+async def versioned_key_builder(
+    func, namespace="", *, request=None, response=None, args=(), kwargs=None
+):
+    """
+    Строит ключ кэша из версии данных, эндпоинта и параметров запроса.
+
+    Ответы, закэшированные до загрузки новых данных, остаются под ключами старой
+    версии и больше не читаются, а истекают сами. Параметры запроса сортируются,
+    поэтому их порядок в URL не влияет на ключ.
+
+    Returns:
+        str: Ключ вида `<namespace>:v<версия>:<модуль>:<функция>:<хеш параметров>`.
+    """
+    backend = FastAPICache.get_backend()
+    if isinstance(backend, LayeredBackend):
+        version = await backend.data_version()
+    else:
+        version = await get_data_version(backend.redis)
+    params = sorted(request.query_params.multi_items()) if request else []
+    digest = hashlib.md5(str(params).encode()).hexdigest()
+    return f"{namespace}:v{version}:{func.__module__}:{func.__name__}:{digest}"
+
+
+def cache_metrics():
+    """
+    Сборщик метрик: обращения к уровням кэша и доля попаданий в текущем процессе.
+    """
+    try:
+        backend = FastAPICache.get_backend()
+    except AssertionError:
+        return []
+    stats = getattr(backend, "stats", None)
+    if stats is None:
+        return []
+
+    requests = Counter("api_cache_requests_total", "Обращения к кэшу API по уровням")
+    for layer in ("l1", "l2"):
+        requests.inc(getattr(stats, f"{layer}_hits"), layer=layer, result="hit")
+        requests.inc(getattr(stats, f"{layer}_misses"), layer=layer, result="miss")
+    coalesced = Counter(
+        "api_cache_coalesced_total", "Запросы, дождавшиеся ответа другого запроса"
+    )
+    coalesced.inc(stats.coalesced)
+
+    # Ответ не вычислялся, если он найден в L1, в Redis или получен от другого запроса
+    lookups = stats.l1_hits + stats.l1_misses
+    hits = stats.l1_hits + stats.l2_hits + stats.coalesced
+    hit_ratio = Gauge(
+        "api_cache_hit_ratio", "Доля ответов API, отданных без запроса к БД"
+    )
+    hit_ratio.set(round(hits / lookups, 4) if lookups else 0.0)
+    return [requests, coalesced, hit_ratio]
+
+
+REGISTRY.add_collector(cache_metrics)
@@ -0,0 +1,131 @@
+import csv
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # выгрузка в Parquet доступна только с установленным pyarrow
+    pa = pq = None
+
+from app.services import TRADING_COLUMNS
+
+# Имена столбцов выгрузки в порядке TRADING_COLUMNS
+EXPORT_COLUMNS = tuple(column.key for column in TRADING_COLUMNS)
+
+# Форматы выгрузки: тип содержимого и расширение файла
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available():
+    """
+    Проверяет, что установлен pyarrow и доступна выгрузка в Parquet.
+    """
+    return pq is not None
+
+
+async def csv_chunks(partitions):
+    """
+    Кодирует пачки строк торгов в CSV (первой отдаётся строка заголовков).
+
+    Args:
+        partitions (AsyncIterator[list[Row]]): Пачки строк из серверного курсора.
+
+    Yields:
+        bytes: CSV-текст очередной пачки в UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in partitions:
+        writer.writerows(partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class ChunkSink:
+    """
+    Файлоподобный приёмник для ParquetWriter, который отдаёт записанные байты частями.
+
+    Хранит только байты, записанные после последнего вызова `drain`,
+    а позицию в файле считает целиком — она нужна для смещений в метаданных Parquet.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """
+        Возвращает байты, записанные с прошлого вызова, и освобождает их.
+        """
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_schema():
+    """
+    Схема Parquet-файла выгрузки (типы соответствуют столбцам spimex_trading_results).
+    """
+    text_columns = (
+        "exchange_product_id",
+        "exchange_product_name",
+        "oil_id",
+        "delivery_basis_id",
+        "delivery_basis_name",
+        "delivery_type_id",
+    )
+    return pa.schema(
+        [("id", pa.int64())]
+        + [(name, pa.string()) for name in text_columns]
+        + [(name, pa.int64()) for name in ("volume", "total", "count")]
+        + [("date", pa.date32())]
+    )
+
+
+async def parquet_chunks(partitions):
+    """
+    Кодирует пачки строк торгов в Parquet: каждая пачка записывается отдельной группой строк.
+
+    Args:
+        partitions (AsyncIterator[list[Row]]): Пачки строк из серверного курсора.
+
+    Yields:
+        bytes: Очередная часть Parquet-файла (последняя содержит метаданные).
+    """
+    schema = parquet_schema()
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        async for partition in partitions:
+            columns = list(zip(*partition)) or [[] for _ in EXPORT_COLUMNS]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Кодировщики пачек строк по форматам выгрузки
+EXPORT_ENCODERS = {"csv": csv_chunks, "parquet": parquet_chunks}
@@ -1,21 +1,89 @@
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from time import perf_counter
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from redis import asyncio as aioredis
+from starlette.responses import PlainTextResponse
 
-from app.trading_router import router
+from app.cache import (LayeredBackend, ORJsonCoder, PopularRequests,
+                       request_url, versioned_key_builder)
+from app.trading_router import CACHED_ROUTES, router
+from config import CACHE_EXPIRE, REDIS_URL
+from db.database import engine, pool_status, read_engine
+from metrics import REGISTRY
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "api_request_duration_seconds", "Время обработки запросов API по маршрутам"
+)
+POPULAR_REQUESTS = PopularRequests()
 
 
 @asynccontextmanager
-async def lifespan(_: FastAPI) -> AsyncIterator[None]:
-    redis = aioredis.from_url("redis://localhost")
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+async def lifespan(application: FastAPI) -> AsyncIterator[None]:
+    redis = aioredis.from_url(REDIS_URL)
+    FastAPICache.init(
+        LayeredBackend(RedisBackend(redis)),
+        prefix="fastapi-cache",
+        expire=CACHE_EXPIRE,
+        coder=ORJsonCoder,
+        key_builder=versioned_key_builder,
+    )
+    application.state.redis = redis
     yield
+    await POPULAR_REQUESTS.flush(redis)
+    await read_engine.dispose()
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
+
+
+@app.middleware("http")
+async def measure_request(request: Request, call_next):
+    """
+    Замеряет время обработки запроса по шаблону маршрута (а не по конкретному пути)
+    и учитывает обращения к кэшируемым маршрутам для прогрева кэша.
+    """
+    start = perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(
+        perf_counter() - start,
+        method=request.method,
+        route=route,
+        status=response.status_code,
+    )
+    if route in CACHED_ROUTES and response.status_code == 200:
+        POPULAR_REQUESTS.record(
+            request_url(request), getattr(request.app.state, "redis", None)
+        )
+    return response
+
+
+@app.get("/cache/stats", tags=["cache"])
+async def get_cache_stats():
+    """
+    Счётчики попаданий и промахов кэша по уровням (память процесса и Redis) в текущем процессе.
+    """
+    return FastAPICache.get_backend().stats.as_dict()
+
+
+@app.get("/db/pool", tags=["db"])
+async def get_pool_status():
+    """
+    Размер, загрузка и время ожидания соединений пулов движков записи и чтения в текущем процессе.
+    """
+    return pool_status()
+
+
+@app.get("/metrics", tags=["metrics"], include_in_schema=False)
+async def get_metrics():
+    """
+    Метрики текущего процесса в текстовом формате Prometheus.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,17 +1,251 @@
-from datetime import datetime, timedelta
+import base64
+import binascii
+from datetime import date
 
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import (BigInteger, Date, and_, func, literal_column, or_,
+                        select, true, tuple_)
 
-def seconds_until_14_11():
+from app.schema import TradingFilter
+from db.model import (SpimexDailyRollup, SpimexDeliveryBasis, SpimexProduct,
+                      SpimexTradingDay, SpimexTradingResults)
+
+# Столбцы торгов, которые отдают эндпоинты чтения (без служебных отметок времени);
+# инструмент и базис поставки берутся из таблиц измерений
+TRADING_COLUMNS = (
+    SpimexTradingResults.id,
+    SpimexProduct.exchange_product_id,
+    SpimexProduct.exchange_product_name,
+    SpimexProduct.oil_id,
+    SpimexProduct.delivery_basis_id,
+    SpimexDeliveryBasis.delivery_basis_name,
+    SpimexProduct.delivery_type_id,
+    SpimexTradingResults.volume,
+    SpimexTradingResults.total,
+    SpimexTradingResults.count,
+    SpimexTradingResults.date,
+)
+
+
+def rows_response(rows):
+    """
+    Сериализует строки результата запроса в JSON-ответ через orjson.
+
+    Строки уже содержат только нужные столбцы, поэтому ответ собирается
+    без ORM-объектов и без общего кодировщика FastAPI.
+
+    Args:
+        rows (Iterable[Row]): Строки результата запроса.
+
+    Returns:
+        ORJSONResponse: Список объектов `{столбец: значение}`.
+    """
+    return ORJSONResponse([row._asdict() for row in rows])
+
+
+def trading_select():
+    """
+    Запрос столбцов TRADING_COLUMNS: строки торгов вместе с инструментом и базисом поставки.
+
+    Таблицы измерений малы (тысячи строк), поэтому соединение с ними почти
+    не добавляет работы к чтению строк торгов. Базис поставки присоединяется
+    внешним соединением: у инструмента базиса может не быть (или он не записан
+    в spimex_delivery_bases), и такая строка торгов отдаётся с пустым названием базиса.
+
+    Returns:
+        Select: Запрос без условий и сортировки.
     """
-    Возвращает количество секунд до следующего наступления 14:11 по локальному времени.
+    return (
+        select(*TRADING_COLUMNS)
+        .join(SpimexProduct, SpimexProduct.id == SpimexTradingResults.product_key)
+        .join(
+            SpimexDeliveryBasis,
+            SpimexDeliveryBasis.delivery_basis_id == SpimexProduct.delivery_basis_id,
+            isouter=True,
+        )
+    )
 
-    Если текущее время уже позже 14:11, возвращается число секунд до 14:11 следующего дня.
+
+def apply_trading_filter(query, filters: TradingFilter):
+    """
+    Добавляет к запросу условия по `oil_id`, `delivery_type_id` и `delivery_basis_id`, если они указаны.
+
+    Args:
+        query (Select): Исходный запрос.
+        filters (TradingFilter): Параметры фильтрации.
 
     Returns:
-        int: Количество секунд до следующего 14:11.
+        Select: Запрос с добавленными условиями.
+    """
+    if filters.oil_id:
+        query = query.where(SpimexProduct.oil_id == filters.oil_id)
+
+    if filters.delivery_type_id:
+        query = query.where(SpimexProduct.delivery_type_id == filters.delivery_type_id)
+
+    if filters.delivery_basis_id:
+        query = query.where(
+            SpimexProduct.delivery_basis_id == filters.delivery_basis_id
+        )
+
+    return query
+
+
+def last_trading_dates_query(limit: int):
+    """
+    Запрос последних дат торгов (по убыванию) из таблицы торговых дней.
+
+    Таблица spimex_trading_days обновляется при загрузке, а даты читаются
+    по первичному ключу, поэтому время ответа не зависит от объёма торгов.
+    """
+    return (
+        select(SpimexTradingDay.date)
+        .order_by(SpimexTradingDay.date.desc())
+        .limit(limit)
+    )
+
+
+def dynamics_query(start_date: date, end_date: date, filters: TradingFilter):
+    """
+    Запрос торгов за период с фильтрацией, отсортированных по дате.
     """
-    now = datetime.now()
-    target = now.replace(hour=14, minute=11, second=0, microsecond=0)
-    if now >= target:
-        target += timedelta(days=1)
-    return int((target - now).total_seconds())
+    query = trading_select().where(
+        SpimexTradingResults.date.between(start_date, end_date)
+    )
+    return apply_trading_filter(query, filters).order_by(SpimexTradingResults.date)
+
+
+def encode_cursor(trading):
+    """
+    Возвращает курсор страницы — закодированную пару (дата, id) последней строки.
+    """
+    raw = f"{trading.date.isoformat()}:{trading.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Разбирает курсор страницы в пару (дата, id).
+
+    Raises:
+        ValueError: Если курсор повреждён.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        trading_date, trading_id = raw.split(":")
+        return date.fromisoformat(trading_date), int(trading_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"некорректный курсор: {cursor!r}") from e
+
+
+def dynamics_page_query(
+    start_date: date,
+    end_date: date,
+    filters: TradingFilter,
+    limit: int,
+    after: tuple[date, int] | None = None,
+):
+    """
+    Запрос страницы торгов за период, отсортированных по (дата, id).
+
+    Следующая страница начинается сразу после строки `after` (keyset-пагинация),
+    поэтому запрос не перебирает пропущенные строки, как OFFSET.
+    Условие `date >= after_date` позволяет использовать любой индекс с датой.
+    """
+    query = trading_select().where(
+        SpimexTradingResults.date.between(start_date, end_date)
+    )
+    if after is not None:
+        after_date, after_id = after
+        query = query.where(
+            and_(
+                SpimexTradingResults.date >= after_date,
+                or_(
+                    SpimexTradingResults.date > after_date,
+                    SpimexTradingResults.id > after_id,
+                ),
+            )
+        )
+    query = apply_trading_filter(query, filters)
+    return query.order_by(SpimexTradingResults.date, SpimexTradingResults.id).limit(
+        limit
+    )
+
+
+def trading_results_query(filters: TradingFilter, limit: int):
+    """
+    Запрос последних торгов с фильтрацией, отсортированных по убыванию даты.
+
+    С фильтром сначала для каждого подходящего инструмента берутся его последние
+    `limit` дат по ключу (инструмент, дата), а из них — общие последние `limit` строк:
+    иначе для редкого инструмента планировщик читает индекс по дате с конца,
+    пока не наберёт `limit` подходящих строк.
+    """
+    query = trading_select()
+    if filters.oil_id or filters.delivery_type_id or filters.delivery_basis_id:
+        products = apply_trading_filter(select(SpimexProduct.id), filters).subquery()
+        latest = (
+            select(SpimexTradingResults.date)
+            .where(SpimexTradingResults.product_key == products.c.id)
+            .order_by(SpimexTradingResults.date.desc())
+            .limit(limit)
+            .lateral()
+        )
+        keys = select(products.c.id, latest.c.date).join(latest, true())
+        query = query.where(
+            tuple_(SpimexTradingResults.product_key, SpimexTradingResults.date).in_(
+                keys
+            )
+        )
+    return query.order_by(SpimexTradingResults.date.desc()).limit(limit)
+
+
+def aggregates_query(
+    start_date: date,
+    end_date: date,
+    period: str,
+    dimension: str,
+    value: str | None = None,
+):
+    """
+    Запрос итогов торгов (объём, сумма, число договоров) по периодам и измерению.
+
+    Итоги считаются по таблице дневных итогов spimex_daily_rollups, а не по строкам торгов.
+    Недели и месяцы на краях диапазона учитывают только дни внутри него.
+
+    Args:
+        start_date (date): Начальная дата (включительно).
+        end_date (date): Конечная дата (включительно).
+        period (str): Период группировки: "day", "week" или "month".
+        dimension (str): Измерение: "oil_id" или "delivery_basis_id".
+        value (str | None): Значение измерения для отбора одного вида топлива или базиса.
+
+    Returns:
+        Select: Запрос строк (period_start, <dimension>, volume, total, count).
+    """
+    if period == "day":
+        period_start = SpimexDailyRollup.date
+    else:
+        # период подставляется литералом: с параметром PostgreSQL не узнаёт
+        # одно и то же выражение в SELECT и GROUP BY
+        period_start = func.date_trunc(
+            literal_column(f"'{period}'"), SpimexDailyRollup.date
+        ).cast(Date)
+    period_start = period_start.label("period_start")
+
+    query = select(
+        period_start,
+        SpimexDailyRollup.value.label(dimension),
+        func.sum(SpimexDailyRollup.volume).cast(BigInteger).label("volume"),
+        func.sum(SpimexDailyRollup.total).cast(BigInteger).label("total"),
+        func.sum(SpimexDailyRollup.count).cast(BigInteger).label("count"),
+    ).where(
+        SpimexDailyRollup.dimension == dimension,
+        SpimexDailyRollup.date.between(start_date, end_date),
+    )
+    if value:
+        query = query.where(SpimexDailyRollup.value == value)
+
+    return query.group_by(period_start, SpimexDailyRollup.value).order_by(
+        period_start, SpimexDailyRollup.value
+    )
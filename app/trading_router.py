@@ -1,21 +1,39 @@
 from datetime import date
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi_cache.decorator import cache
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.cache import with_cache_headers
+from app.export import EXPORT_ENCODERS, EXPORT_FORMATS, parquet_available
 from app.schema import TradingFilter
-from app.services import seconds_until_14_11
-from db.db_depends import get_db
-from db.model import SpimexTradingResults
+from app.services import (aggregates_query, decode_cursor, dynamics_page_query,
+                          dynamics_query, encode_cursor,
+                          last_trading_dates_query, rows_response,
+                          trading_results_query)
+from config import API_EXPORT_BATCH_SIZE, API_STREAM_BATCH_SIZE
+from db.db_depends import get_db, get_session_maker
 
 router = APIRouter(prefix="/tradings", tags=["trading"])
 
+# Маршруты с кэшируемыми ответами: обращения к ним учитываются для прогрева кэша
+CACHED_ROUTES = frozenset(
+    {
+        "/tradings/last-trading-dates",
+        "/tradings/dynamics",
+        "/tradings/dynamics/page",
+        "/tradings/trading-results",
+        "/tradings/aggregates",
+    }
+)
+
 
 @router.get("/last-trading-dates")
-@cache(expire=seconds_until_14_11())
+@with_cache_headers
+@cache()
 async def get_last_trading_dates(
     db: Annotated[AsyncSession, Depends(get_db)], limit: int = Query(10, ge=1, le=100)
 ):
@@ -23,20 +41,16 @@ async def get_last_trading_dates(
     Получение списка последних торговых дат.
 
     Возвращает уникальные даты торгов, отсортированные по убыванию, с ограничением по количеству.
+    Даты читаются из таблицы торговых дней, которую обновляет парсер при загрузке.
 
     Args:
         db (AsyncSession): Асинхронная сессия для работы с базой данных.
         limit (int): Максимальное количество дат в ответе (от 1 до 100).
 
     Returns:
-        List[date]: Список последних уникальных дат торгов.
+        ORJSONResponse: Список последних уникальных дат торгов (от новых к старым).
     """
-    result = await db.scalars(
-        select(SpimexTradingResults.date)
-        .distinct()
-        .order_by(SpimexTradingResults.date.desc())
-        .limit(limit)
-    )
+    result = await db.scalars(last_trading_dates_query(limit))
 
     if result is None:
         raise HTTPException(
@@ -44,11 +58,12 @@ async def get_last_trading_dates(
             detail="Nothing found for your request",
         )
 
-    return {trading_date for trading_date in result.all()}
+    return ORJSONResponse(result.all())
 
 
 @router.get("/dynamics")
-@cache(expire=seconds_until_14_11())
+@with_cache_headers
+@cache()
 async def get_dynamics(
     db: Annotated[AsyncSession, Depends(get_db)],
     start_date: date,
@@ -68,38 +83,155 @@ async def get_dynamics(
         filters (TradingFilter): Дополнительные параметры фильтрации по id продукта, типу и базе доставки.
 
     Returns:
-        List[SpimexTradingResults]: Список торгов, соответствующих условиям фильтрации.
+        ORJSONResponse: Список торгов (только нужные столбцы), соответствующих условиям фильтрации.
     """
-    query = select(SpimexTradingResults).where(
-        SpimexTradingResults.date.between(start_date, end_date)
+    result = await db.execute(dynamics_query(start_date, end_date, filters))
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nothing found for your request",
+        )
+
+    return rows_response(result)
+
+
+@router.get("/dynamics/page")
+@with_cache_headers
+@cache()
+async def get_dynamics_page(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    start_date: date,
+    end_date: date,
+    filters: TradingFilter = Depends(),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Получение одной страницы торгов за заданный период с возможной фильтрацией по параметрам.
+
+    Торги отсортированы по дате и id. Страницы выбираются по курсору (keyset-пагинация),
+    поэтому время ответа не зависит ни от длины периода, ни от номера страницы.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        start_date (date): Начальная дата фильтрации (включительно).
+        end_date (date): Конечная дата фильтрации (включительно).
+        filters (TradingFilter): Дополнительные параметры фильтрации по id продукта, типу и базе доставки.
+        cursor (Optional[str]): Значение `next_cursor` из предыдущей страницы (для первой страницы не передаётся).
+        limit (int): Максимальное количество записей на странице (от 1 до 1000).
+
+    Returns:
+        dict: Торги страницы (`items`) и курсор следующей страницы (`next_cursor`, None для последней).
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    query = dynamics_page_query(start_date, end_date, filters, limit + 1, after)
+    items = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1])
+
+    return ORJSONResponse(
+        {"items": [row._asdict() for row in items], "next_cursor": next_cursor}
     )
 
-    if filters.oil_id:
-        query = query.where(SpimexTradingResults.oil_id == filters.oil_id)
 
-    if filters.delivery_type_id:
-        query = query.where(
-            SpimexTradingResults.delivery_type_id == filters.delivery_type_id
-        )
+@router.get("/dynamics/stream")
+async def stream_dynamics(
+    session_maker: Annotated[async_sessionmaker, Depends(get_session_maker)],
+    start_date: date,
+    end_date: date,
+    filters: TradingFilter = Depends(),
+):
+    """
+    Потоковая выгрузка торгов за заданный период с возможной фильтрацией по параметрам.
 
-    if filters.delivery_basis_id:
-        query = query.where(
-            SpimexTradingResults.delivery_basis_id == filters.delivery_basis_id
-        )
+    Строки читаются из серверного курсора пачками по API_STREAM_BATCH_SIZE и сразу
+    отправляются клиенту в формате NDJSON (один JSON-объект на строку), поэтому
+    расход памяти и время до первого байта не зависят от длины периода.
+    Ответ не кэшируется.
 
-    result = await db.scalars(query.order_by(SpimexTradingResults.date))
+    Args:
+        session_maker (async_sessionmaker): Фабрика сессий базы данных.
+        start_date (date): Начальная дата фильтрации (включительно).
+        end_date (date): Конечная дата фильтрации (включительно).
+        filters (TradingFilter): Дополнительные параметры фильтрации по id продукта, типу и базе доставки.
 
-    if result is None:
+    Returns:
+        StreamingResponse: Поток торгов, отсортированных по дате, в формате NDJSON.
+    """
+    query = dynamics_page_query(start_date, end_date, filters, limit=None)
+
+    async def rows():
+        async with session_maker() as session:
+            result = await session.stream(
+                query.execution_options(yield_per=API_STREAM_BATCH_SIZE)
+            )
+            async for partition in result.partitions():
+                yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in partition)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@router.get("/export")
+async def export_tradings(
+    session_maker: Annotated[async_sessionmaker, Depends(get_session_maker)],
+    start_date: date,
+    end_date: date,
+    filters: TradingFilter = Depends(),
+    format: Literal["csv", "parquet"] = "csv",
+):
+    """
+    Выгрузка торгов за заданный период в файл CSV или Parquet с возможной фильтрацией по параметрам.
+
+    Строки читаются из серверного курсора пачками по API_EXPORT_BATCH_SIZE, и каждая пачка
+    сразу кодируется и отправляется клиенту (в Parquet — отдельной группой строк),
+    поэтому расход памяти не зависит от объёма выгрузки. Ответ не кэшируется.
+
+    Args:
+        session_maker (async_sessionmaker): Фабрика сессий базы данных.
+        start_date (date): Начальная дата фильтрации (включительно).
+        end_date (date): Конечная дата фильтрации (включительно).
+        filters (TradingFilter): Дополнительные параметры фильтрации по id продукта, типу и базе доставки.
+        format (str): Формат файла: `csv` или `parquet` (требует установленного pyarrow).
+
+    Returns:
+        StreamingResponse: Файл с торгами, отсортированными по дате и id.
+    """
+    if format == "parquet" and not parquet_available():
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nothing found for your request",
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet export requires pyarrow",
         )
 
-    return result.all()
+    query = dynamics_page_query(start_date, end_date, filters, limit=None)
+
+    async def partitions():
+        async with session_maker() as session:
+            result = await session.stream(
+                query.execution_options(yield_per=API_EXPORT_BATCH_SIZE)
+            )
+            async for partition in result.partitions():
+                yield partition
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"spimex_{start_date.isoformat()}_{end_date.isoformat()}.{extension}"
+    return StreamingResponse(
+        EXPORT_ENCODERS[format](partitions()),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/trading-results")
-@cache(expire=seconds_until_14_11())
+@with_cache_headers
+@cache()
 async def get_trading_results(
     db: Annotated[AsyncSession, Depends(get_db)],
     filters: TradingFilter = Depends(),
@@ -117,27 +249,9 @@ async def get_trading_results(
         limit (int): Максимальное количество записей в ответе (по умолчанию 10).
 
     Returns:
-        List[SpimexTradingResults]: Список объектов торгов, соответствующих фильтрам.
+        ORJSONResponse: Список торгов (только нужные столбцы), соответствующих фильтрам.
     """
-
-    query = select(SpimexTradingResults)
-
-    if filters.oil_id:
-        query = query.where(SpimexTradingResults.oil_id == filters.oil_id)
-
-    if filters.delivery_type_id:
-        query = query.where(
-            SpimexTradingResults.delivery_type_id == filters.delivery_type_id
-        )
-
-    if filters.delivery_basis_id:
-        query = query.where(
-            SpimexTradingResults.delivery_basis_id == filters.delivery_basis_id
-        )
-
-    result = await db.scalars(
-        query.order_by(SpimexTradingResults.date.desc()).limit(limit)
-    )
+    result = await db.execute(trading_results_query(filters, limit))
 
     if result is None:
         raise HTTPException(
@@ -145,4 +259,40 @@ async def get_trading_results(
             detail="Nothing found for your request",
         )
 
-    return result.all()
+    return rows_response(result)
+
+
+@router.get("/aggregates")
+@with_cache_headers
+@cache()
+async def get_aggregates(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    start_date: date,
+    end_date: date,
+    period: Literal["day", "week", "month"] = "day",
+    dimension: Literal["oil_id", "delivery_basis_id"] = "oil_id",
+    value: Optional[str] = None,
+):
+    """
+    Получение итогов торгов за период по дням, неделям или месяцам в разрезе вида топлива или базиса поставки.
+
+    Итоги берутся из таблицы дневных итогов, которую парсер обновляет после каждой загрузки,
+    поэтому ответ не требует чтения всех строк торгов за период.
+
+    Args:
+        db (AsyncSession): Асинхронная сессия базы данных.
+        start_date (date): Начальная дата (включительно).
+        end_date (date): Конечная дата (включительно).
+        period (str): Период группировки: `day`, `week` (с понедельника) или `month`.
+        dimension (str): Измерение: `oil_id` или `delivery_basis_id`.
+        value (Optional[str]): Значение измерения для отбора одного вида топлива или базиса.
+
+    Returns:
+        List[dict]: Итоги с полями `period_start`, `<dimension>`, `volume`, `total`, `count`.
+    """
+    query = aggregates_query(
+        start_date, end_date, period, dimension, value.upper() if value else None
+    )
+    result = await db.execute(query)
+
+    return rows_response(result)
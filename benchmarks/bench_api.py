@@ -0,0 +1,125 @@
+"""
+Сравнение скорости эндпоинта /tradings/dynamics на ответе из 10 тыс. строк:
+прежний способ (ORM-объекты и общий кодировщик FastAPI, JsonCoder в кэше)
+и текущий (выборка столбцов, orjson, ORJsonCoder).
+
+Пишет синтетические торги за даты 2100 года в БД из настроек (.env),
+выполняет запросы через ASGI без сети и затем удаляет строки.
+
+Запуск:
+    python -m benchmarks.bench_api --files 250 --rows 250 --requests 50
+"""
+
+import argparse
+import asyncio
+from datetime import date, timedelta
+from parser.db_writer import save_files
+from time import perf_counter
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.coder import JsonCoder
+from fastapi_cache.decorator import cache
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import LayeredBackend, ORJsonCoder
+from app.trading_router import router
+from benchmarks.bench_db_write import START_DATE, synthetic_files
+from db.database import async_session_maker, create_db
+from db.db_depends import get_db
+from db.model import SpimexTradingResults
+
+legacy_router = APIRouter(prefix="/legacy")
+
+
+@legacy_router.get("/dynamics")
+@cache()
+async def get_dynamics_legacy(
+    db: Annotated[AsyncSession, Depends(get_db)], start_date: date, end_date: date
+):
+    """
+    Прежняя реализация /tradings/dynamics: ORM-объекты целиком.
+    """
+    query = (
+        select(SpimexTradingResults)
+        .where(SpimexTradingResults.date.between(start_date, end_date))
+        .order_by(SpimexTradingResults.date)
+    )
+    return (await db.scalars(query)).all()
+
+
+def request_key_builder(func, namespace="", *, request=None, **kwargs):
+    """
+    Ключ кэша по адресу запроса (без версии данных из Redis).
+    """
+    return f"{namespace}:{func.__name__}:{request.url}"
+
+
+async def measure(client, url, params, requests):
+    """
+    Выполняет `requests` последовательных запросов и возвращает (запросов в секунду, строк в ответе).
+    """
+    response = await client.get(url, params=params)
+    rows = len(response.json())
+    start = perf_counter()
+    for _ in range(requests):
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+    return requests / (perf_counter() - start), rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=250)
+    parser.add_argument("--rows", type=int, default=250, help="строк в файле")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    await create_db()
+    async with async_session_maker() as session:
+        await save_files(synthetic_files(args.files, args.rows), session)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.include_router(legacy_router)
+    params = {
+        "start_date": START_DATE.isoformat(),
+        "end_date": (START_DATE + timedelta(days=args.files)).isoformat(),
+    }
+    variants = [
+        ("прежний", "/legacy/dynamics", JsonCoder),
+        ("текущий", "/tradings/dynamics", ORJsonCoder),
+    ]
+
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            for cached in (False, True):
+                for name, url, coder in variants:
+                    FastAPICache.reset()
+                    FastAPICache.init(
+                        LayeredBackend(InMemoryBackend()),
+                        coder=coder,
+                        key_builder=request_key_builder,
+                        enable=cached,
+                    )
+                    rps, rows = await measure(client, url, params, args.requests)
+                    mode = "из кэша" if cached else "без кэша"
+                    print(f"{name}, {mode}: {rows} строк, {rps:.1f} запросов/сек")
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(SpimexTradingResults).where(
+                    SpimexTradingResults.date >= START_DATE
+                )
+            )
+            await session.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Сравнение способов записи строк в БД: COPY через asyncpg и ORM.
+
+Пишет синтетические строки за даты 2100 года в БД из настроек (.env)
+и затем удаляет их.
+
+Запуск:
+    python -m benchmarks.bench_db_write --files 50 --rows 300
+"""
+
+import argparse
+import asyncio
+import random
+from datetime import date, timedelta
+from parser.db_writer import WRITERS, WriteStats, save_files
+
+from sqlalchemy import delete
+
+from benchmarks.synthetic_xls import BASES, PRODUCTS, report_filename
+from db.database import async_session_maker, create_db
+from db.model import SpimexTradingResults
+
+START_DATE = date(2100, 1, 1)
+
+
+def synthetic_files(files, rows):
+    """
+    Возвращает пары (путь к файлу, строки) в формате parse_file.
+    """
+    rng = random.Random(0)
+    result = []
+    for day in range(files):
+        path = report_filename(START_DATE + timedelta(days=day))
+        result.append(
+            (
+                path,
+                [
+                    (
+                        f"{rng.choice(PRODUCTS)[0]}{rng.choice(BASES)[0]}060F",
+                        rng.choice(PRODUCTS)[1],
+                        rng.choice(BASES)[1],
+                        60.0 * rng.randint(1, 10),
+                        3_000_000.0 * rng.randint(1, 10),
+                        float(rng.randint(1, 5)),
+                    )
+                    for _ in range(rows)
+                ],
+            )
+        )
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=300, help="строк в файле")
+    parser.add_argument("--batch", type=int, default=8, help="файлов в транзакции")
+    args = parser.parse_args()
+
+    await create_db()
+    files = synthetic_files(args.files, args.rows)
+    stats = WriteStats()
+
+    async with async_session_maker() as session:
+        for mode in WRITERS:
+            for i in range(0, len(files), args.batch):
+                await save_files(
+                    files[i : i + args.batch], session, mode=mode, stats=stats
+                )
+            await session.execute(
+                delete(SpimexTradingResults).where(
+                    SpimexTradingResults.date >= START_DATE
+                )
+            )
+            await session.commit()
+
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
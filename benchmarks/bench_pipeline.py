@@ -0,0 +1,217 @@
+"""
+Сквозной бенчмарк загрузки: синтетические XLS-файлы за год раздаются локальной
+заменой сайта Spimex, скачиваются URLManager, разбираются и записываются в БД
+через process_all_files_in_folder. Для каждого этапа выводится пропускная способность.
+
+БД берётся из настроек (.env) и должна быть отдельной (имя оканчивается на _bench
+или _test): строки за даты бенчмарка перед запуском и после него удаляются.
+
+Результаты можно сохранить в JSON и сравнить с результатом другого коммита:
+при падении пропускной способности этапа больше допуска код возврата — 1.
+
+Запуск:
+    python -m benchmarks.bench_pipeline --year 2023 --output bench.json
+    python -m benchmarks.bench_pipeline --year 2023 --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from parser.spimex_downloader import URLManager
+from parser.spimex_parser import parse_file, process_all_files_in_folder
+from time import perf_counter
+
+from sqlalchemy import delete, func, select
+
+from benchmarks.spimex_stub import start_server
+from benchmarks.synthetic_xls import generate_year
+from config import DB_NAME
+from db.database import async_session_maker, create_db
+from db.model import SpimexTradingResults
+from db.rollups import refresh_daily_rollups, refresh_trading_days
+
+# Основная метрика этапа, по которой сравниваются запуски
+STAGE_METRICS = {
+    "download": "files_per_sec",
+    "parse": "rows_per_sec",
+    "ingest": "rows_per_sec",
+}
+
+
+def git_commit():
+    """
+    Возвращает хеш текущего коммита (пустую строку вне git-репозитория).
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def clear_dates(start, end):
+    """
+    Удаляет строки торгов за диапазон дат и пересчитывает производные таблицы.
+    """
+    async with async_session_maker() as session:
+        dates = (
+            await session.scalars(
+                select(SpimexTradingResults.date)
+                .distinct()
+                .where(SpimexTradingResults.date.between(start, end))
+            )
+        ).all()
+        await session.execute(
+            delete(SpimexTradingResults).where(
+                SpimexTradingResults.date.between(start, end)
+            )
+        )
+        await refresh_daily_rollups(session, dates)
+        await refresh_trading_days(session, dates)
+        await session.commit()
+
+
+async def run(year, rows, page_size):
+    """
+    Выполняет все этапы и возвращает их результаты.
+    """
+    start, end = date(year, 1, 1), date(year, 12, 31)
+    await create_db()
+    await clear_dates(start, end)
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source")
+        tables = os.path.join(tmp, "tables")
+
+        started = perf_counter()
+        paths = generate_year(source, year, rows)
+        print(
+            f"Сгенерировано файлов: {len(paths)} за {perf_counter() - started:.1f} сек"
+        )
+
+        runner, url = await start_server(source, page_size)
+        try:
+            manager = URLManager(url=url, folder=tables)
+            started = perf_counter()
+            stats = await manager.download_xls_files()
+            seconds = perf_counter() - started
+        finally:
+            await runner.cleanup()
+        stages["download"] = {
+            "seconds": seconds,
+            "pages": manager.page_number,
+            "files": stats.files,
+            "bytes": stats.bytes,
+            "files_per_sec": stats.files / seconds,
+            "mb_per_sec": stats.bytes / seconds / 2**20,
+        }
+
+        downloaded = sorted(
+            os.path.join(tables, f) for f in os.listdir(tables) if f.endswith(".xls")
+        )
+        started = perf_counter()
+        parsed_rows = sum(len(parse_file(path)) for path in downloaded)
+        seconds = perf_counter() - started
+        stages["parse"] = {
+            "seconds": seconds,
+            "files": len(downloaded),
+            "rows": parsed_rows,
+            "files_per_sec": len(downloaded) / seconds,
+            "rows_per_sec": parsed_rows / seconds,
+        }
+
+        async with async_session_maker() as session:
+            started = perf_counter()
+            await process_all_files_in_folder(tables, session)
+            seconds = perf_counter() - started
+            saved_rows = await session.scalar(
+                select(func.count()).where(
+                    SpimexTradingResults.date.between(start, end)
+                )
+            )
+        stages["ingest"] = {
+            "seconds": seconds,
+            "files": len(downloaded),
+            "rows": saved_rows,
+            "files_per_sec": len(downloaded) / seconds,
+            "rows_per_sec": saved_rows / seconds,
+        }
+
+    await clear_dates(start, end)
+    return stages
+
+
+def compare(stages, baseline, tolerance):
+    """
+    Сравнивает пропускную способность этапов с сохранённым результатом.
+    :return: True, если ни один этап не стал медленнее больше чем на `tolerance`
+    """
+    ok = True
+    print(f"Сравнение с коммитом {baseline.get('commit') or '?'}:")
+    for stage, metric in STAGE_METRICS.items():
+        old = baseline["stages"].get(stage, {}).get(metric)
+        if not old:
+            continue
+        ratio = stages[stage][metric] / old
+        regression = ratio < 1 - tolerance
+        ok = ok and not regression
+        mark = "  РЕГРЕССИЯ" if regression else ""
+        print(f"  {stage}: {metric} x{ratio:.2f}{mark}")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--year", type=int, default=2023, help="год синтетических отчётов (2023-2026)"
+    )
+    parser.add_argument("--rows", type=int, default=400, help="строк в отчёте")
+    parser.add_argument("--page-size", type=int, default=10, help="ссылок на странице")
+    parser.add_argument("--output", help="сохранить результаты в JSON-файл")
+    parser.add_argument("--compare", help="JSON-файл с результатами для сравнения")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="допустимое замедление этапа"
+    )
+    args = parser.parse_args()
+
+    assert DB_NAME.endswith(("_bench", "_test")), "нужна отдельная БД для бенчмарка"
+
+    stages = await run(args.year, args.rows, args.page_size)
+    result = {
+        "commit": git_commit(),
+        "params": {"year": args.year, "rows": args.rows, "page_size": args.page_size},
+        "stages": stages,
+    }
+
+    for stage, values in stages.items():
+        summary = ", ".join(
+            f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}"
+            for key, value in values.items()
+        )
+        print(f"{stage}: {summary}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print("Параметры запусков различаются, сравнение неточно")
+        if not compare(stages, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Сравнение способов чтения XLS-файлов Spimex: исходного (formatting_info=True,
+просмотр всех ячеек) и быстрого (без форматирования, только нужные столбцы).
+
+Запуск:
+    python -m benchmarks.bench_reader --folder tables
+    python -m benchmarks.bench_reader --year 2023   # на синтетических файлах
+"""
+
+import argparse
+import os
+import tempfile
+from parser.spimex_parser import READERS
+from time import perf_counter
+
+from benchmarks.synthetic_xls import generate_year
+
+
+def run(paths, repeat):
+    """
+    Читает все файлы каждым способом и возвращает лучшее время по каждому.
+    """
+    timings = {}
+    results = {}
+    for name, reader in READERS.items():
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            results[name] = [reader(path) for path in paths]
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--folder", help="папка с XLS-файлами")
+    parser.add_argument(
+        "--year", type=int, default=2023, help="год синтетических файлов"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=400, help="строк в синтетическом файле"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.folder:
+        paths = sorted(
+            os.path.join(args.folder, f)
+            for f in os.listdir(args.folder)
+            if f.endswith(".xls")
+        )
+    else:
+        folder = os.path.join(tempfile.gettempdir(), f"spimex_bench_{args.year}")
+        paths = generate_year(folder, args.year, args.rows)
+
+    timings, results = run(paths, args.repeat)
+    rows = sum(len(r) for r in results["full"])
+
+    print(f"Файлов: {len(paths)}, строк: {rows}")
+    for name, elapsed in timings.items():
+        print(
+            f"{name:>5}: {elapsed:.2f} сек, "
+            f"{elapsed / len(paths) * 1000:.1f} мс/файл, {rows / elapsed:.0f} строк/сек"
+        )
+    print(f"Ускорение: x{timings['full'] / timings['fast']:.1f}")
+    print(f"Результаты совпадают: {results['full'] == results['fast']}")
+
+
+if __name__ == "__main__":
+    main()
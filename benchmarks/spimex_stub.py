@@ -0,0 +1,63 @@
+"""
+Локальная замена сайта Spimex для бенчмарков и тестов.
+
+Отдаёт постраничный список отчётов по пути из SPIMEX_URL (`?page=page-N`,
+новые отчёты первыми, пустая страница после последней) и сами XLS-файлы
+по ссылкам вида `/upload/reports/oil_xls/oil_xls_<дата и время>`.
+"""
+
+import os
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+from config import SPIMEX_URL
+
+# Ссылок на странице списка, как на сайте Spimex
+PAGE_SIZE = 10
+
+LISTING_PATH = urlparse(SPIMEX_URL).path
+REPORTS_PATH = "/upload/reports/oil_xls/"
+
+
+def create_app(folder, page_size=PAGE_SIZE):
+    """
+    Создаёт aiohttp-приложение, раздающее XLS-файлы из папки `folder`.
+    """
+    names = sorted(
+        (os.path.splitext(f)[0] for f in os.listdir(folder) if f.endswith(".xls")),
+        reverse=True,
+    )
+
+    async def listing(request):
+        page = request.query.get("page", "page-1").removeprefix("page-")
+        start = (int(page) - 1) * page_size
+        links = "".join(
+            f'<a href="{REPORTS_PATH}{name}?r=1">{name}</a>\n'
+            for name in names[start : start + page_size]
+        )
+        return web.Response(text=f"<html><body>{links}</body></html>")
+
+    async def report(request):
+        path = os.path.join(folder, request.match_info["name"] + ".xls")
+        if not os.path.exists(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    app = web.Application()
+    app.router.add_get(LISTING_PATH, listing)
+    app.router.add_get(REPORTS_PATH + "{name}", report)
+    return app
+
+
+async def start_server(folder, page_size=PAGE_SIZE):
+    """
+    Запускает сервер на свободном порту localhost.
+    :return: пара (AppRunner для остановки через cleanup(), адрес страницы списка)
+    """
+    runner = web.AppRunner(create_app(folder, page_size))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}{LISTING_PATH}"
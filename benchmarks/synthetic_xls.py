@@ -0,0 +1,178 @@
+import os
+import random
+from datetime import date, timedelta
+
+import xlwt
+
+from config import SPIMEX_TABLE_NAME
+
+# Заголовки столбцов таблицы в формате бюллетеня Spimex (столбцы A..O)
+HEADER = [
+    "",
+    "Код\nИнструмента",
+    "Наименование\nИнструмента",
+    "Базис\nпоставки",
+    "Объем\nДоговоров\nв единицах\nизмерения",
+    "Обьем\nДоговоров,\nруб.",
+    "Изменение рыночной\nцены к цене\nпредыдуего\nдня, руб.",
+    "Изменение рыночной\nцены к цене\nпредыдуего\nдня, %",
+    "Минимальная\nЦена\nДоговора,\nруб.",
+    "Средневзвешенная\nЦена\nДоговора,\nруб.",
+    "Максимальная\nЦена\nДоговора,\nруб.",
+    "Рыночная\nЦена\nДоговора,\nруб.",
+    "Цена в Заявках (за единицу\nизмерения)\nЛучшее\nпредложение",
+    "Лучший\nспрос",
+    "Количество\nДоговоров,\nшт.",
+]
+
+PRODUCTS = [
+    ("A592", "Бензин (АИ-92-К5)"),
+    ("A595", "Бензин (АИ-95-К5)"),
+    ("DSC5", "ДТ межсезонное, класс 0 (ДТ-Е-К5)"),
+    ("DTZ5", "ДТ зимнее, класс 2 (ДТ-З-К5)"),
+    ("MZT1", "Мазут топочный М-100"),
+    ("SPBT", "Смесь пропана и бутана технических (СПБТ)"),
+    ("TS1S", "Топливо для реактивных двигателей (ТС-1)"),
+]
+
+BASES = [
+    ("ANK", "Ангарск-группа станций"),
+    ("UFM", "Уфа-группа станций"),
+    ("NVY", "Новоярославская"),
+    ("KRS", "Кириши-группа станций"),
+    ("MOS", "Московский НПЗ"),
+    ("BIR", "Биклянь"),
+]
+
+TITLE_STYLE = xlwt.easyxf("font: bold on, height 240")
+HEADER_STYLE = xlwt.easyxf(
+    "font: bold on; align: wrap on, vert centre, horiz center; "
+    "borders: left thin, right thin, top thin, bottom thin; "
+    "pattern: pattern solid, fore_colour gray25"
+)
+CELL_STYLE = xlwt.easyxf("borders: left thin, right thin, top thin, bottom thin")
+NUMBER_STYLE = xlwt.easyxf(
+    "borders: left thin, right thin, top thin, bottom thin", num_format_str="#,##0"
+)
+
+
+def report_filename(trading_date):
+    """
+    Возвращает имя файла отчёта в формате Spimex для даты торгов.
+    """
+    return f"oil_xls_{trading_date:%Y%m%d}162000.xls"
+
+
+def write_section(sheet, row, unit, rng, rows):
+    """
+    Записывает одну таблицу бюллетеня (название, шапку, строки и "Итого").
+    :return: номер строки после таблицы
+    """
+    sheet.write(row, 1, unit, TITLE_STYLE)
+    row += 1
+    for col, title in enumerate(HEADER):
+        sheet.write(row, col, title, HEADER_STYLE)
+    row += 1
+
+    totals = [0, 0, 0]
+    for _ in range(rows):
+        oil_id, product = rng.choice(PRODUCTS)
+        basis_id, basis = rng.choice(BASES)
+        delivery_type = rng.choice("FJA")
+        count = rng.choice([0, 0, 1, 1, 2, 3, 5, 8])
+        price = rng.randint(30_000, 90_000)
+        volume = count * rng.choice([60, 120, 240, 500])
+        values = [
+            "",
+            f"{oil_id}{basis_id}{rng.randint(0, 999):03d}{delivery_type}",
+            f"{product}, {basis} (ст. отправления)",
+            basis,
+            volume,
+            volume * price,
+            rng.randint(-1_000, 1_000) if count else "",
+            round(rng.uniform(-3, 3), 2) if count else "",
+            price - rng.randint(0, 500) if count else "",
+            price if count else "",
+            price + rng.randint(0, 500) if count else "",
+            price if count else "",
+            price + rng.randint(0, 1_000),
+            price - rng.randint(0, 1_000),
+            count if count else "-",
+        ]
+        for col, value in enumerate(values):
+            if isinstance(value, (int, float)) and col >= 4:
+                sheet.write(row, col, value, NUMBER_STYLE)
+            else:
+                sheet.write(row, col, value, CELL_STYLE)
+        totals[0] += volume
+        totals[1] += volume * price
+        totals[2] += count
+        row += 1
+
+    sheet.write(row, 1, "Итого:", TITLE_STYLE)
+    sheet.write(row, 4, totals[0], NUMBER_STYLE)
+    sheet.write(row, 5, totals[1], NUMBER_STYLE)
+    sheet.write(row, 14, totals[2], NUMBER_STYLE)
+    return row + 3
+
+
+def write_report(path, trading_date, rows=400, seed=None):
+    """
+    Создаёт XLS-файл бюллетеня Spimex с реалистичной разметкой и оформлением.
+
+    Кроме основной таблицы (метрические тонны) в файле есть таблицы в других
+    единицах измерения, которые парсер должен пропускать.
+    :param path: путь к файлу
+    :param trading_date: дата торгов
+    :param rows: число строк основной таблицы
+    :param seed: зерно генератора случайных чисел
+    """
+    rng = random.Random(seed if seed is not None else trading_date.toordinal())
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("TRADE_SUMMARY")
+
+    sheet.write(
+        1, 1, "Бюллетень по итогам торгов в Секции «Нефтепродукты»", TITLE_STYLE
+    )
+    sheet.write(2, 1, "АО «Санкт-Петербургская Международная Товарно-сырьевая Биржа»")
+    sheet.write(3, 1, f"Дата торгов: {trading_date:%d.%m.%Y}")
+    sheet.write(4, 1, "Форма СЭТ-БТ")
+
+    row = write_section(sheet, 6, SPIMEX_TABLE_NAME, rng, rows)
+    row = write_section(sheet, row, "Единица измерения: Килограмм", rng, rows // 10)
+    write_section(sheet, row, "Единица измерения: Кубический метр", rng, rows // 20)
+
+    workbook.save(path)
+
+
+def trading_days(start, end):
+    """
+    Возвращает рабочие дни (пн-пт) в диапазоне дат включительно.
+    """
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def generate_reports(folder, start, end, rows=400):
+    """
+    Создаёт по одному отчёту на каждый торговый день диапазона (если его ещё нет).
+    :return: список путей к файлам
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for trading_date in trading_days(start, end):
+        path = os.path.join(folder, report_filename(trading_date))
+        if not os.path.exists(path):
+            write_report(path, trading_date, rows)
+        paths.append(path)
+    return paths
+
+
+def generate_year(folder, year, rows=400):
+    """
+    Создаёт отчёты за все торговые дни года.
+    """
+    return generate_reports(folder, date(year, 1, 1), date(year, 12, 31), rows)
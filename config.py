@@ -11,8 +11,88 @@ DB_PORT = os.environ.get("DB_PORT")
 DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
 
+# DataBase engines
+DB_REPLICA_HOST = os.environ.get("DB_REPLICA_HOST")  # пусто — чтение с основной БД
+DB_REPLICA_PORT = os.environ.get("DB_REPLICA_PORT") or DB_PORT
+# сколько секунд парсер ждёт, пока реплика применит загрузку, прежде чем обновить версию данных
+DB_REPLICA_WAIT_TIMEOUT = float(os.environ.get("DB_REPLICA_WAIT_TIMEOUT") or 300)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE") or 5)  # API (чтение)
+DB_WRITE_POOL_SIZE = int(os.environ.get("DB_WRITE_POOL_SIZE") or 2)  # парсер (запись)
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW") or 5)
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT") or 30)
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE") or 1800)
+# кэш подготовленных запросов asyncpg; 0 — для pgbouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE") or 100)
+
+# DataBase writes
+DB_WRITE_MODE = os.environ.get("DB_WRITE_MODE") or "copy"  # copy | orm
+DB_WRITE_BATCH_FILES = int(os.environ.get("DB_WRITE_BATCH_FILES") or 8)
+DB_CONFLICT_MODE = os.environ.get("DB_CONFLICT_MODE") or "upsert"  # upsert | replace
+DB_PARTITION_BY = os.environ.get("DB_PARTITION_BY") or ""  # "" | month | year
+# прежняя секция при повторной загрузке в режиме replace: truncate — удаляется, detach — остаётся
+# как <секция>_detached. Новые строки пишутся в промежуточную таблицу без блокировки чтения,
+# а DETACH/ATTACH в конце транзакции блокирует таблицу торгов (ACCESS EXCLUSIVE) только
+# на пересчёт дневных итогов и фиксацию. Другие загрузки в таблицу торгов ждут фиксации
+# повторной загрузки: она держит блокировку SHARE ROW EXCLUSIVE (см. db/partitions.py)
+DB_PARTITION_CLEAR = (
+    os.environ.get("DB_PARTITION_CLEAR") or "truncate"
+)  # truncate | detach
+
 
 # Spimex URL
 
 SPIMEX_URL = "https://spimex.com/markets/oil_products/trades/results/"
 SPIMEX_TABLE_NAME = "Единица измерения: Метрическая тонна"
+
+# Spimex discovery
+SPIMEX_PAGE_WINDOW = int(os.environ.get("SPIMEX_PAGE_WINDOW") or 8)
+SPIMEX_PAGE_CONCURRENCY = int(os.environ.get("SPIMEX_PAGE_CONCURRENCY") or 4)
+# отчёты за более ранние даты не загружаются (дата в формате ISO)
+SPIMEX_START_DATE = os.environ.get("SPIMEX_START_DATE") or "2023-01-01"
+
+# Spimex parser
+PARSER_WORKERS = int(os.environ.get("PARSER_WORKERS") or os.cpu_count() or 1)
+PARSER_QUEUE_SIZE = int(os.environ.get("PARSER_QUEUE_SIZE") or 2 * PARSER_WORKERS)
+PARSER_READER = os.environ.get("PARSER_READER") or "fast"  # fast | full
+# папка кэша разобранных файлов рядом с XLS-файлами (см. parser/parsed_cache.py)
+PARSED_CACHE_DIR = os.environ.get("PARSED_CACHE_DIR") or ".parsed"
+PARSER_REPORT_PATH = os.environ.get("PARSER_REPORT_PATH") or "tables/run_report.json"
+
+# Spimex daemon
+# местное время публикации итогов торгов на сайте Spimex (ЧЧ:ММ)
+SPIMEX_PUBLISH_TIME = os.environ.get("SPIMEX_PUBLISH_TIME") or "14:11"
+DAEMON_LEAD_MINUTES = int(os.environ.get("DAEMON_LEAD_MINUTES") or 10)  # до публикации
+DAEMON_WINDOW_MINUTES = int(os.environ.get("DAEMON_WINDOW_MINUTES") or 240)  # после
+DAEMON_POLL_INTERVAL = float(os.environ.get("DAEMON_POLL_INTERVAL") or 60)
+
+# Spimex sync manifest
+SYNC_MANIFEST_PATH = os.environ.get("SYNC_MANIFEST_PATH") or "tables/manifest.json"
+
+# Spimex downloads
+DOWNLOAD_MAX_CONCURRENCY = int(os.environ.get("DOWNLOAD_MAX_CONCURRENCY") or 16)
+DOWNLOAD_LIMIT_PER_HOST = int(os.environ.get("DOWNLOAD_LIMIT_PER_HOST") or 8)
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES") or 4)
+DOWNLOAD_BACKOFF = float(os.environ.get("DOWNLOAD_BACKOFF") or 0.5)
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT") or 60)
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE") or 64 * 1024)
+
+# API
+API_STREAM_BATCH_SIZE = int(os.environ.get("API_STREAM_BATCH_SIZE") or 1000)
+API_EXPORT_BATCH_SIZE = int(os.environ.get("API_EXPORT_BATCH_SIZE") or 10000)
+
+# Cache
+REDIS_URL = os.environ.get("REDIS_URL") or "redis://localhost"
+CACHE_EXPIRE = int(os.environ.get("CACHE_EXPIRE") or 7 * 24 * 60 * 60)
+CACHE_L1_MAX_ENTRIES = int(os.environ.get("CACHE_L1_MAX_ENTRIES") or 1024)
+CACHE_L1_TTL = float(os.environ.get("CACHE_L1_TTL") or 60)
+CACHE_VERSION_TTL = float(os.environ.get("CACHE_VERSION_TTL") or 1)
+CACHE_SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("CACHE_SINGLE_FLIGHT_TIMEOUT") or 10)
+
+# Cache warm-up
+API_URL = os.environ.get("API_URL") or "http://localhost:8000"
+CACHE_WARMUP_TOP = int(os.environ.get("CACHE_WARMUP_TOP") or 50)
+CACHE_WARMUP_TRACKED = int(os.environ.get("CACHE_WARMUP_TRACKED") or 1000)
+CACHE_WARMUP_CONCURRENCY = int(os.environ.get("CACHE_WARMUP_CONCURRENCY") or 4)
+CACHE_POPULAR_FLUSH_INTERVAL = float(
+    os.environ.get("CACHE_POPULAR_FLUSH_INTERVAL") or 10
+)
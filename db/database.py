@@ -1,26 +1,178 @@
+import asyncio
+from time import monotonic, perf_counter
+
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from config import (DB_HOST, DB_MAX_OVERFLOW, DB_NAME, DB_PARTITION_BY,
+                    DB_PASS, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+                    DB_PORT, DB_REPLICA_HOST, DB_REPLICA_PORT,
+                    DB_REPLICA_WAIT_TIMEOUT, DB_STATEMENT_CACHE_SIZE, DB_USER,
+                    DB_WRITE_POOL_SIZE)
+from db.migrations import apply_migrations, create_missing_indexes
+from db.partitions import create_tables, is_partitioned
+from db.pool import MeteredPool
+from metrics import REGISTRY, Gauge
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Время выполнения SQL-запросов по движкам"
+)
+
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+def database_url(host, port):
+    """
+    Возвращает адрес подключения к БД на заданном сервере.
+    """
+    return f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{host}:{port}/{DB_NAME}"
+
+
+DATABASE_URL = database_url(DB_HOST, DB_PORT)
+
+# Чтение API идёт с реплики, если она задана, иначе с основной БД
+READ_DATABASE_URL = (
+    database_url(DB_REPLICA_HOST, DB_REPLICA_PORT) if DB_REPLICA_HOST else DATABASE_URL
+)
 
 BaseModel = declarative_base()
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def create_engine(
+    url=DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+):
+    """
+    Создаёт асинхронный движок с пулом соединений по настройкам из config.py.
+
+    Пул замеряет ожидание соединений (см. MeteredPool), а размер кэша
+    подготовленных запросов asyncpg задаётся DB_STATEMENT_CACHE_SIZE.
+    """
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=MeteredPool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        connect_args={
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+# Движок записи (парсер, миграции) и движок чтения (API) с отдельными пулами
+engine = create_engine(DATABASE_URL, DB_WRITE_POOL_SIZE)
+read_engine = create_engine(READ_DATABASE_URL, DB_POOL_SIZE)
+
+
+def instrument_engine(async_engine, name):
+    """
+    Замеряет время выполнения запросов движка в гистограмме DB_QUERY_SECONDS.
+
+    Начало запроса хранится в контексте выполнения, а не в соединении:
+    запрос с ошибкой не оставляет отметку, которая исказила бы замер следующего.
+    """
+    sync_engine = async_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context._query_start = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        DB_QUERY_SECONDS.observe(perf_counter() - context._query_start, engine=name)
+
+
+instrument_engine(engine, "write")
+instrument_engine(read_engine, "read")
 
 async_session_maker = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
+read_session_maker = async_sessionmaker(
+    read_engine, expire_on_commit=False, class_=AsyncSession
+)
+
+
+def pool_status():
+    """
+    Возвращает состояние пулов соединений движков записи и чтения.
+    """
+    return {
+        "write": engine.sync_engine.pool.status_dict(),
+        "read": read_engine.sync_engine.pool.status_dict(),
+    }
+
+
+def pool_metrics():
+    """
+    Сборщик метрик: текущее состояние пулов соединений в виде показателей.
+    """
+    metrics = {}
+    for engine_name, status in pool_status().items():
+        for key, value in status.items():
+            gauge = metrics.get(key)
+            if gauge is None:
+                gauge = metrics[key] = Gauge(f"db_pool_{key}", f"Пул соединений: {key}")
+            gauge.set(value, engine=engine_name)
+    return list(metrics.values())
+
+
+REGISTRY.add_collector(pool_metrics)
+
+
+async def wait_for_replica(
+    primary=engine, replica=read_engine, timeout=DB_REPLICA_WAIT_TIMEOUT, interval=0.5
+):
+    """
+    Ждёт, пока реплика применит все изменения, зафиксированные на основной БД к моменту вызова.
 
-async def create_db():
+    Позиция журнала (LSN) основной БД сравнивается с последней применённой позицией
+    реплики. Сервер, который не является репликой, считается догнавшим.
+    :param timeout: сколько секунд ждать
+    :param interval: пауза между проверками в секундах
+    :return: True, если реплика догнала основную БД, False по истечении timeout
     """
-    Создает новую базу данных.
+    async with primary.connect() as conn:
+        lsn = await conn.scalar(text("SELECT pg_current_wal_lsn()"))
+
+    deadline = monotonic() + timeout
+    async with replica.connect() as conn:
+        while True:
+            caught_up = await conn.scalar(
+                text(
+                    "SELECT coalesce(pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn), "
+                    "NOT pg_is_in_recovery())"
+                ),
+                {"lsn": lsn},
+            )
+            if caught_up:
+                return True
+            if monotonic() >= deadline:
+                return False
+            await conn.rollback()
+            await asyncio.sleep(interval)
+
+
+async def create_db(partition_by=DB_PARTITION_BY):
+    """
+    Создает таблицы базы данных, если их еще нет, и применяет миграции схемы.
+
+    Если задан partition_by ("month" или "year"), новая таблица торгов создаётся
+    секционированной по дате (см. db/partitions.py).
     """
     async with engine.begin() as conn:
-        await conn.run_sync(BaseModel.metadata.create_all)
+        await conn.run_sync(create_tables, BaseModel.metadata, partition_by)
+        if partition_by and not await is_partitioned(conn):
+            print(
+                "Таблица торгов уже создана без секций: для секционирования "
+                "удалите её, парсер загрузит все файлы заново"
+            )
+        await apply_migrations(conn)
+        await conn.run_sync(create_missing_indexes, BaseModel.metadata)
 
 
 async def drop_db():
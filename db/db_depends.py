@@ -1,19 +1,33 @@
 from typing import AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from db.database import async_session_maker
+from db.database import read_session_maker
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Асинхронный генератор зависимости FastAPI для получения сессии базы данных.
 
-    Использует асинхронный контекстный менеджер `async_session_maker`
+    Использует асинхронный контекстный менеджер `read_session_maker`
     для создания и автоматического закрытия сессии SQLAlchemy после использования.
+    Сессия работает через движок чтения: с репликой, если задан DB_REPLICA_HOST.
 
     Returns:
         AsyncGenerator[AsyncSession, None]: Асинхронная сессия базы данных, используемая в маршрутах и сервисах.
     """
-    async with async_session_maker() as session:
+    async with read_session_maker() as session:
         yield session
+
+
+def get_session_maker() -> async_sessionmaker:
+    """
+    Зависимость FastAPI, возвращающая фабрику сессий движка чтения.
+
+    Нужна потоковым ответам: они читают БД уже после выхода из обработчика,
+    когда сессия из `get_db` закрыта, и открывают собственную сессию.
+
+    Returns:
+        async_sessionmaker: Фабрика асинхронных сессий.
+    """
+    return read_session_maker
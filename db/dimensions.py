@@ -0,0 +1,139 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.model import SpimexDeliveryBasis, SpimexProduct
+
+# Атрибуты инструмента, которые хранятся в spimex_products (кроме кода)
+PRODUCT_FIELDS = (
+    "exchange_product_name",
+    "oil_id",
+    "delivery_basis_id",
+    "delivery_type_id",
+)
+
+
+class DimensionCache:
+    """
+    Кэш измерений в памяти: ключи и атрибуты инструментов, названия базисов поставки.
+
+    Заполняется из БД при первом обращении, после чего в БД записываются только
+    новые инструменты и базисы или те, у которых изменились атрибуты.
+    Записанные ключи попадают в кэш только после фиксации транзакции (commit),
+    поэтому при откате в кэше не остаются ключи несуществующих строк.
+    """
+
+    products: dict  # код инструмента -> (ключ, атрибуты PRODUCT_FIELDS)
+    bases: dict  # код базиса -> название
+    loaded: bool  # заполнен ли кэш из БД
+    pending: tuple  # (инструменты, базисы), записанные в текущей транзакции
+
+    def __init__(self):
+        self.products = {}
+        self.bases = {}
+        self.loaded = False
+        self.pending = ({}, {})
+
+    async def load(self, session: AsyncSession):
+        """
+        Заполняет кэш всеми инструментами и базисами из БД.
+        """
+        products = await session.execute(
+            select(
+                SpimexProduct.exchange_product_id,
+                SpimexProduct.id,
+                *(getattr(SpimexProduct, name) for name in PRODUCT_FIELDS),
+            )
+        )
+        self.products = {code: (key, tuple(attrs)) for code, key, *attrs in products}
+        bases = await session.execute(
+            select(
+                SpimexDeliveryBasis.delivery_basis_id,
+                SpimexDeliveryBasis.delivery_basis_name,
+            )
+        )
+        self.bases = dict(bases.all())
+        self.loaded = True
+
+    async def resolve(self, session: AsyncSession, records):
+        """
+        Возвращает ключи инструментов строк, записывая в БД новые и изменившиеся
+        инструменты и базисы (в порядке кодов, чтобы параллельные загрузки
+        не блокировали друг друга).
+        :param records: строки в порядке parser.transform.FIELDS
+        :return: словарь {код инструмента: ключ}
+        """
+        if not self.loaded:
+            await self.load(session)
+        self.pending = ({}, {})
+
+        products, bases = {}, {}
+        for record in records:
+            products[record[0]] = (record[1], record[2], record[3], record[5])
+            bases[record[3]] = record[4]
+
+        changed_bases = {
+            code: name for code, name in bases.items() if self.bases.get(code) != name
+        }
+        if changed_bases:
+            stmt = insert(SpimexDeliveryBasis)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SpimexDeliveryBasis.delivery_basis_id],
+                set_={"delivery_basis_name": stmt.excluded.delivery_basis_name},
+            )
+            await session.execute(
+                stmt,
+                [
+                    {"delivery_basis_id": code, "delivery_basis_name": name}
+                    for code, name in sorted(changed_bases.items())
+                ],
+            )
+            self.pending[1].update(changed_bases)
+
+        keys = {}
+        changed = []
+        for code, attrs in products.items():
+            cached = self.products.get(code)
+            if cached is not None and cached[1] == attrs:
+                keys[code] = cached[0]
+            else:
+                changed.append(code)
+        if changed:
+            stmt = insert(SpimexProduct)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SpimexProduct.exchange_product_id],
+                set_={name: stmt.excluded[name] for name in PRODUCT_FIELDS},
+            ).returning(SpimexProduct.exchange_product_id, SpimexProduct.id)
+            result = await session.execute(
+                stmt,
+                [
+                    {
+                        "exchange_product_id": code,
+                        **dict(zip(PRODUCT_FIELDS, products[code])),
+                    }
+                    for code in sorted(changed)
+                ],
+            )
+            for code, key in result.all():
+                keys[code] = key
+                self.pending[0][code] = (key, products[code])
+        return keys
+
+    def commit(self):
+        """
+        Переносит в кэш инструменты и базисы, записанные в зафиксированной транзакции.
+        """
+        products, bases = self.pending
+        self.products.update(products)
+        self.bases.update(bases)
+        self.pending = ({}, {})
+
+
+def dimension_cache(session: AsyncSession):
+    """
+    Возвращает кэш измерений сессии (создаётся при первом обращении).
+
+    Кэш живёт столько же, сколько сессия загрузки, поэтому пересоздание БД
+    между запусками не оставляет в нём устаревших ключей.
+    """
+    return session.info.setdefault("dimensions", DimensionCache())
@@ -0,0 +1,116 @@
+from sqlalchemy import text
+
+from db.rollups import ROLLUP_BACKFILL, TRADING_DAYS_BACKFILL
+
+# Идемпотентные изменения схемы для уже существующих таблиц.
+# create_all создаёт только отсутствующие таблицы, поэтому новые ограничения,
+# индексы и типы столбцов для старых БД добавляются здесь. Каждая команда
+# выполняется при каждом вызове create_db и должна быть безопасна при повторе.
+MIGRATIONS = [
+    # Естественный ключ (код инструмента, дата) для загрузки через ON CONFLICT
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_indexes
+            WHERE indexname = 'uq_spimex_trading_results_product_date'
+        ) THEN
+            DELETE FROM spimex_trading_results a
+            USING spimex_trading_results b
+            WHERE a.exchange_product_id = b.exchange_product_id
+                AND a.date = b.date
+                AND a.id < b.id;
+            ALTER TABLE spimex_trading_results
+                ADD CONSTRAINT uq_spimex_trading_results_product_date
+                UNIQUE (exchange_product_id, date);
+        END IF;
+    END $$;
+    """,
+    # Объём и сумма договоров хранились строками ("60.0"): переводим в BIGINT
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'spimex_trading_results'
+                AND column_name IN ('volume', 'total')
+                AND data_type = 'character varying'
+        ) THEN
+            ALTER TABLE spimex_trading_results
+                ALTER COLUMN volume TYPE BIGINT
+                    USING round(NULLIF(trim(volume), '')::numeric)::bigint,
+                ALTER COLUMN total TYPE BIGINT
+                    USING round(NULLIF(trim(total), '')::numeric)::bigint;
+        END IF;
+    END $$;
+    """,
+    # Индекс по дате заменён индексом по (дата, id), см. SpimexTradingResults
+    "DROP INDEX IF EXISTS ix_spimex_trading_results_date",
+    # Инструменты и базисы хранились в каждой строке торгов: переносим их в таблицы
+    # измерений, а в строках оставляем ключ инструмента (см. db/dimensions.py).
+    # Вместе со столбцами удаляются и индексы по ним; место на диске
+    # освобождается после VACUUM FULL spimex_trading_results
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'spimex_trading_results'
+                AND column_name = 'exchange_product_id'
+        ) THEN
+            INSERT INTO spimex_delivery_bases (delivery_basis_id, delivery_basis_name)
+            SELECT DISTINCT ON (delivery_basis_id) delivery_basis_id, delivery_basis_name
+            FROM spimex_trading_results
+            WHERE delivery_basis_id IS NOT NULL
+            ORDER BY delivery_basis_id, date DESC
+            ON CONFLICT DO NOTHING;
+            INSERT INTO spimex_products (
+                exchange_product_id, exchange_product_name, oil_id,
+                delivery_basis_id, delivery_type_id
+            )
+            SELECT DISTINCT ON (exchange_product_id) exchange_product_id,
+                exchange_product_name, oil_id, delivery_basis_id, delivery_type_id
+            FROM spimex_trading_results
+            WHERE exchange_product_id IS NOT NULL
+            ORDER BY exchange_product_id, date DESC
+            ON CONFLICT DO NOTHING;
+            ALTER TABLE spimex_trading_results
+                ADD COLUMN product_key INTEGER REFERENCES spimex_products (id);
+            UPDATE spimex_trading_results r SET product_key = p.id
+            FROM spimex_products p
+            WHERE p.exchange_product_id = r.exchange_product_id;
+            ALTER TABLE spimex_trading_results
+                DROP CONSTRAINT IF EXISTS uq_spimex_trading_results_product_date,
+                DROP COLUMN exchange_product_id,
+                DROP COLUMN exchange_product_name,
+                DROP COLUMN oil_id,
+                DROP COLUMN delivery_basis_id,
+                DROP COLUMN delivery_basis_name,
+                DROP COLUMN delivery_type_id,
+                ADD CONSTRAINT uq_spimex_trading_results_product_date
+                    UNIQUE (product_key, date);
+        END IF;
+    END $$;
+    """,
+    # Дневные итоги для торгов, загруженных до появления spimex_daily_rollups
+    ROLLUP_BACKFILL,
+    # Торговые дни для торгов, загруженных до появления spimex_trading_days
+    TRADING_DAYS_BACKFILL,
+]
+
+
+def create_missing_indexes(sync_conn, metadata):
+    """
+    Создаёт индексы моделей, которых ещё нет в уже существующих таблицах.
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def apply_migrations(conn):
+    """
+    Применяет все миграции из MIGRATIONS в рамках переданного соединения.
+    """
+    for migration in MIGRATIONS:
+        await conn.execute(text(migration))
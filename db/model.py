@@ -1,23 +1,87 @@
-from sqlalchemy import Column, Date, DateTime, Integer, String, func
+from sqlalchemy import (BigInteger, Column, Date, DateTime, ForeignKey, Index,
+                        Integer, String, UniqueConstraint, func)
 
 from db.database import BaseModel
 
 
-class SpimexTradingResults(BaseModel):
-    __tablename__ = "spimex_trading_results"
+class SpimexDeliveryBasis(BaseModel):
+    # Базисы поставки (см. db/dimensions.py): название хранится один раз на базис,
+    # а не в каждой строке торгов
+    __tablename__ = "spimex_delivery_bases"
+
+    delivery_basis_id = Column(String, primary_key=True)
+    delivery_basis_name = Column(String)
+
+
+class SpimexProduct(BaseModel):
+    # Инструменты (см. db/dimensions.py): код, название и выделенные из кода вид топлива,
+    # базис и тип поставки. Строки торгов ссылаются на инструмент по целому ключу id
+    __tablename__ = "spimex_products"
 
     id = Column(Integer, primary_key=True)
-    exchange_product_id = Column(String)
+    exchange_product_id = Column(String, unique=True, nullable=False)
     exchange_product_name = Column(String)
     oil_id = Column(String)
     delivery_basis_id = Column(String)
-    delivery_basis_name = Column(String)
     delivery_type_id = Column(String)
-    volume = Column(String)
-    total = Column(String)
+
+
+class SpimexTradingResults(BaseModel):
+    __tablename__ = "spimex_trading_results"
+    __table_args__ = (
+        # естественный ключ строки (инструмент, дата); индекс по нему обслуживает
+        # фильтры /dynamics и /trading-results по инструментам вместе с диапазоном дат
+        UniqueConstraint(
+            "product_key",
+            "date",
+            name="uq_spimex_trading_results_product_date",
+        ),
+        # /last-trading-dates (DISTINCT date), диапазоны дат без фильтров
+        # и keyset-пагинация /dynamics/page по (дата, id) без сортировки
+        Index("ix_spimex_trading_results_date_id", "date", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_key = Column(Integer, ForeignKey("spimex_products.id"))
+    volume = Column(BigInteger)
+    total = Column(BigInteger)
     count = Column(Integer)
     date = Column(Date)
     created_on = Column(DateTime(timezone=True), server_default=func.now())
     updated_on = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+
+
+class SpimexDailyRollup(BaseModel):
+    # Дневные итоги торгов по виду топлива или базису поставки (см. db/rollups.py):
+    # dimension — имя столбца spimex_trading_results, value — его значение
+    __tablename__ = "spimex_daily_rollups"
+
+    dimension = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    volume = Column(BigInteger)
+    total = Column(BigInteger)
+    count = Column(BigInteger)
+
+
+class SpimexIngestedFile(BaseModel):
+    # Контрольные точки догрузки (см. parser/backfill.py): отчёты, уже загруженные в БД,
+    # с SHA-256 содержимого. Таблица общая для всех процессов и машин догрузки
+    __tablename__ = "spimex_ingested_files"
+
+    name = Column(String, primary_key=True)
+    date = Column(Date)
+    sha256 = Column(String)
+    ingested_on = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class SpimexTradingDay(BaseModel):
+    # Даты, за которые есть строки торгов (см. db/rollups.py): по первичному ключу
+    # последние даты читаются без просмотра spimex_trading_results
+    __tablename__ = "spimex_trading_days"
+
+    date = Column(Date, primary_key=True)
@@ -0,0 +1,284 @@
+import re
+from datetime import date
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+
+from config import DB_PARTITION_BY, DB_PARTITION_CLEAR
+
+# Таблица торгов, которую можно секционировать по дате (настройка DB_PARTITION_BY)
+PARTITIONED_TABLE = "spimex_trading_results"
+
+# Границы секции в выводе pg_get_expr: FOR VALUES FROM ('2024-05-01') TO ('2024-06-01')
+BOUND_PATTERN = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+def partition_range(day, period):
+    """
+    Возвращает границы [начало, конец) секции, в которую попадает дата.
+    :param day: дата торгов
+    :param period: размер секции: "month" или "year"
+    """
+    if period == "year":
+        return date(day.year, 1, 1), date(day.year + 1, 1, 1)
+    start = day.replace(day=1)
+    return start, date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def partition_name(start, period):
+    """
+    Возвращает имя секции по её началу (например, spimex_trading_results_y2024m05).
+    """
+    suffix = f"y{start:%Y}" if period == "year" else f"y{start:%Y}m{start:%m}"
+    return f"{PARTITIONED_TABLE}_{suffix}"
+
+
+def partitioned_copy(table):
+    """
+    Возвращает копию таблицы торгов, секционированную по диапазонам дат.
+
+    Первичный и уникальные ключи секционированной таблицы должны включать
+    столбец секционирования, поэтому первичный ключ копии — (id, date).
+    Таблицы, на которые ссылаются внешние ключи, копируются вместе с ней.
+    """
+    metadata = MetaData()
+    for foreign_key in table.foreign_keys:
+        foreign_key.column.table.to_metadata(metadata)
+    copy = table.to_metadata(metadata)
+    copy.c.date.nullable = False
+    copy.c.date.primary_key = True
+    copy.c.id.autoincrement = True
+    copy.append_constraint(PrimaryKeyConstraint("id", "date"))
+    copy.dialect_options["postgresql"]["partition_by"] = "RANGE (date)"
+    return copy
+
+
+def create_tables(sync_conn, metadata, period=DB_PARTITION_BY):
+    """
+    Создаёт отсутствующие таблицы моделей.
+
+    Если задан period, новая таблица торгов создаётся секционированной по дате,
+    а секции добавляются при записи (см. ensure_partitions). Уже существующая
+    таблица не меняется.
+    """
+    partitioned = period and PARTITIONED_TABLE in metadata.tables
+    tables = [
+        table
+        for table in metadata.sorted_tables
+        if not (partitioned and table.name == PARTITIONED_TABLE)
+    ]
+    metadata.create_all(sync_conn, tables=tables)
+    if partitioned:
+        table = partitioned_copy(metadata.tables[PARTITIONED_TABLE])
+        table.create(sync_conn, checkfirst=True)
+
+
+async def is_partitioned(conn):
+    """
+    Проверяет, что таблица торгов секционирована.
+    :param conn: соединение или сессия
+    """
+    relkind = await conn.scalar(
+        text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": PARTITIONED_TABLE},
+    )
+    return relkind == "p"
+
+
+async def list_partitions(conn):
+    """
+    Возвращает секции таблицы торгов: {имя: (начало, конец)}.
+    """
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": PARTITIONED_TABLE},
+    )
+    partitions = {}
+    for name, bound in result:
+        match = BOUND_PATTERN.search(bound or "")
+        if match:
+            partitions[name] = tuple(date.fromisoformat(d) for d in match.groups())
+    return partitions
+
+
+async def ensure_partitions(conn, dates, period=DB_PARTITION_BY):
+    """
+    Создаёт недостающие секции таблицы торгов для дат перед записью строк.
+
+    Ничего не делает, если таблица не секционирована. Размер новых секций берётся
+    по уже существующим секциям, а для пустой таблицы — из period (по умолчанию месяц).
+    """
+    if not await is_partitioned(conn):
+        return
+    partitions = await list_partitions(conn)
+    if partitions:
+        start, end = next(iter(partitions.values()))
+        period = "year" if (end - start).days > 31 else "month"
+    period = period or "month"
+
+    for start, end in sorted({partition_range(day, period) for day in dates}):
+        if any(s <= start < e for s, e in partitions.values()):
+            continue
+        await create_partition(conn, partition_name(start, period), start, end)
+        partitions[partition_name(start, period)] = (start, end)
+
+
+async def create_partition(conn, name, start, end):
+    """
+    Создаёт секцию таблицы торгов для дат [start, end).
+    """
+    await conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARTITIONED_TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+
+
+def stage_name(name):
+    """
+    Возвращает имя промежуточной таблицы, которая подменяет секцию (см. stage_partition).
+    """
+    return f"{name}_stage"
+
+
+async def stage_partition(conn, name, start, end):
+    """
+    Создаёт пустую промежуточную таблицу для новых строк секции [start, end).
+
+    Таблица повторяет столбцы, значения по умолчанию, индексы и внешние ключи таблицы
+    торгов, а ограничение CHECK по границам секции позволяет присоединить её
+    (см. swap_partition) без проверки всех строк и без построения индексов.
+    Создание таблицы не блокирует чтение таблицы торгов.
+    """
+    stage = stage_name(name)
+    await conn.execute(
+        text(f"CREATE TABLE {stage} (LIKE {PARTITIONED_TABLE} INCLUDING ALL)")
+    )
+    foreign_keys = await conn.execute(
+        text(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+        ),
+        {"table": PARTITIONED_TABLE},
+    )
+    for definition in foreign_keys.scalars().all():
+        await conn.execute(text(f"ALTER TABLE {stage} ADD {definition}"))
+    await conn.execute(
+        text(
+            f"ALTER TABLE {stage} ADD CONSTRAINT {stage}_bounds "
+            f"CHECK (date >= '{start.isoformat()}' AND date < '{end.isoformat()}')"
+        )
+    )
+
+
+async def swap_partition(conn, name, start, end, mode=DB_PARTITION_CLEAR):
+    """
+    Подменяет секцию заполненной промежуточной таблицей (см. stage_partition).
+
+    - mode="truncate": прежняя секция удаляется вместе со строками;
+    - mode="detach": прежняя секция сохраняется как `<имя>_detached`
+      (предыдущая такая копия удаляется). У копии снимается значение id
+      по умолчанию, чтобы она не зависела от последовательности основной таблицы.
+
+    DETACH PARTITION блокирует таблицу торгов (ACCESS EXCLUSIVE) до конца транзакции,
+    поэтому подмена выполняется в самом конце загрузки, после записи строк.
+    """
+    stage = stage_name(name)
+    await conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}"))
+    if mode == "detach":
+        await conn.execute(text(f"DROP TABLE IF EXISTS {name}_detached"))
+        await conn.execute(text(f"ALTER TABLE {name} RENAME TO {name}_detached"))
+        await conn.execute(
+            text(f"ALTER TABLE {name}_detached ALTER COLUMN id DROP DEFAULT")
+        )
+    else:
+        await conn.execute(text(f"DROP TABLE {name}"))
+    await conn.execute(text(f"ALTER TABLE {stage} RENAME TO {name}"))
+    await conn.execute(
+        text(
+            f"ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {stage}_bounds"))
+
+
+async def clear_dates(conn, dates):
+    """
+    Готовит повторную загрузку строк торгов за даты.
+
+    Для непустых секций, в которых нет строк за другие даты, создаются промежуточные
+    таблицы (см. stage_partition): новые строки записываются в них, а в конце загрузки
+    секции подменяются целиком (см. swap_partition). Остальные строки удаляются
+    по дате — в секционированной таблице такой DELETE затрагивает только секции этих дат.
+    Ни создание промежуточных таблиц, ни DELETE не мешают чтению таблицы торгов.
+
+    Перед проверкой секций таблица торгов блокируется в режиме SHARE ROW EXCLUSIVE
+    до конца транзакции: чтение продолжается, а другие загрузки (части догрузки, демон)
+    ждут фиксации. Иначе строки за другие даты, записанные ими после проверки, удалились бы
+    вместе с подменённой секцией. Блокируется вся таблица, а не секция: запись через
+    таблицу торгов уже держит её блокировку ROW EXCLUSIVE, и DETACH PARTITION при подмене
+    взаимно заблокировался бы с ней. По той же причине clear_dates вызывается до записи
+    в таблицы измерений: удаление прежней секции блокирует spimex_products (см. lock_for_write).
+    :param conn: соединение или сессия
+    :param dates: даты торгов
+    :return: подменяемые секции: {имя: (начало, конец)}
+    """
+    dates = set(dates)
+    remaining = set(dates)
+    staged = {}
+    if dates and await is_partitioned(conn):
+        await conn.execute(
+            text(f"LOCK TABLE {PARTITIONED_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+        )
+        for name, (start, end) in sorted((await list_partitions(conn)).items()):
+            covered = {day for day in dates if start <= day < end}
+            if not covered:
+                continue
+            has_rows, has_other_dates = (
+                await conn.execute(
+                    text(
+                        f"SELECT EXISTS (SELECT 1 FROM {name}), "
+                        f"EXISTS (SELECT 1 FROM {name} WHERE date <> ALL(:dates))"
+                    ),
+                    {"dates": list(covered)},
+                )
+            ).one()
+            if has_other_dates:
+                continue
+            if has_rows:
+                await stage_partition(conn, name, start, end)
+                staged[name] = (start, end)
+            remaining -= covered
+
+    if remaining:
+        await conn.execute(
+            text(f"DELETE FROM {PARTITIONED_TABLE} WHERE date = ANY(:dates)"),
+            {"dates": list(remaining)},
+        )
+    return staged
+
+
+async def lock_for_write(conn):
+    """
+    Блокирует таблицу торгов для записи (ROW EXCLUSIVE) до конца транзакции.
+
+    Загрузка берёт блокировку до записи в таблицы измерений: если повторная загрузка
+    (см. clear_dates) уже держит таблицу торгов, загрузка ждёт её фиксации, не заняв
+    spimex_products, которую при подмене секции блокирует удаление внешнего ключа.
+    """
+    await conn.execute(text(f"LOCK TABLE {PARTITIONED_TABLE} IN ROW EXCLUSIVE MODE"))
+
+
+async def swap_partitions(conn, staged, mode=DB_PARTITION_CLEAR):
+    """
+    Подменяет секции, подготовленные clear_dates, их промежуточными таблицами.
+    :param staged: подменяемые секции: {имя: (начало, конец)}
+    :param mode: что делать с прежними секциями: "truncate" или "detach"
+    """
+    for name, (start, end) in sorted(staged.items()):
+        await swap_partition(conn, name, start, end, mode)
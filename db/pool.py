@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolMetrics:
+    """
+    Счётчики выдачи соединений из пула.
+    """
+
+    checkouts: int = 0  # выдано соединений
+    timeouts: int = 0  # ожиданий, завершившихся ошибкой (пул исчерпан)
+    wait_seconds: float = 0.0  # суммарное ожидание соединения
+    max_wait_seconds: float = 0.0  # самое долгое ожидание соединения
+
+    def record(self, seconds, failed=False):
+        """
+        Учитывает одно ожидание соединения длительностью `seconds` секунд.
+        """
+        if failed:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет ожидание при выдаче соединения.
+    """
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record(perf_counter() - start, failed=True)
+            raise
+        self.metrics.record(perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() пересоздаёт пул: счётчики переносятся в новый
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def status_dict(self):
+        """
+        Возвращает размер и загрузку пула вместе со счётчиками ожидания.
+        """
+        checked_out = self.checkedout()
+        capacity = self.size() + max(self._max_overflow, 0)
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "utilization": round(checked_out / capacity, 3) if capacity else 0.0,
+            "checkouts": self.metrics.checkouts,
+            "timeouts": self.metrics.timeouts,
+            "avg_wait_seconds": round(
+                self.metrics.wait_seconds / max(self.metrics.checkouts, 1), 6
+            ),
+            "max_wait_seconds": round(self.metrics.max_wait_seconds, 6),
+        }
@@ -0,0 +1,81 @@
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Измерения дневных итогов — столбцы spimex_products
+ROLLUP_DIMENSIONS = ("oil_id", "delivery_basis_id")
+
+ROLLUP_COLUMNS = "dimension, value, date, volume, total, count"
+
+# Дневные итоги по каждому измерению; {condition} — дополнительное условие на строки торгов
+ROLLUP_SELECT = "\nUNION ALL\n".join(
+    f"SELECT '{dimension}', p.{dimension}, r.date, "
+    f"sum(r.volume), sum(r.total), sum(r.count) "
+    f"FROM spimex_trading_results r JOIN spimex_products p ON p.id = r.product_key "
+    f"WHERE p.{dimension} IS NOT NULL{{condition}} "
+    f"GROUP BY p.{dimension}, r.date"
+    for dimension in ROLLUP_DIMENSIONS
+)
+
+# Первичное заполнение итогов для БД, где торги загружены до появления таблицы итогов
+ROLLUP_BACKFILL = (
+    f"INSERT INTO spimex_daily_rollups ({ROLLUP_COLUMNS}) "
+    f"SELECT * FROM ({ROLLUP_SELECT.format(condition='')}) AS rollup "
+    f"WHERE NOT EXISTS (SELECT 1 FROM spimex_daily_rollups)"
+)
+
+# Первичное заполнение торговых дней для БД, где торги загружены до появления таблицы
+TRADING_DAYS_BACKFILL = (
+    "INSERT INTO spimex_trading_days (date) "
+    "SELECT DISTINCT date FROM spimex_trading_results "
+    "WHERE date IS NOT NULL AND NOT EXISTS (SELECT 1 FROM spimex_trading_days)"
+)
+
+
+async def refresh_daily_rollups(session: AsyncSession, dates):
+    """
+    Пересчитывает дневные итоги за указанные даты торгов в текущей транзакции.
+
+    Итоги за прочие даты не затрагиваются, поэтому обновление после загрузки
+    файла стоит столько же, сколько чтение строк одного дня.
+    :param session: сессия для работы с БД
+    :param dates: даты торгов, строки за которые изменились
+    """
+    dates = list(dates)
+    if not dates:
+        return
+    param = bindparam("dates", dates)
+    await session.execute(
+        text("DELETE FROM spimex_daily_rollups WHERE date = ANY(:dates)").bindparams(
+            param
+        )
+    )
+    await session.execute(
+        text(
+            f"INSERT INTO spimex_daily_rollups ({ROLLUP_COLUMNS}) "
+            + ROLLUP_SELECT.format(condition=" AND r.date = ANY(:dates)")
+        ).bindparams(param)
+    )
+
+
+async def refresh_trading_days(session: AsyncSession, dates):
+    """
+    Обновляет список торговых дней за указанные даты в текущей транзакции:
+    дата остаётся в списке, только если за неё есть строки торгов.
+    :param session: сессия для работы с БД
+    :param dates: даты торгов, строки за которые изменились
+    """
+    dates = list(dates)
+    if not dates:
+        return
+    param = bindparam("dates", dates)
+    await session.execute(
+        text("DELETE FROM spimex_trading_days WHERE date = ANY(:dates)").bindparams(
+            param
+        )
+    )
+    await session.execute(
+        text(
+            "INSERT INTO spimex_trading_days (date) "
+            "SELECT DISTINCT date FROM spimex_trading_results WHERE date = ANY(:dates)"
+        ).bindparams(param)
+    )
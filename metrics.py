@@ -0,0 +1,192 @@
+"""
+Метрики парсера и API: счётчики, показатели и гистограммы в памяти процесса.
+
+Метрики выводятся в текстовом формате Prometheus (`render`) для эндпоинта
+/metrics и в виде словаря (`snapshot`) для JSON-отчёта о запуске парсера.
+"""
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    """
+    Возвращает метки в формате Prometheus: {name="value",...}.
+    """
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{0}="{1}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    Базовый класс метрики со значениями по наборам меток.
+    """
+
+    type = ""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}  # кортеж пар (метка, значение) -> значение метрики
+        self.lock = threading.Lock()
+
+    def samples(self):
+        """
+        Возвращает пары (имя, метки, значение) для вывода.
+        """
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    """
+    Монотонно растущий счётчик.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Показатель, который может как расти, так и уменьшаться.
+    """
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(Metric):
+    """
+    Гистограмма распределения значений (обычно длительностей в секундах).
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Замеряет длительность блока with и добавляет её в гистограмму.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        for key, (counts, count, total) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                result.append(
+                    (f"{self.name}_bucket", key + (("le", repr(bound)),), bucket_count)
+                )
+            result.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+            result.append((f"{self.name}_sum", key, total))
+            result.append((f"{self.name}_count", key, count))
+        return result
+
+
+class Registry:
+    """
+    Набор метрик процесса.
+
+    Кроме метрик, обновляемых по ходу работы, в реестр можно добавить сборщики —
+    функции, которые при выводе возвращают текущие значения из других объектов
+    (статистики кэша, пулов соединений и т. п.) в виде метрик.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, **kwargs)
+        return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation):
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def add_collector(self, collector):
+        """
+        Добавляет сборщик: функцию без аргументов, возвращающую список метрик.
+        """
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def collect(self):
+        """
+        Возвращает все метрики, включая полученные от сборщиков.
+        """
+        metrics = list(self.metrics.values())
+        for collector in self.collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self):
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Возвращает значения метрик в виде словаря для JSON-отчёта.
+        """
+        return {
+            metric.name: [
+                {"name": name, "labels": dict(labels), "value": value}
+                for name, labels, value in metric.samples()
+            ]
+            for metric in self.collect()
+            if metric.values
+        }
+
+
+# Общий реестр метрик процесса
+REGISTRY = Registry()
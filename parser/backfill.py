@@ -0,0 +1,144 @@
+import os
+from datetime import date
+from parser.spimex_downloader import URLManager
+from parser.spimex_parser import process_files
+from parser.sync_manifest import (file_sha256, in_shard, report_date,
+                                  report_name)
+
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import SPIMEX_URL
+from db.database import async_session_maker
+from db.model import SpimexIngestedFile, SpimexTradingResults
+
+
+def parse_shard(value):
+    """
+    Разбирает номер части в виде "i/n" (i от 0 до n-1).
+    :return: пара (i, n)
+    :raises ValueError: если значение не в формате "i/n" или i вне диапазона
+    """
+    shard, shards = (int(part) for part in value.split("/"))
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError(f"некорректная часть: {value!r}, ожидается i/n, 0 <= i < n")
+    return shard, shards
+
+
+def local_reports(folder, start_date, end_date, shard=0, shards=1):
+    """
+    Возвращает пути к скачанным отчётам из папки за диапазон дат, входящим в часть.
+    :param start_date: первая дата (ISO)
+    :param end_date: последняя дата (ISO)
+    :return: пути, отсортированные по дате торгов
+    """
+    paths = []
+    for filename in os.listdir(folder):
+        if not filename.endswith(".xls"):
+            continue
+        name = report_name(filename)
+        if start_date <= report_date(name) <= end_date and in_shard(
+            name, shard, shards
+        ):
+            paths.append(os.path.join(folder, filename))
+    return sorted(paths, key=lambda path: report_name(path))
+
+
+async def load_checkpoints(session, names):
+    """
+    Возвращает SHA-256 уже загруженных в БД отчётов: {имя отчёта: sha256}.
+    """
+    result = await session.execute(
+        select(SpimexIngestedFile.name, SpimexIngestedFile.sha256).where(
+            SpimexIngestedFile.name.in_(names)
+        )
+    )
+    return dict(result.all())
+
+
+async def save_checkpoint(session, path, sha256):
+    """
+    Отмечает отчёт как загруженный в БД.
+    """
+    name = report_name(path)
+    stmt = insert(SpimexIngestedFile).values(
+        name=name, date=date.fromisoformat(report_date(name)), sha256=sha256
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SpimexIngestedFile.name],
+        set_={"sha256": stmt.excluded.sha256, "ingested_on": func.now()},
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def backfill(
+    start_date,
+    end_date,
+    shard=0,
+    shards=1,
+    session_maker=async_session_maker,
+    url=SPIMEX_URL,
+    folder="tables",
+    download=True,
+):
+    """
+    Догружает в БД отчёты за диапазон дат, возобновляясь после сбоя.
+
+    1. Скачивает с сайта Spimex отсутствующие в папке отчёты за диапазон
+       (только свою часть `shard` из `shards`, см. in_shard)
+    2. Пропускает отчёты, которые уже загружены в БД с тем же содержимым
+       (по контрольным точкам в таблице spimex_ingested_files)
+    3. Разбирает и сохраняет остальные отчёты, записывая контрольную точку
+       после сохранения каждого
+
+    Контрольная точка записывается после фиксации строк файла, поэтому при сбое
+    между ними файл будет загружен повторно — это безопасно, строки обновляются по ключу.
+    Части не пересекаются по отчётам, поэтому несколько процессов или машин
+    могут догружать один диапазон одновременно.
+    :param start_date: первая дата торгов (date)
+    :param end_date: последняя дата торгов (date)
+    :param shard: номер части (от 0 до shards - 1)
+    :param shards: число частей
+    :param session_maker: фабрика сессий БД
+    :param url: адрес страницы со списком отчётов
+    :param folder: папка для скачанных файлов
+    :param download: скачивать ли отсутствующие отчёты
+    :return: список загруженных в БД файлов
+    """
+    start, end = start_date.isoformat(), end_date.isoformat()
+    if download:
+        manager = URLManager(
+            url=url,
+            folder=folder,
+            start_date=start,
+            end_date=end,
+            shard=(shard, shards),
+        )
+        await manager.download_xls_files()
+
+    hashes = {
+        path: file_sha256(path)
+        for path in local_reports(folder, start, end, shard, shards)
+    }
+    async with session_maker() as session:
+        # БД могли пересоздать: тогда контрольные точки устарели
+        if not await session.scalar(select(exists().select_from(SpimexTradingResults))):
+            await session.execute(delete(SpimexIngestedFile))
+            await session.commit()
+
+        done = await load_checkpoints(session, [report_name(p) for p in hashes])
+        pending = [
+            path
+            for path, sha256 in hashes.items()
+            if done.get(report_name(path)) != sha256
+        ]
+        print(
+            f"Часть {shard}/{shards}: отчётов за период {len(hashes)}, "
+            f"уже загружено {len(hashes) - len(pending)}, к загрузке {len(pending)}"
+        )
+
+        async def on_saved(path):
+            await save_checkpoint(session, path, hashes[path])
+
+        return await process_files(pending, session, on_saved=on_saved)
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime, timedelta
+from time import perf_counter
+from urllib.parse import urlencode
+
+import aiohttp
+from redis.exceptions import RedisError
+
+from app.cache import popular_requests
+from config import (API_URL, CACHE_VERSION_TTL, CACHE_WARMUP_CONCURRENCY,
+                    CACHE_WARMUP_TOP, DAEMON_LEAD_MINUTES,
+                    DAEMON_POLL_INTERVAL, DAEMON_WINDOW_MINUTES,
+                    SPIMEX_PUBLISH_TIME)
+
+# Адреса API, которые прогреваются всегда, даже без накопленных счётчиков обращений
+WARMUP_DEFAULTS = ("/tradings/last-trading-dates", "/tradings/trading-results")
+
+
+def poll_window(
+    day,
+    publish_time=SPIMEX_PUBLISH_TIME,
+    lead=DAEMON_LEAD_MINUTES,
+    length=DAEMON_WINDOW_MINUTES,
+):
+    """
+    Возвращает начало и конец опроса сайта Spimex за дату торгов `day`:
+    от `lead` минут до времени публикации итогов до `length` минут после него.
+    """
+    published = datetime.combine(day, datetime.strptime(publish_time, "%H:%M").time())
+    return published - timedelta(minutes=lead), published + timedelta(minutes=length)
+
+
+def next_window(now, **options):
+    """
+    Возвращает дату торгов, начало и конец ближайшего окна опроса, которое ещё не закончилось.
+
+    Торги на Spimex проходят по будним дням, поэтому выходные пропускаются.
+    :param now: текущее время (местное)
+    :param options: параметры poll_window
+    """
+    day = now.date()
+    while True:
+        if day.weekday() < 5:
+            start, end = poll_window(day, **options)
+            if end > now:
+                return day, start, end
+        day += timedelta(days=1)
+
+
+def warmup_urls(day, popular):
+    """
+    Возвращает адреса API для прогрева кэша без повторов: стандартные запросы,
+    торги за новую дату и самые частые запросы пользователей.
+    """
+    params = {"start_date": day.isoformat(), "end_date": day.isoformat()}
+    day_url = f"/tradings/dynamics?{urlencode(sorted(params.items()))}"
+    return list(dict.fromkeys([*WARMUP_DEFAULTS, day_url, *popular]))
+
+
+async def warm_up(urls, api_url=API_URL, concurrency=CACHE_WARMUP_CONCURRENCY):
+    """
+    Запрашивает адреса у API, чтобы ответы попали в кэш до первых пользователей.
+
+    Не более `concurrency` запросов одновременно, чтобы прогрев не занял все
+    соединения с БД. Ответ попадает в Redis и поэтому доступен всем процессам API.
+    :return: число адресов, на которые API ответил без ошибки
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(session, url):
+        async with semaphore:
+            try:
+                async with session.get(api_url.rstrip("/") + url) as response:
+                    await response.read()
+                    return response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Не удалось прогреть кэш для {url}: {e}")
+                return False
+
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(*(fetch(session, url) for url in urls))
+    return sum(results)
+
+
+async def warm_up_cache(day, api_url=API_URL, top=CACHE_WARMUP_TOP):
+    """
+    Прогревает кэш API после загрузки итогов торгов за дату `day` (см. warmup_urls).
+    """
+    # процессы API хранят версию данных в памяти до CACHE_VERSION_TTL секунд:
+    # без паузы прогрев мог бы получить ответы прежней версии
+    await asyncio.sleep(CACHE_VERSION_TTL)
+    try:
+        popular = await popular_requests(top)
+    except RedisError as e:
+        print(f"Не удалось получить частые запросы из Redis: {e}")
+        popular = []
+
+    urls = warmup_urls(day, popular)
+    start = perf_counter()
+    warmed = await warm_up(urls, api_url)
+    print(
+        f"Прогрев кэша API: {warmed} из {len(urls)} запросов "
+        f"за {perf_counter() - start:.1f} сек"
+    )
+
+
+async def poll_trading_day(
+    day, deadline, ingest, interval=DAEMON_POLL_INTERVAL, now=datetime.now
+):
+    """
+    Опрашивает сайт Spimex, пока отчёт за дату `day` не будет загружен в БД
+    или не наступит `deadline`.
+
+    Ошибка одного опроса (сайт или БД недоступны) не останавливает опрос.
+    :param ingest: корутина ingest(day), возвращающая пару
+                   (загруженные файлы, загружен ли отчёт за day)
+    :param interval: пауза между опросами в секундах
+    :return: список загруженных файлов
+    """
+    saved = []
+    while True:
+        try:
+            files, done = await ingest(day)
+            saved += files
+        except Exception as e:
+            print(f"Ошибка при опросе Spimex за {day}: {e}")
+            done = False
+        if done:
+            return saved
+        if now() + timedelta(seconds=interval) >= deadline:
+            print(f"Отчёт за {day} не появился до {deadline:%H:%M}")
+            return saved
+        await asyncio.sleep(interval)
+
+
+async def run_daemon(ingest, publish, api_url=API_URL, now=datetime.now):
+    """
+    Загружает итоги торгов каждого рабочего дня сразу после их публикации.
+
+    1. Ждёт начала окна опроса ближайшего рабочего дня
+       (DAEMON_LEAD_MINUTES минут до SPIMEX_PUBLISH_TIME)
+    2. Раз в DAEMON_POLL_INTERVAL секунд скачивает и загружает в БД отчёт
+       за этот день, пока он не появится или не закончится окно опроса
+    3. Если что-то загружено, публикует новую версию данных (publish)
+       и прогревает кэш API самыми частыми запросами
+    :param ingest: корутина ingest(day), см. poll_trading_day
+    :param publish: корутина publish(saved), делающая новые данные видимыми в API
+    """
+    after = now()
+    while True:
+        day, start, end = next_window(after)
+        wait = (start - now()).total_seconds()
+        if wait > 0:
+            print(f"Следующий опрос Spimex за {day}: с {start:%Y-%m-%d %H:%M}")
+            await asyncio.sleep(wait)
+
+        saved = await poll_trading_day(day, end, ingest, now=now)
+        if saved:
+            await publish(saved)
+            await warm_up_cache(day, api_url)
+        # следующее окно — не раньше следующего дня
+        after = max(
+            now(), datetime.combine(day + timedelta(days=1), datetime.min.time())
+        )
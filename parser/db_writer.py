@@ -0,0 +1,263 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from parser.transform import TransformedRows, report_rejects, transform_rows
+from time import perf_counter
+
+from sqlalchemy import column, delete, func, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DB_CONFLICT_MODE, DB_PARTITION_CLEAR, DB_WRITE_MODE
+from db.dimensions import dimension_cache
+from db.model import SpimexTradingResults
+from db.partitions import (clear_dates, ensure_partitions, lock_for_write,
+                           stage_name, swap_partitions)
+from db.rollups import refresh_daily_rollups, refresh_trading_days
+from metrics import REGISTRY
+
+# Столбцы spimex_trading_results, записываемые при загрузке: инструмент хранится
+# в spimex_products, а в строке торгов — только его ключ (см. db/dimensions.py)
+FACT_FIELDS = ("product_key", "volume", "total", "count", "date")
+
+# Естественный ключ строки: инструмент и дата торгов
+KEY_FIELDS = ("product_key", "date")
+
+ROWS_WRITTEN = REGISTRY.counter(
+    "spimex_rows_written_total", "Записано строк в БД по способу записи"
+)
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "spimex_db_write_seconds",
+    "Время записи пакета файлов в БД (транзакция целиком) по способу записи",
+)
+
+
+@dataclass
+class WriteStats:
+    """
+    Статистика записи строк в БД по способам записи.
+    """
+
+    rows: dict = field(default_factory=dict)  # записано строк по способу
+    seconds: dict = field(default_factory=dict)  # затрачено секунд по способу
+
+    def add(self, mode, rows, seconds):
+        """
+        Учитывает запись `rows` строк способом `mode` за `seconds` секунд.
+        """
+        self.rows[mode] = self.rows.get(mode, 0) + rows
+        self.seconds[mode] = self.seconds.get(mode, 0.0) + seconds
+
+    def summary(self):
+        """
+        Возвращает строку со скоростью записи (строк в секунду) по каждому способу.
+        """
+        return ", ".join(
+            f"{mode}: {rows} строк, {rows / max(self.seconds[mode], 1e-9):.0f} строк/сек"
+            for mode, rows in self.rows.items()
+        )
+
+
+def file_date(path):
+    """
+    Возвращает дату торгов по имени файла отчёта.
+    """
+    date_str = "{0}.{1}.{2}".format(path[-12:-10], path[-14:-12], path[-18:-14])
+    return datetime.strptime(date_str, "%d.%m.%Y").date()
+
+
+def unique_records(records):
+    """
+    Убирает повторы естественного ключа (код инструмента, дата), оставляя последнюю строку.
+    """
+    return list({(r[0], r[-1]): r for r in records}.values())
+
+
+def fact_records(records, keys):
+    """
+    Заменяет в строках атрибуты инструмента его ключом.
+    :param records: строки в порядке FIELDS
+    :param keys: словарь {код инструмента: ключ}
+    :return: список кортежей в порядке FACT_FIELDS
+    """
+    return [(keys[r[0]], r[6], r[7], r[8], r[9]) for r in records]
+
+
+def split_staged(records, staged):
+    """
+    Распределяет строки между промежуточными таблицами подменяемых секций и таблицей торгов.
+    :param records: строки в порядке FACT_FIELDS
+    :param staged: подменяемые секции из clear_dates: {имя: (начало, конец)}
+    :return: словарь {промежуточная таблица или None для таблицы торгов: строки}
+    """
+    tables = {}
+    for record in records:
+        target = next(
+            (
+                stage_name(name)
+                for name, (start, end) in staged.items()
+                if start <= record[-1] < end
+            ),
+            None,
+        )
+        tables.setdefault(target, []).append(record)
+    return tables
+
+
+def upsert_assignments(excluded):
+    """
+    Возвращает значения для обновления существующей строки при конфликте ключа.
+    """
+    values = {f: excluded[f] for f in FACT_FIELDS if f not in KEY_FIELDS}
+    values["updated_on"] = func.now()
+    return values
+
+
+async def write_records_orm(session: AsyncSession, records, upsert=False, target=None):
+    """
+    Записывает строки через ORM (по объекту SpimexTradingResults на строку).
+
+    В режиме upsert строки пишутся пакетной командой
+    INSERT ... ON CONFLICT DO UPDATE по ключу KEY_FIELDS.
+    В промежуточную таблицу секции (`target`, см. db/partitions.py) строки
+    пишутся пакетной командой INSERT.
+    """
+    if target is not None:
+        stmt = insert(table(target, *(column(f) for f in FACT_FIELDS)))
+        await session.execute(stmt, [dict(zip(FACT_FIELDS, r)) for r in records])
+        return
+    if not upsert:
+        session.add_all(
+            SpimexTradingResults(**dict(zip(FACT_FIELDS, r))) for r in records
+        )
+        await session.flush()
+        return
+
+    stmt = insert(SpimexTradingResults)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=KEY_FIELDS, set_=upsert_assignments(stmt.excluded)
+    )
+    await session.execute(stmt, [dict(zip(FACT_FIELDS, r)) for r in records])
+
+
+async def write_records_copy(session: AsyncSession, records, upsert=False, target=None):
+    """
+    Записывает строки одной командой COPY через asyncpg `copy_records_to_table`.
+
+    В режиме upsert строки копируются во временную таблицу и переносятся
+    в основную командой INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    `target` — промежуточная таблица секции вместо таблицы торгов (см. db/partitions.py).
+    Если драйвер не поддерживает COPY, строки записываются через ORM.
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not hasattr(driver_connection, "copy_records_to_table"):
+        return await write_records_orm(session, records, upsert, target)
+
+    table_name = target or SpimexTradingResults.__tablename__
+    if not upsert:
+        await driver_connection.copy_records_to_table(
+            table_name, records=records, columns=FACT_FIELDS
+        )
+        return
+
+    stage = f"{table_name}_stage"
+    columns = ", ".join(FACT_FIELDS)
+    await session.execute(
+        text(
+            f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {table_name} WITH NO DATA"
+        )
+    )
+    await driver_connection.copy_records_to_table(
+        stage, records=records, columns=FACT_FIELDS
+    )
+
+    updates = ", ".join(
+        [f"{f} = EXCLUDED.{f}" for f in FACT_FIELDS if f not in KEY_FIELDS]
+        + ["updated_on = now()"]
+    )
+    await session.execute(
+        text(
+            f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {stage} "
+            f"ON CONFLICT ({', '.join(KEY_FIELDS)}) DO UPDATE SET {updates}"
+        )
+    )
+
+
+# Способы записи строк в БД (настройка DB_WRITE_MODE)
+WRITERS = {"copy": write_records_copy, "orm": write_records_orm}
+
+
+async def save_files(
+    files,
+    session: AsyncSession,
+    mode=DB_WRITE_MODE,
+    conflict=DB_CONFLICT_MODE,
+    stats=None,
+):
+    """
+    Сохраняет строки нескольких файлов в одной транзакции
+    и пересчитывает дневные итоги и список торговых дней за их даты.
+    Новые инструменты и базисы поставки добавляются в таблицы измерений
+    через кэш ключей сессии (см. db/dimensions.py).
+
+    Повторная загрузка файла не создаёт дублей, а читатели до фиксации
+    транзакции видят прежние данные:
+    - conflict="upsert": строки обновляются по ключу (код инструмента, дата),
+      а строки за эти даты, которых больше нет в файлах, удаляются;
+    - conflict="replace": строки за даты этих файлов удаляются и записываются заново;
+      в секционированной таблице секции, целиком состоящие из этих дат, заполняются
+      в промежуточных таблицах и подменяются в конце транзакции без построчного
+      удаления (см. db/partitions.py); другие загрузки ждут фиксации транзакции.
+    :param files: список пар (путь к файлу, строки из parse_file или TransformedRows,
+        уже преобразованные в процессе разбора)
+    :param session: сессия для работы с БД
+    :param mode: способ записи: "copy" или "orm"
+    :param conflict: способ обработки уже загруженных дат: "upsert" или "replace"
+    :param stats: WriteStats для учёта скорости записи
+    """
+    dates = set()
+    records = []
+    for path, rows in files:
+        trading_date = file_date(path)
+        dates.add(trading_date)
+        if not isinstance(rows, TransformedRows):
+            rows = transform_rows(rows, trading_date)
+            report_rejects(path, rows.rejects)
+        records.extend(rows.records())
+    records = unique_records(records)
+
+    start = perf_counter()
+    await ensure_partitions(session, dates)
+    if conflict == "replace":
+        staged = await clear_dates(session, dates)
+    else:
+        await lock_for_write(session)
+    dimensions = dimension_cache(session)
+    records = fact_records(records, await dimensions.resolve(session, records))
+    if conflict == "replace":
+        for target, rows in split_staged(records, staged).items():
+            await WRITERS[mode](session, rows, target=target)
+        await swap_partitions(session, staged, DB_PARTITION_CLEAR)
+    else:
+        if records:
+            await WRITERS[mode](session, records, upsert=True)
+        for trading_date in dates:
+            product_keys = [r[0] for r in records if r[-1] == trading_date]
+            await session.execute(
+                delete(SpimexTradingResults).where(
+                    SpimexTradingResults.date == trading_date,
+                    SpimexTradingResults.product_key.not_in(product_keys),
+                )
+            )
+    await refresh_daily_rollups(session, dates)
+    await refresh_trading_days(session, dates)
+    await session.commit()
+    dimensions.commit()
+
+    elapsed = perf_counter() - start
+    ROWS_WRITTEN.inc(len(records), mode=mode)
+    DB_WRITE_SECONDS.observe(elapsed, mode=mode)
+    if stats is not None:
+        stats.add(mode, len(records), elapsed)
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import os
+import random
+from dataclasses import dataclass
+from time import time
+
+import aiofiles
+import aiohttp
+
+from config import (DOWNLOAD_BACKOFF, DOWNLOAD_CHUNK_SIZE,
+                    DOWNLOAD_LIMIT_PER_HOST, DOWNLOAD_MAX_CONCURRENCY,
+                    DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT)
+from metrics import REGISTRY
+
+# Коды ответа, при которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Итоговые статусы загрузки одного файла
+STATUS_DOWNLOADED = "downloaded"
+STATUS_NOT_MODIFIED = "not_modified"
+STATUS_FAILED = "failed"
+
+DOWNLOADS = REGISTRY.counter(
+    "spimex_downloads_total", "Загрузки файлов отчётов по итоговому статусу"
+)
+DOWNLOAD_BYTES = REGISTRY.counter(
+    "spimex_download_bytes_total", "Скачано байт файлов отчётов"
+)
+DOWNLOAD_RETRIES_TOTAL = REGISTRY.counter(
+    "spimex_download_retries_total", "Повторные попытки загрузки файлов"
+)
+DOWNLOAD_SECONDS = REGISTRY.histogram(
+    "spimex_download_seconds", "Время загрузки файла отчёта, включая повторы"
+)
+
+
+class RetryableStatus(Exception):
+    """
+    Сервер вернул временную ошибку, запрос можно повторить.
+    """
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+@dataclass
+class DownloadResult:
+    """
+    Результат загрузки одного файла.
+    """
+
+    url: str
+    path: str
+    status: str
+    size: int = 0
+    sha256: str = ""
+    etag: str = ""
+    last_modified: str = ""
+
+
+@dataclass
+class DownloadStats:
+    """
+    Сводка по одному запуску загрузки.
+    """
+
+    files: int = 0  # успешно скачанных файлов
+    not_modified: int = 0  # файлов без изменений (ответ 304)
+    bytes: int = 0  # записано байт
+    retries: int = 0  # повторных попыток
+    failures: int = 0  # файлов, которые не удалось скачать
+    started_at: float = 0.0
+
+    def summary(self):
+        """
+        Возвращает строку со сводкой по запуску.
+        """
+        elapsed = time() - self.started_at if self.started_at else 0.0
+        return (
+            f"Скачано файлов: {self.files}, без изменений: {self.not_modified}, "
+            f"байт: {self.bytes}, "
+            f"повторов: {self.retries}, ошибок: {self.failures}, "
+            f"время: {elapsed:.2f} сек"
+        )
+
+
+class DownloadEngine:
+    """
+    Загрузчик файлов с ограничением параллельности, повторами и потоковой записью на диск.
+
+    Тело ответа пишется частями во временный файл `<имя>.part`, который после
+    успешной загрузки атомарно переименовывается в итоговый. Временные ошибки
+    (сетевые, таймауты, коды из RETRY_STATUSES) повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DOWNLOAD_MAX_CONCURRENCY,
+        limit_per_host=DOWNLOAD_LIMIT_PER_HOST,
+        retries=DOWNLOAD_RETRIES,
+        backoff=DOWNLOAD_BACKOFF,
+        timeout=DOWNLOAD_TIMEOUT,
+        chunk_size=DOWNLOAD_CHUNK_SIZE,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit_per_host = max(1, limit_per_host)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.stats = DownloadStats()
+
+    def create_session(self):
+        """
+        Создаёт HTTP-сессию с ограничениями на число соединений (всего и на хост).
+        """
+        self.stats = DownloadStats(started_at=time())
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.limit_per_host
+        )
+        return aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def _fetch_to_file(self, session, url, filepath, headers):
+        """
+        Выполняет одну попытку загрузки.
+        :return: DownloadResult со статусом STATUS_DOWNLOADED или STATUS_NOT_MODIFIED
+        """
+        tmp_path = f"{filepath}.part"
+        result = DownloadResult(url=url, path=filepath, status=STATUS_DOWNLOADED)
+        digest = hashlib.sha256()
+        try:
+            async with self.semaphore:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        result.status = STATUS_NOT_MODIFIED
+                        return result
+                    if response.status in RETRY_STATUSES:
+                        raise RetryableStatus(response.status)
+                    response.raise_for_status()
+
+                    result.etag = response.headers.get("ETag", "")
+                    result.last_modified = response.headers.get("Last-Modified", "")
+                    async with aiofiles.open(tmp_path, mode="wb") as f:
+                        async for chunk in response.content.iter_chunked(
+                            self.chunk_size
+                        ):
+                            await f.write(chunk)
+                            digest.update(chunk)
+                            result.size += len(chunk)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        result.sha256 = digest.hexdigest()
+        return result
+
+    async def download(self, session, url, filepath, headers=None):
+        """
+        Скачивает файл с повторами при временных ошибках.
+        :param session: сессия, созданная через create_session
+        :param url: адрес файла
+        :param filepath: путь для сохранения
+        :param headers: дополнительные заголовки (например, для условного запроса)
+        :return: DownloadResult
+        """
+        start = time()
+        for attempt in range(self.retries + 1):
+            try:
+                result = await self._fetch_to_file(session, url, filepath, headers)
+            except (aiohttp.ClientResponseError, aiohttp.InvalidURL) as e:
+                # ошибки 4xx повторять бессмысленно
+                print(f"Ошибка {getattr(e, 'status', '')} при скачивании {url}")
+                break
+            except (RetryableStatus, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    print(f"Ошибка при скачивании {url}: {e!r}")
+                    break
+                self.stats.retries += 1
+                DOWNLOAD_RETRIES_TOTAL.inc()
+                delay = self.backoff * 2**attempt
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            else:
+                if result.status == STATUS_NOT_MODIFIED:
+                    self.stats.not_modified += 1
+                else:
+                    self.stats.files += 1
+                    self.stats.bytes += result.size
+                    DOWNLOAD_BYTES.inc(result.size)
+                DOWNLOADS.inc(status=result.status)
+                DOWNLOAD_SECONDS.observe(time() - start)
+                return result
+
+        self.stats.failures += 1
+        DOWNLOADS.inc(status=STATUS_FAILED)
+        return DownloadResult(url=url, path=filepath, status=STATUS_FAILED)
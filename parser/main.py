@@ -1,9 +1,42 @@
+import argparse
 import asyncio
+import json
+import os
+from datetime import date, datetime, timezone
+from parser.backfill import (backfill, load_checkpoints, parse_shard,
+                             save_checkpoint)
+from parser.daemon import run_daemon
 from parser.spimex_downloader import URLManager
-from parser.spimex_parser import process_all_files_in_folder
-from time import time
+from parser.spimex_parser import process_files
+from parser.sync_manifest import SyncManifest, report_name
+from time import perf_counter, time
 
-from db.database import async_session_maker, create_db, drop_db
+from redis.exceptions import RedisError
+from sqlalchemy import exists, select
+
+from app.cache import bump_data_version
+from config import DB_REPLICA_HOST, PARSER_REPORT_PATH
+from db.database import async_session_maker, create_db, wait_for_replica
+from db.model import SpimexTradingResults
+from metrics import REGISTRY
+
+
+def write_run_report(stages, started_at, path=PARSER_REPORT_PATH):
+    """
+    Сохраняет JSON-отчёт о запуске: длительность этапов и значения метрик парсера.
+    :param stages: словарь {этап: длительность в секундах}
+    :param started_at: время начала запуска (UTC)
+    :param path: путь к файлу отчёта
+    """
+    report = {
+        "started_at": started_at.isoformat(),
+        "stages": {name: round(seconds, 3) for name, seconds in stages.items()},
+        "metrics": REGISTRY.snapshot(),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1, default=str)
+    os.replace(tmp_path, path)
 
 
 async def main():
@@ -11,34 +44,212 @@ async def main():
     Основная асинхронная функция для обработки данных торгов Spimex.
 
     Выполняет последовательно следующие операции:
-    1. Удаляет существующую базу данных (если есть)
-    2. Создает новую базу данных
-    3. Загружает XLS-файлы с результатами торгов с сайта Spimex
-    4. Обрабатывает все загруженные файлы из папки 'tables' и сохраняет данные в БД
-    5. Замеряет и выводит общее время выполнения
+    1. Создает таблицы БД, если их еще нет, и применяет миграции схемы
+    2. Загружает манифест синхронизации и добавляет в него ранее скачанные файлы
+    3. Загружает с сайта Spimex только новые или изменившиеся XLS-файлы
+    4. Разбирает новые или изменившиеся файлы в пуле процессов и параллельно
+       сохраняет готовые данные в БД
+    5. Увеличивает версию данных в Redis, если в БД что-то загружено
+    6. Замеряет и выводит общее время выполнения, сохраняет отчёт о запуске
+       с длительностью этапов и метриками (PARSER_REPORT_PATH)
     """
 
     start_time = time()
+    started_at = datetime.now(timezone.utc)
+    stages = {}
+    stage_start = perf_counter()
 
-    await drop_db()
     await create_db()
-    print("База данных создана")
+    print("База данных готова")
+
+    manifest = await load_manifest()
+    stages["prepare"] = perf_counter() - stage_start
+
+    saved = await sync(manifest, stages)
+
+    await publish_data_version(saved)
+
+    print("Обработка всех файлов завершена")
+
+    elapsed_time = time() - start_time
+    stages["total"] = elapsed_time
+    write_run_report(stages, started_at)
+    print(f"Время выполнения: {elapsed_time} сек")
+
 
+async def load_manifest():
+    """
+    Загружает манифест синхронизации и добавляет в него ранее скачанные файлы.
+
+    Если таблица торгов пуста (БД пересоздали), все файлы возвращаются в очередь.
+    """
+    manifest = SyncManifest.load()
+    manifest.adopt_local_files("tables")
+
+    async with async_session_maker() as session:
+        if not await session.scalar(select(exists().select_from(SpimexTradingResults))):
+            manifest.reset_ingested()
+    return manifest
+
+
+async def sync(manifest, stages, **options):
+    """
+    Скачивает с сайта Spimex новые и изменившиеся отчёты и загружает их в БД.
+
+    Таблица контрольных точек догрузки — источник истины о загруженных в БД файлах:
+    файлы, которые с тем же содержимым уже загрузила догрузка (backfill), не загружаются
+    повторно, а после сохранения каждого файла он отмечается в манифесте и в этой таблице.
+    :param manifest: манифест синхронизации
+    :param stages: словарь, в который записывается длительность этапов download и process
+    :param options: параметры URLManager (например, start_date)
+    :return: список загруженных в БД файлов
+    """
     # Загружаем XLS-файлы с результатами торгов с сайта Spimex
 
-    manager = URLManager()
+    stage_start = perf_counter()
+    manager = URLManager(manifest=manifest, **options)
     await manager.download_xls_files()
+    stages["download"] = perf_counter() - stage_start
 
-    # Обрабатываем все файлы в папке tables
+    # Обрабатываем только новые и изменившиеся файлы
 
+    stage_start = perf_counter()
     async with async_session_maker() as session:
-        await process_all_files_in_folder("tables", session)
+        checkpoints = await load_checkpoints(
+            session, [report_name(path) for path in manifest.pending()]
+        )
+        if manifest.adopt_checkpoints(checkpoints):
+            manifest.save()
 
-    print("Обработка всех файлов завершена")
+        pending = manifest.pending()
+        print(f"Файлов для обработки: {len(pending)}")
 
-    elapsed_time = time() - start_time
-    print(f"Время выполнения: {elapsed_time} сек")
+        async def on_saved(file_path):
+            manifest.mark_ingested(file_path)
+            manifest.save()
+            # контрольная точка позволяет догрузке (backfill) пропустить этот файл
+            entry = manifest.entries[report_name(file_path)]
+            await save_checkpoint(session, file_path, entry.get("sha256"))
+
+        saved = await process_files(pending, session, on_saved=on_saved)
+    stages["process"] = perf_counter() - stage_start
+    return saved
+
+
+async def publish_data_version(saved):
+    """
+    Увеличивает версию данных в Redis, если в БД что-то загружено:
+    новая версия делает устаревшими все закэшированные ответы API.
+
+    API читает с реплики (DB_REPLICA_HOST), поэтому версия увеличивается только после того,
+    как реплика применит загрузку. Иначе промах кэша под новой версией прочитал бы с реплики
+    прежние данные и закэшировал их на CACHE_EXPIRE секунд.
+    """
+    if not saved:
+        return
+    if DB_REPLICA_HOST and not await wait_for_replica():
+        print(
+            "Реплика не применила загрузку за DB_REPLICA_WAIT_TIMEOUT секунд: "
+            "версия данных для кэша API не обновлена"
+        )
+        return
+    try:
+        print(f"Версия данных для кэша API: {await bump_data_version()}")
+    except RedisError as e:
+        print(f"Не удалось обновить версию данных в Redis: {e}")
+
+
+async def run_backfill(start_date, end_date, shard, shards, download=True):
+    """
+    Догружает отчёты за диапазон дат (см. parser/backfill.py) и обновляет версию данных.
+    """
+    start_time = time()
+    await create_db()
+    saved = await backfill(start_date, end_date, shard, shards, download=download)
+    await publish_data_version(saved)
+    print(
+        f"Загружено файлов: {len(saved)}, время выполнения: {time() - start_time} сек"
+    )
+
+
+async def run_daemon_command():
+    """
+    Запускает ежедневную загрузку новых итогов торгов с прогревом кэша API
+    (см. parser/daemon.py). Перед этим догружает пропущенные отчёты обычной синхронизацией.
+    """
+    await create_db()
+    manifest = await load_manifest()
+    await publish_data_version(await sync(manifest, {}))
+
+    async def ingest(day):
+        # только первая страница списка: новые отчёты на ней
+        saved = await sync(manifest, {}, start_date=day.isoformat(), page_window=1)
+        return saved, manifest.has_ingested(day.isoformat())
+
+    await run_daemon(ingest, publish_data_version)
+
+
+def shard_argument(value):
+    """
+    Тип аргумента --shard для argparse.
+    """
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+
+    Без команды выполняется обычная синхронизация (main), команда backfill
+    догружает отчёты за диапазон дат, а daemon ежедневно загружает новые итоги торгов.
+    """
+    parser = argparse.ArgumentParser(description="Загрузка результатов торгов Spimex")
+    commands = parser.add_subparsers(dest="command")
+    backfill_parser = commands.add_parser(
+        "backfill", help="догрузка отчётов за период с возобновлением после сбоя"
+    )
+    backfill_parser.add_argument(
+        "--from",
+        dest="start_date",
+        type=date.fromisoformat,
+        required=True,
+        help="первая дата торгов (ГГГГ-ММ-ДД)",
+    )
+    backfill_parser.add_argument(
+        "--to",
+        dest="end_date",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="последняя дата торгов (по умолчанию сегодня)",
+    )
+    backfill_parser.add_argument(
+        "--shard",
+        type=shard_argument,
+        default=(0, 1),
+        help="часть отчётов i/n для этого процесса (i от 0 до n-1), по умолчанию 0/1",
+    )
+    backfill_parser.add_argument(
+        "--no-download",
+        dest="download",
+        action="store_false",
+        help="не скачивать отчёты, загрузить только уже скачанные",
+    )
+    commands.add_parser(
+        "daemon", help="ежедневная загрузка новых итогов торгов и прогрев кэша API"
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.command == "backfill":
+        asyncio.run(
+            run_backfill(args.start_date, args.end_date, *args.shard, args.download)
+        )
+    elif args.command == "daemon":
+        asyncio.run(run_daemon_command())
+    else:
+        asyncio.run(main())
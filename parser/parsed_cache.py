@@ -0,0 +1,86 @@
+import marshal
+import os
+import zlib
+from array import array
+from parser.transform import FIELDS, TransformedRows
+
+from config import PARSED_CACHE_DIR
+
+# Версия разбора и преобразования строк: увеличивается при любом изменении
+# parse_file или transform_rows, чтобы ранее сохранённые результаты не использовались
+PARSER_VERSION = 1
+
+# Заголовок файла кэша
+MAGIC = b"SPXC"
+
+# Целочисленные столбцы хранятся массивами int64, остальные (кроме даты) — списками строк.
+# Дата не хранится: она берётся из имени файла отчёта
+INT_FIELDS = ("volume", "total", "count")
+STORED_FIELDS = tuple(name for name in FIELDS if name != "date")
+
+
+def cache_path(file_path, digest, reader):
+    """
+    Возвращает путь к файлу кэша для XLS-файла с содержимым `digest`.
+
+    Кэш хранится в папке PARSED_CACHE_DIR рядом с XLS-файлом, а в имени
+    учитываются способ чтения, версия разбора и формат marshal.
+    """
+    name = f"{digest}.{reader}.v{PARSER_VERSION}.m{marshal.version}.bin"
+    return os.path.join(os.path.dirname(file_path), PARSED_CACHE_DIR, name)
+
+
+def encode(transformed):
+    """
+    Кодирует преобразованные строки файла в сжатый двоичный формат по столбцам.
+    """
+    columns = {}
+    for name in STORED_FIELDS:
+        values = transformed.columns[name]
+        columns[name] = array("q", values).tobytes() if name in INT_FIELDS else values
+    payload = marshal.dumps({"columns": columns, "rejects": transformed.rejects})
+    return MAGIC + zlib.compress(payload, 1)
+
+
+def decode(data, trading_date):
+    """
+    Восстанавливает преобразованные строки файла из кэша.
+    :param data: содержимое файла кэша
+    :param trading_date: дата торгов (по имени файла отчёта)
+    :raises ValueError: если файл кэша повреждён
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("неизвестный формат кэша")
+    payload = marshal.loads(zlib.decompress(data[len(MAGIC) :]))
+    columns = {}
+    for name, values in payload["columns"].items():
+        columns[name] = array("q", values).tolist() if name in INT_FIELDS else values
+    columns["date"] = [trading_date] * len(columns["exchange_product_id"])
+    rejects = [tuple(reject) for reject in payload["rejects"]]
+    return TransformedRows(columns, rejects)
+
+
+def load(path, trading_date):
+    """
+    Читает результат разбора из кэша.
+    :return: TransformedRows или None, если записи нет или она повреждена
+    """
+    try:
+        with open(path, "rb") as f:
+            return decode(f.read(), trading_date)
+    except FileNotFoundError:
+        return None
+    except (ValueError, EOFError, TypeError, KeyError, zlib.error) as e:
+        print(f"Повреждённый кэш разбора {os.path.basename(path)}: {e}")
+        return None
+
+
+def store(path, transformed):
+    """
+    Атомарно сохраняет результат разбора в кэш.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode(transformed))
+    os.replace(tmp_path, path)
@@ -1,11 +1,21 @@
 import asyncio
 import os
 import re
+from collections import deque
+from parser.download_engine import DownloadEngine
+from parser.sync_manifest import (SyncManifest, in_shard, report_date,
+                                  report_name)
+from urllib.parse import urljoin
 
-import aiofiles
 import aiohttp
 
-from config import SPIMEX_URL
+from config import (SPIMEX_PAGE_CONCURRENCY, SPIMEX_PAGE_WINDOW,
+                    SPIMEX_START_DATE, SPIMEX_URL)
+from metrics import REGISTRY
+
+PAGES_CRAWLED = REGISTRY.counter(
+    "spimex_pages_crawled_total", "Загружено страниц списка отчётов Spimex"
+)
 
 if not os.path.isdir("tables/"):
     os.makedirs("tables/", exist_ok=True)
@@ -16,18 +26,121 @@ class URLManager:
     Класс для управления загрузкой XLS-файлов с результатами торгов с сайта Spimex.
     """
 
-    url: str  # адрес сайта Spimex
-    page_number: int  # номер страницы для загрузки
+    url: str  # адрес страницы со списком отчётов
+    folder: str  # папка для скачанных файлов
+    page_number: int  # номер последней обработанной страницы
+    page_window: int  # сколько страниц запрашивается наперёд
+    page_semaphore: asyncio.Semaphore  # ограничение одновременных запросов страниц
     href_pattern: re.Pattern  # регулярное выражение для поиска ссылок на XLS-файлы
     tables_hrefs: list  # список найденных ссылок на XLS-файлы
-    existing_files: list  # список файлов в локальной директории 'tables/'
+    existing_files: list  # список файлов в папке folder
+    engine: DownloadEngine  # загрузчик файлов
+    manifest: SyncManifest | None  # манифест синхронизации (None — без манифеста)
+    start_date: str | None  # первая дата отчётов (ISO), более ранние не загружаются
+    end_date: str | None  # последняя дата отчётов (ISO)
+    shard: tuple[int, int] | None  # часть отчётов (номер, число частей), см. in_shard
 
-    def __init__(self):
-        self.url = SPIMEX_URL
+    def __init__(
+        self,
+        page_window=SPIMEX_PAGE_WINDOW,
+        page_concurrency=SPIMEX_PAGE_CONCURRENCY,
+        engine=None,
+        manifest=None,
+        url=SPIMEX_URL,
+        folder="tables",
+        start_date=SPIMEX_START_DATE,
+        end_date=None,
+        shard=None,
+    ):
+        self.url = url
+        self.folder = folder
         self.page_number = 0
-        self.href_pattern = re.compile(r"/upload/reports/oil_xls/oil_xls_202[3-6]\d*")
+        self.page_window = max(1, page_window)
+        self.page_semaphore = asyncio.Semaphore(max(1, page_concurrency))
+        self.href_pattern = re.compile(r"/upload/reports/oil_xls/oil_xls_\d{14}")
         self.tables_hrefs = []
-        self.existing_files = os.listdir("tables/")
+        os.makedirs(folder, exist_ok=True)
+        self.existing_files = os.listdir(folder)
+        self.engine = engine or DownloadEngine()
+        self.manifest = manifest
+        self.start_date = start_date
+        self.end_date = end_date
+        self.shard = shard
+
+    def accepts(self, name):
+        """
+        Проверяет, что отчёт входит в диапазон дат и часть отчётов этого загрузчика.
+        """
+        day = report_date(name)
+        if self.start_date and day < self.start_date:
+            return False
+        if self.end_date and day > self.end_date:
+            return False
+        return self.shard is None or in_shard(name, *self.shard)
+
+    async def fetch_page_links(self, session, page_number):
+        """
+        Асинхронно загружает одну страницу со списком отчётов.
+        :param session: HTTP-сессия aiohttp
+        :param page_number: номер страницы
+        :return: список ссылок на XLS-файлы (пустой, если страница пуста или недоступна)
+        """
+        url = f"{self.url}?page=page-{page_number}"
+        async with self.page_semaphore:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return []
+                data = await response.text()
+        PAGES_CRAWLED.inc()
+        # ищем ссылки на XLS-файлы с помощью регулярного выражения
+        return [urljoin(self.url, href) for href in self.href_pattern.findall(data)]
+
+    async def iter_report_links(self, session):
+        """
+        Асинхронный генератор ссылок на XLS-файлы.
+
+        Страницы запрашиваются скользящим окном из `page_window` штук (не более
+        `page_semaphore` одновременно), а ссылки отдаются по порядку страниц сразу
+        после разбора каждой из них. Отдаются только ссылки, подходящие по `accepts`.
+        Обход останавливается на первой пустой странице (запросы к страницам за ней
+        отменяются) и на странице, все отчёты которой старше `start_date` — отчёты
+        на сайте идут от новых к старым. Если задан манифест, обход также
+        останавливается на странице, где встретился уже известный отчёт.
+        :param session: HTTP-сессия aiohttp
+        """
+        pending = deque()
+        next_page = self.page_number + 1
+        try:
+            while True:
+                while len(pending) < self.page_window:
+                    pending.append(
+                        asyncio.create_task(self.fetch_page_links(session, next_page))
+                    )
+                    next_page += 1
+
+                hrefs = await pending.popleft()
+                if not hrefs:
+                    break
+
+                self.page_number += 1
+                # проверяем до отдачи ссылок: скачанные файлы сразу попадают в манифест
+                reached_known = self.manifest is not None and any(
+                    self.manifest.is_known(report_name(href)) for href in hrefs
+                )
+                reached_start = self.start_date is not None and all(
+                    report_date(report_name(href)) < self.start_date for href in hrefs
+                )
+                for href in hrefs:
+                    if not self.accepts(report_name(href)):
+                        continue
+                    self.tables_hrefs.append(href)
+                    yield href
+                if reached_known or reached_start:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     async def fetch_report_links(self):
         """
@@ -35,49 +148,58 @@ class URLManager:
         """
         print("Получение данных с сайта Spimex")
         async with aiohttp.ClientSession() as session:
-            while True:
-                self.page_number += 1
-                url = f"{self.url}?page=page-{self.page_number}"
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        break
-                    data = await response.text()
-                    hrefs = re.findall(self.href_pattern, data)
-                    # ищем ссылки на XLS-файлы с помощью регулярного выражения
-                    if hrefs:
-                        for href in hrefs:
-                            href = f"https://spimex.com/{href}"
-                            self.tables_hrefs.append(href)
-                    else:
-                        break
+            async for _ in self.iter_report_links(session):
+                pass
         return self.tables_hrefs
 
     async def download_file(self, session, href):
         """
         Асинхронно скачивает файл по ссылке, если он еще не скачан.
+
+        С манифестом уже известные файлы запрашиваются условно
+        (If-None-Match / If-Modified-Since), а результат записывается в манифест.
         """
-        filename = href[-22:] + ".xls"
-        filepath = os.path.join("tables", filename)
-        if filename in self.existing_files:
+        name = report_name(href)
+        filepath = os.path.join(self.folder, name + ".xls")
+
+        if self.manifest is None:
+            if name + ".xls" not in self.existing_files:
+                await self.engine.download(session, href, filepath)
             return
 
-        try:
-            async with session.get(href) as response:
-                if response.status == 200:
-                    content = await response.read()
-                    async with aiofiles.open(filepath, mode="wb") as f:
-                        await f.write(content)
-                else:
-                    print(f"Ошибка {response.status} при скачивании {href}")
-        except Exception as e:
-            print(f"Ошибка при скачивании {href}: {e}")
+        headers = self.manifest.conditional_headers(name, filepath)
+        result = await self.engine.download(session, href, filepath, headers)
+        self.manifest.record_download(name, result)
 
     async def download_xls_files(self):
         """
         Асинхронно скачивает все найденные файлы.
+
+        Скачивание каждого файла начинается сразу, как только разобрана
+        страница со ссылкой на него, не дожидаясь окончания обхода.
+        Число одновременных загрузок и повторы задаются настройками DownloadEngine.
+        С манифестом также повторяются неудачные загрузки прошлых запусков,
+        а манифест сохраняется по окончании.
+        :return: сводка DownloadStats по запуску
         """
-        await self.fetch_report_links()
-        print("XLS-файлы скачиваются")
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.download_file(session, href) for href in self.tables_hrefs]
+        print("Получение данных с сайта Spimex, XLS-файлы скачиваются")
+        async with (
+            aiohttp.ClientSession() as pages_session,
+            self.engine.create_session() as session,
+        ):
+            tasks = [
+                asyncio.create_task(self.download_file(session, href))
+                async for href in self.iter_report_links(pages_session)
+            ]
+            if self.manifest is not None:
+                tasks += [
+                    asyncio.create_task(self.download_file(session, href))
+                    for href in self.manifest.failed()
+                    if href not in self.tables_hrefs
+                ]
             await asyncio.gather(*tasks)
+
+        if self.manifest is not None:
+            self.manifest.save()
+        print(self.engine.stats.summary())
+        return self.engine.stats
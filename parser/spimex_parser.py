@@ -1,12 +1,43 @@
 import asyncio
+import inspect
+import multiprocessing
 import os
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from parser import parsed_cache
+from parser.db_writer import WriteStats, file_date, save_files
+from parser.sync_manifest import file_sha256
+from parser.transform import report_rejects, transform_rows
+from time import perf_counter
 
-from sqlalchemy.ext.asyncio import AsyncSession
 from xlrd import open_workbook
 
-from config import SPIMEX_TABLE_NAME
-from db.model import SpimexTradingResults
+from config import (DB_WRITE_BATCH_FILES, PARSER_QUEUE_SIZE, PARSER_READER,
+                    PARSER_WORKERS, SPIMEX_TABLE_NAME)
+from metrics import REGISTRY
+
+# Номера столбцов таблицы Spimex, которые сохраняются в БД: код инструмента,
+# наименование, базис поставки, объём (E), сумма в рублях (F) и количество договоров (O)
+TABLE_COLUMNS = (1, 2, 3, 4, 5, 14)
+
+# Столбцы, в которых ищутся название таблицы и строка "Итого"
+MARKER_COLUMNS = (1,)
+
+WORKBOOK_OPEN_SECONDS = REGISTRY.histogram(
+    "spimex_workbook_open_seconds", "Время открытия XLS-файла"
+)
+PARSE_SECONDS = REGISTRY.histogram(
+    "spimex_parse_seconds", "Время разбора XLS-файла, включая открытие"
+)
+ROWS_PARSED = REGISTRY.counter(
+    "spimex_rows_parsed_total", "Прочитано строк таблицы (метрические тонны)"
+)
+PARSED_CACHE = REGISTRY.counter(
+    "spimex_parsed_cache_total", "Обращения к кэшу разобранных файлов (hit или miss)"
+)
+ROWS_FILTERED = REGISTRY.counter(
+    "spimex_rows_filtered_total",
+    "Отброшено строк таблицы: заголовки и строки без договоров",
+)
 
 
 def read_table_by_name(sheet, table_name):
@@ -69,75 +100,318 @@ def filter_by_column_number(table_data, column_num, condition=lambda x: x > 0):
     return filtered
 
 
-async def save_to_db(data, path, session: AsyncSession):
+def locate_table(sheet, table_name, columns=MARKER_COLUMNS):
     """
-    Асинхронно сохраняет данные о торгах в БД
-    :param data: список строк для сохранения
-    :param path: имя файла для формирования даты
-    :param session: сессия для работы с БД
+    Находит строки таблицы между названием и строкой "Итого", просматривая только указанные столбцы
+    :param sheet: лист Excel
+    :param table_name: название таблицы для поиска
+    :param columns: столбцы, в которых ищутся название и "Итого"
+    :return: номера первой и следующей за последней строки таблицы или None
     """
+    for col in columns:
+        if col >= sheet.ncols:
+            continue
+
+        values = sheet.col_values(col)
+        if table_name not in values:
+            continue
+
+        start = values.index(table_name) + 1
+        for row_idx in range(start, len(values)):
+            cell = values[row_idx]
+            if isinstance(cell, str) and "Итого" in cell:
+                return start, row_idx
+        return start, len(values)
+
+    return None
 
-    date_str = "{0}.{1}.{2}".format(path[-12:-10], path[-14:-12], path[-18:-14])
 
-    for row in data[1:]:  # Пропускаем заголовок
+def read_table_columns(sheet, start, end, columns=TABLE_COLUMNS):
+    """
+    Читает только нужные столбцы таблицы в диапазоне строк и фильтрует строки по последнему из них (количеству договоров)
+    :param sheet: лист Excel
+    :param start: первая строка таблицы
+    :param end: строка, следующая за последней
+    :param columns: номера столбцов
+    :return: список кортежей со значениями столбцов
+    """
+    if max(columns) >= sheet.ncols:
+        print(f"Ошибка: в таблице только {sheet.ncols} столбцов")
+        return []
+
+    rows = []
+    for row in zip(*(sheet.col_values(col, start, end) for col in columns)):
+        count = row[-1]
+        if isinstance(count, float):
+            if count > 0:
+                rows.append(row)
+            continue
         try:
-            exchange_product_id = str(row[1])
-            exchange_product_name = str(row[2])
-            delivery_basis_name = str(row[3])
-            volume = str(row[5])
-            total = str(row[6])
-            count = int(float(row[14]))
-
-            oil_id = str(exchange_product_id)[:4]
-            delivery_basis_id = str(exchange_product_id)[4:7]
-            delivery_type_id = str(exchange_product_id)[-1]
-
-            new_entry = SpimexTradingResults(
-                exchange_product_id=exchange_product_id,
-                exchange_product_name=exchange_product_name,
-                oil_id=oil_id,
-                delivery_basis_id=delivery_basis_id,
-                delivery_basis_name=delivery_basis_name,
-                delivery_type_id=delivery_type_id,
-                volume=volume,
-                total=total,
-                count=count,
-                date=datetime.strptime(date_str, "%d.%m.%Y").date(),
-            )
-
-            session.add(new_entry)
+            if str(count).strip() and float(count) > 0:
+                rows.append(row)
+        except (ValueError, TypeError):
+            continue  # Пропускаем заголовки и некорректные данные
 
-        except Exception as e:
-            print(f"Ошибка при добавлении строки: {e}")
+    return rows
+
+
+def parse_file_full(file_path, stats=None):
+    """
+    Читает XLS-файл с разбором форматирования и просмотром всех ячеек (исходный способ)
+    :param file_path: путь к файлу
+    :param stats: словарь для замеров (open_seconds, rows_read)
+    :return: список кортежей со значениями столбцов TABLE_COLUMNS
+    """
+    stats = {} if stats is None else stats
+    start = perf_counter()
+    workbook = open_workbook(file_path, formatting_info=True)
+    stats["open_seconds"] = perf_counter() - start
+    sheet = workbook.sheet_by_index(0)
+
+    # Извлекаем таблицу по названию
+    sales_table = read_table_by_name(sheet, SPIMEX_TABLE_NAME)
+    if not sales_table:
+        return []
+    stats["rows_read"] = len(sales_table)
 
-    await session.commit()
+    # Фильтруем по количеству договоров
+    filtered = filter_by_column_number(sales_table, 14)
 
+    return [tuple(row[col] for col in TABLE_COLUMNS) for row in filtered[1:]]
 
-async def process_file(file_path, session):
+
+def parse_file_fast(file_path, stats=None):
     """
-    Асинхронно обрабатывает один XLS-файл
+    Читает XLS-файл без записей форматирования и только нужные столбцы.
+
+    Границы таблицы ищутся по столбцам MARKER_COLUMNS; если название там
+    не найдено, файл читается исходным способом.
     :param file_path: путь к файлу
-    :param session: сессия для работы с БД
+    :param stats: словарь для замеров (open_seconds, rows_read)
+    :return: список кортежей со значениями столбцов TABLE_COLUMNS
     """
+    stats = {} if stats is None else stats
+    start = perf_counter()
+    workbook = open_workbook(file_path, formatting_info=False, on_demand=True)
+    stats["open_seconds"] = perf_counter() - start
     try:
-        workbook = await asyncio.to_thread(
-            open_workbook, file_path, formatting_info=True
-        )
         sheet = workbook.sheet_by_index(0)
+        bounds = locate_table(sheet, SPIMEX_TABLE_NAME)
+        if bounds is None:
+            # Нестандартная разметка файла: ищем таблицу по всем ячейкам
+            sales_table = read_table_by_name(sheet, SPIMEX_TABLE_NAME)
+            stats["rows_read"] = len(sales_table or [])
+            filtered = filter_by_column_number(sales_table, 14)
+            return [tuple(row[col] for col in TABLE_COLUMNS) for row in filtered[1:]]
 
-        # Извлекаем таблицу по названию
-        sales_table = read_table_by_name(sheet, SPIMEX_TABLE_NAME)
+        stats["rows_read"] = bounds[1] - bounds[0]
+        return read_table_columns(sheet, *bounds)
+    finally:
+        workbook.release_resources()
 
-        if sales_table:
 
-            # Фильтруем по количеству договоров
-            filtered = filter_by_column_number(sales_table, 14)
+# Способы чтения XLS-файлов (настройка PARSER_READER)
+READERS = {"fast": parse_file_fast, "full": parse_file_full}
+
 
+def parse_file(file_path, reader=PARSER_READER, stats=None):
+    """
+    Читает XLS-файл и возвращает отфильтрованные строки таблицы.
+
+    Функция синхронная и не зависит от БД, поэтому может выполняться
+    в отдельном процессе. Строки возвращаются простыми кортежами из
+    значений столбцов TABLE_COLUMNS, без заголовка.
+    :param file_path: путь к файлу
+    :param reader: способ чтения: "fast" или "full"
+    :param stats: словарь для замеров (open_seconds, rows_read)
+    :return: список кортежей
+    """
+    return READERS[reader](file_path, stats)
+
+
+def parse_file_measured(file_path, reader=PARSER_READER):
+    """
+    Читает XLS-файл как parse_file и замеряет разбор.
+
+    Выполняется в процессах пула, поэтому замеры возвращаются вместе со строками
+    и учитываются в метриках родительского процесса (см. record_parse_stats).
+    :return: пара (список кортежей, словарь замеров)
+    """
+    stats = {}
+    start = perf_counter()
+    rows = parse_file(file_path, reader, stats)
+    stats["parse_seconds"] = perf_counter() - start
+    stats["rows_kept"] = len(rows)
+    return rows, stats
+
+
+def prepare_file(file_path, reader=PARSER_READER):
+    """
+    Читает XLS-файл и преобразует строки в столбцы для записи в БД (см. transform_rows).
+
+    Результат сохраняется в кэш по SHA-256 содержимого файла (см. parser/parsed_cache.py),
+    и при повторной загрузке того же файла xlrd не используется.
+    Выполняется в процессах пула, поэтому вся обработка строк файла
+    идёт параллельно с записью в БД.
+    :return: пара (TransformedRows, словарь замеров)
+    """
+    start = perf_counter()
+    trading_date = file_date(file_path)
+    path = parsed_cache.cache_path(file_path, file_sha256(file_path), reader)
+    transformed = parsed_cache.load(path, trading_date)
+    if transformed is not None:
+        stats = {"cache": "hit", "parse_seconds": perf_counter() - start}
+        stats["rows_kept"] = len(transformed)
+        return transformed, stats
+
+    rows, stats = parse_file_measured(file_path, reader)
+    transformed = transform_rows(rows, trading_date)
+    try:
+        parsed_cache.store(path, transformed)
+    except OSError as e:
+        print(f"Не удалось сохранить кэш разбора {os.path.basename(file_path)}: {e}")
+    stats["cache"] = "miss"
+    return transformed, stats
+
+
+def record_parse_stats(stats):
+    """
+    Учитывает замеры разбора одного файла в метриках.
+    """
+    if "cache" in stats:
+        PARSED_CACHE.inc(result=stats["cache"])
+    if "open_seconds" in stats:
+        WORKBOOK_OPEN_SECONDS.observe(stats["open_seconds"])
+    PARSE_SECONDS.observe(stats["parse_seconds"])
+    rows_read = stats.get("rows_read", 0)
+    ROWS_PARSED.inc(rows_read)
+    ROWS_FILTERED.inc(max(rows_read - stats["rows_kept"], 0))
+
+
+async def process_files(
+    file_paths,
+    session,
+    workers=PARSER_WORKERS,
+    queue_size=PARSER_QUEUE_SIZE,
+    batch_files=DB_WRITE_BATCH_FILES,
+    on_saved=None,
+):
+    """
+    Асинхронно обрабатывает XLS-файлы конвейером «производитель — потребитель».
+
+    Производитель отправляет файлы на разбор в пул процессов и кладёт задачи
+    в ограниченную очередь: когда в ней `queue_size` необработанных файлов,
+    новые файлы не отправляются, пока потребитель не освободит место.
+    Потребитель по порядку дожидается результатов разбора и записывает их в БД,
+    пока воркеры разбирают следующие файлы. Уже разобранные файлы из очереди
+    (не более `batch_files`) записываются одной транзакцией.
+    :param file_paths: пути к файлам
+    :param session: сессия для работы с БД
+    :param workers: число процессов для разбора
+    :param queue_size: размер очереди разобранных, но не записанных файлов
+    :param batch_files: сколько файлов записывать одной транзакцией
+    :param on_saved: функция (обычная или асинхронная), вызываемая с путём файла
+        после записи в БД
+    :return: список успешно обработанных файлов
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max(1, queue_size))
+    stats = WriteStats()
+    saved = []
+
+    async def produce(executor):
+        try:
+            for file_path in file_paths:
+                future = loop.run_in_executor(executor, prepare_file, file_path)
+                await queue.put((file_path, future))
+        finally:
+            await queue.put(None)
+
+    async def mark_saved(file_path):
+        saved.append(file_path)
+        if on_saved is not None:
+            result = on_saved(file_path)
+            if inspect.isawaitable(result):
+                await result
+
+    async def write(batch):
+        parsed = []
+        for file_path, future in batch:
+            try:
+                rows, parse_stats = await future
+            except Exception as e:
+                print(f"Ошибка при обработке файла {os.path.basename(file_path)}: {e}")
+                continue
+            record_parse_stats(parse_stats)
+            report_rejects(file_path, rows.rejects)
+            if rows:
+                parsed.append((file_path, rows))
+            else:
+                await mark_saved(file_path)
+
+        if not parsed:
+            return
+        try:
             # Сохраняем данные в БД
-            await save_to_db(filtered, file_path, session)
+            await save_files(parsed, session, stats=stats)
+        except Exception as e:
+            await session.rollback()
+            if len(parsed) == 1:
+                print(
+                    f"Ошибка при обработке файла {os.path.basename(parsed[0][0])}: {e}"
+                )
+                return
+            # Записываем файлы по одному, чтобы ошибка в одном не теряла остальные
+            for item in parsed:
+                await write_one(item)
+            return
+        for file_path, _ in parsed:
+            await mark_saved(file_path)
+
+    async def write_one(item):
+        try:
+            await save_files([item], session, stats=stats)
+        except Exception as e:
+            await session.rollback()
+            print(f"Ошибка при обработке файла {os.path.basename(item[0])}: {e}")
+            return
+        await mark_saved(item[0])
+
+    async def consume():
+        carried = []  # элемент, взятый из очереди, но не вошедший в пачку
+        while True:
+            item = carried.pop() if carried else await queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            # Добавляем к записи только уже разобранные файлы, чтобы не ждать воркеров
+            while len(batch) < batch_files:
+                try:
+                    next_item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if next_item is None or not next_item[1].done():
+                    carried.append(next_item)
+                    break
+                batch.append(next_item)
+
+            await write(batch)
+
+    executor = ProcessPoolExecutor(
+        max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")
+    )
+    producer = asyncio.create_task(produce(executor))
+    try:
+        await consume()
+        await producer
+    finally:
+        producer.cancel()
+        # shutdown ждёт уже начатый разбор, поэтому выполняется вне цикла событий
+        await asyncio.to_thread(executor.shutdown, cancel_futures=True)
 
-    except Exception as e:
-        print(f"Ошибка при обработке файла {os.path.basename(file_path)}: {e}")
+    print(f"Запись в БД: {stats.summary()}")
+    return saved
 
 
 async def process_all_files_in_folder(folder_path, session):
@@ -146,7 +420,9 @@ async def process_all_files_in_folder(folder_path, session):
     :param folder_path: путь к папке с файлами
     :param session: сессия для работы с БД
     """
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".xls") or filename.endswith(".xlsx"):
-            file_path = os.path.join(folder_path, filename)
-            await process_file(file_path, session)
+    file_paths = [
+        os.path.join(folder_path, filename)
+        for filename in os.listdir(folder_path)
+        if filename.endswith(".xls") or filename.endswith(".xlsx")
+    ]
+    await process_files(file_paths, session)
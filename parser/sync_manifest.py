@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime
+from email.utils import formatdate
+from parser.download_engine import STATUS_DOWNLOADED, STATUS_FAILED
+
+from config import SYNC_MANIFEST_PATH
+
+# Статус файла, данные которого уже сохранены в БД
+STATUS_INGESTED = "ingested"
+
+
+def report_name(href):
+    """
+    Возвращает имя отчёта по ссылке или имени файла (например, oil_xls_20240502162000).
+    """
+    return os.path.splitext(os.path.basename(href))[0][-22:]
+
+
+def report_date(name):
+    """
+    Возвращает дату торгов в формате ISO по имени отчёта.
+    """
+    return datetime.strptime(name[8:16], "%Y%m%d").date().isoformat()
+
+
+def in_shard(name, shard, shards):
+    """
+    Проверяет, что отчёт относится к части `shard` из `shards` (нумерация с нуля).
+
+    Отчёт закрепляется за частью по CRC32 имени, поэтому разбиение не зависит
+    от порядка обхода и одинаково на всех машинах.
+    """
+    return zlib.crc32(name.encode()) % shards == shard
+
+
+def file_sha256(path):
+    """
+    Считает SHA-256 содержимого файла.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """
+    Постоянный манифест синхронизации отчётов Spimex.
+
+    Для каждого отчёта (ключ — имя отчёта) хранит ссылку, дату торгов, размер,
+    SHA-256 содержимого, заголовки ETag/Last-Modified и статус загрузки в БД.
+    Манифест хранится в JSON-файле и перезаписывается атомарно.
+    """
+
+    path: str  # путь к файлу манифеста
+    entries: dict  # записи манифеста по имени отчёта
+
+    def __init__(self, path=SYNC_MANIFEST_PATH, entries=None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path=SYNC_MANIFEST_PATH):
+        """
+        Загружает манифест с диска (пустой, если файла ещё нет).
+        """
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def save(self):
+        """
+        Атомарно сохраняет манифест на диск.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_known(self, name):
+        """
+        Проверяет, что отчёт уже был успешно скачан ранее.
+        """
+        entry = self.entries.get(name)
+        return entry is not None and entry["status"] != STATUS_FAILED
+
+    def conditional_headers(self, name, filepath):
+        """
+        Возвращает заголовки условного запроса для уже известного отчёта.
+        """
+        entry = self.entries.get(name)
+        if entry is None or not os.path.exists(filepath):
+            return {}
+        if entry.get("etag"):
+            return {"If-None-Match": entry["etag"]}
+        if entry.get("last_modified"):
+            return {"If-Modified-Since": entry["last_modified"]}
+        return {
+            "If-Modified-Since": formatdate(os.path.getmtime(filepath), usegmt=True)
+        }
+
+    def record_download(self, name, result):
+        """
+        Учитывает результат загрузки отчёта.
+
+        Отчёт попадает в очередь на загрузку в БД, только если он новый
+        или его содержимое изменилось с момента последней загрузки в БД.
+        """
+        entry = self.entries.setdefault(
+            name, {"url": result.url, "date": report_date(name), "status": None}
+        )
+        if result.status == STATUS_FAILED:
+            if entry["status"] is None:
+                entry["status"] = STATUS_FAILED
+            return
+        if result.status != STATUS_DOWNLOADED:
+            return
+
+        entry.update(
+            url=result.url,
+            path=result.path,
+            size=result.size,
+            sha256=result.sha256,
+            etag=result.etag,
+            last_modified=result.last_modified,
+        )
+        if entry.get("ingested_sha256") != result.sha256:
+            entry["status"] = STATUS_DOWNLOADED
+
+    def adopt_local_files(self, folder_path):
+        """
+        Добавляет в манифест XLS-файлы из папки, скачанные до появления манифеста.
+        """
+        for filename in os.listdir(folder_path):
+            if not filename.endswith(".xls"):
+                continue
+            name = report_name(filename)
+            if name in self.entries:
+                continue
+            path = os.path.join(folder_path, filename)
+            self.entries[name] = {
+                "url": "",
+                "date": report_date(name),
+                "path": path,
+                "size": os.path.getsize(path),
+                "sha256": file_sha256(path),
+                "status": STATUS_DOWNLOADED,
+            }
+
+    def failed(self):
+        """
+        Возвращает ссылки на отчёты, которые не удалось скачать ранее.
+        """
+        return [
+            entry["url"]
+            for entry in self.entries.values()
+            if entry["status"] == STATUS_FAILED and entry["url"]
+        ]
+
+    def pending(self):
+        """
+        Возвращает пути к новым или изменённым файлам, ещё не загруженным в БД (по дате).
+        """
+        return [
+            entry["path"]
+            for entry in sorted(self.entries.values(), key=lambda e: e["date"])
+            if entry["status"] == STATUS_DOWNLOADED
+        ]
+
+    def has_ingested(self, day):
+        """
+        Проверяет, что отчёт за дату торгов `day` (ISO) уже загружен в БД.
+        """
+        return any(
+            entry["date"] == day and entry["status"] == STATUS_INGESTED
+            for entry in self.entries.values()
+        )
+
+    def mark_ingested(self, path):
+        """
+        Отмечает файл как загруженный в БД.
+        """
+        entry = self.entries[report_name(path)]
+        entry["status"] = STATUS_INGESTED
+        entry["ingested_sha256"] = entry.get("sha256")
+
+    def adopt_checkpoints(self, checkpoints):
+        """
+        Отмечает загруженными в БД файлы из очереди, которые с тем же содержимым
+        уже загрузила догрузка (backfill): её контрольные точки — источник истины
+        о загруженных в БД отчётах.
+        :param checkpoints: контрольные точки догрузки: {имя отчёта: sha256}
+        :return: количество отмеченных файлов
+        """
+        adopted = 0
+        for name, sha256 in checkpoints.items():
+            entry = self.entries.get(name)
+            if (
+                entry is not None
+                and entry["status"] == STATUS_DOWNLOADED
+                and entry.get("sha256") == sha256
+            ):
+                entry["status"] = STATUS_INGESTED
+                entry["ingested_sha256"] = sha256
+                adopted += 1
+        return adopted
+
+    def reset_ingested(self):
+        """
+        Возвращает все загруженные в БД файлы в очередь (например, после пересоздания БД).
+        """
+        for entry in self.entries.values():
+            if entry["status"] == STATUS_INGESTED:
+                entry["status"] = STATUS_DOWNLOADED
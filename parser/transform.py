@@ -0,0 +1,157 @@
+import os
+from dataclasses import dataclass, field
+from itertools import compress
+
+from metrics import REGISTRY
+
+# Столбцы таблицы spimex_trading_results, заполняемые при загрузке (в порядке полей записи)
+FIELDS = (
+    "exchange_product_id",
+    "exchange_product_name",
+    "oil_id",
+    "delivery_basis_id",
+    "delivery_basis_name",
+    "delivery_type_id",
+    "volume",
+    "total",
+    "count",
+    "date",
+)
+
+# Сколько отклонённых строк файла выводить в сообщении
+REJECTS_SHOWN = 3
+
+ROWS_REJECTED = REGISTRY.counter(
+    "spimex_rows_rejected_total", "Строки с некорректными значениями, не попавшие в БД"
+)
+
+
+@dataclass
+class TransformedRows:
+    """
+    Строки одного файла, преобразованные в столбцы таблицы spimex_trading_results.
+    """
+
+    columns: dict  # имя столбца из FIELDS -> список значений
+    rejects: list = field(default_factory=list)  # (номер строки, строка, причина)
+
+    def __len__(self):
+        return len(self.columns["date"])
+
+    def records(self):
+        """
+        Возвращает строки в виде кортежей в порядке FIELDS.
+        """
+        return list(zip(*(self.columns[name] for name in FIELDS)))
+
+
+def to_amount(value):
+    """
+    Преобразует объём, сумму или количество договоров из ячейки XLS в целое число.
+    :param value: значение ячейки (число или строка вида "1 234")
+    :return: целое неотрицательное число или None, если значение некорректно
+    """
+    if isinstance(value, str):
+        value = value.replace("\xa0", "").replace(" ", "").replace(",", ".")
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    elif isinstance(value, (int, float)):
+        value = float(value)
+    else:
+        return None
+    if not value.is_integer() or value < 0:
+        return None
+    return int(value)
+
+
+def to_amounts(values):
+    """
+    Преобразует столбец объёмов, сумм или количеств договоров в целые числа (см. to_amount).
+
+    Обычно в столбце только целые неотрицательные числа: они приводятся к int
+    одним проходом, а to_amount вызывается лишь для остальных значений.
+    """
+    try:
+        ints = list(map(int, values))
+    except (TypeError, ValueError, OverflowError):
+        return list(map(to_amount, values))
+    if ints == values and min(ints, default=0) >= 0:
+        return ints
+    return [i if i == v and i >= 0 else to_amount(v) for i, v in zip(ints, values)]
+
+
+def transform_rows(rows, trading_date):
+    """
+    Преобразует строки таблицы из parse_file в столбцы для записи в БД.
+
+    Каждое преобразование выполняется один раз для целого столбца: разбор чисел,
+    выделение вида топлива, базиса и типа поставки из кода инструмента.
+    Строки без договоров отбрасываются, а строки с некорректными значениями
+    собираются в список отклонённых с причиной.
+    :param rows: список кортежей из parse_file (столбцы TABLE_COLUMNS)
+    :param trading_date: дата торгов файла
+    :return: TransformedRows
+    """
+    if not rows:
+        return TransformedRows({name: [] for name in FIELDS})
+
+    product_ids, names, basis_names, volumes, totals, counts = (
+        list(column) for column in zip(*rows)
+    )
+    product_ids = list(map(str, product_ids))
+    volumes = to_amounts(volumes)
+    totals = to_amounts(totals)
+    counts = to_amounts(counts)
+
+    # None в столбце — некорректное значение
+    checks = (
+        (
+            "некорректный код инструмента",
+            [p if len(p) >= 7 else None for p in product_ids],
+        ),
+        ("некорректный объём", volumes),
+        ("некорректная сумма", totals),
+        ("некорректное количество договоров", counts),
+    )
+    keep = [c is None or c > 0 for c in counts]  # строки без договоров не сохраняются
+    rejects = []
+    for reason, values in checks:
+        if None not in values:
+            continue
+        for index, value in enumerate(values):
+            if value is None and keep[index]:
+                rejects.append((index, rows[index], reason))
+                keep[index] = False
+
+    product_ids = list(compress(product_ids, keep))
+    columns = {
+        "exchange_product_id": product_ids,
+        "exchange_product_name": list(map(str, compress(names, keep))),
+        "oil_id": [p[:4] for p in product_ids],
+        "delivery_basis_id": [p[4:7] for p in product_ids],
+        "delivery_basis_name": list(map(str, compress(basis_names, keep))),
+        "delivery_type_id": [p[-1] for p in product_ids],
+        "volume": list(compress(volumes, keep)),
+        "total": list(compress(totals, keep)),
+        "count": list(compress(counts, keep)),
+        "date": [trading_date] * len(product_ids),
+    }
+    return TransformedRows(columns, sorted(rejects, key=lambda reject: reject[0]))
+
+
+def report_rejects(path, rejects):
+    """
+    Учитывает отклонённые строки файла в метриках и выводит одно сообщение о них.
+    """
+    if not rejects:
+        return
+    ROWS_REJECTED.inc(len(rejects))
+    examples = "; ".join(
+        f"строка {index}: {reason} {row!r}"
+        for index, row, reason in rejects[:REJECTS_SHOWN]
+    )
+    print(
+        f"Отклонено строк в файле {os.path.basename(path)}: {len(rejects)} ({examples})"
+    )
@@ -1,101 +1,76 @@
 from datetime import date
-from typing import AsyncGenerator
 
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
-                                    create_async_engine)
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.main import app
-from db.database import DATABASE_URL, BaseModel
-from db.db_depends import get_db
-from db.model import SpimexTradingResults
-
-
-@pytest_asyncio.fixture(scope="function")
-async def test_engine():
-    """
-    Создаёт и возвращает тестовый асинхронный движок SQLAlchemy.
-
-    Перед выполнением теста:
-    - проверяет, что используется тестовая БД;
-    - удаляет и создаёт все таблицы.
-
-    После теста:
-    - снова удаляет все таблицы;
-    - освобождает ресурсы движка.
-    """
-    assert DATABASE_URL.endswith("_test")
-    engine = create_async_engine(DATABASE_URL, echo=False)
-    async with engine.begin() as conn:
-        await conn.run_sync(BaseModel.metadata.drop_all)
-        await conn.run_sync(BaseModel.metadata.create_all)
-    yield engine
-    async with engine.begin() as conn:
-        await conn.run_sync(BaseModel.metadata.drop_all)
-    await engine.dispose()
-
-
-@pytest_asyncio.fixture(scope="function")
-async def test_sessionmaker(test_engine):
-    """
-    Возвращает асинхронный sessionmaker, связанный с тестовым движком.
-    Используется для создания сессий БД в тестах.
-    """
-    return async_sessionmaker(test_engine, expire_on_commit=False)
-
-
-@pytest_asyncio.fixture(scope="function")
-async def db_session(test_sessionmaker) -> AsyncGenerator[AsyncSession, None]:
-    """
-    Возвращает асинхронную сессию БД.
-    Используется в тестах для выполнения запросов к тестовой БД.
-    """
-    async with test_sessionmaker() as session:
-        yield session
+from db.db_depends import get_db, get_session_maker
+from db.model import SpimexDeliveryBasis, SpimexProduct, SpimexTradingResults
+from db.rollups import refresh_daily_rollups, refresh_trading_days
 
 
 @pytest_asyncio.fixture(scope="function")
 async def filled_spimex_data(db_session: AsyncSession):
     """
-    Заполняет тестовую БД двумя записями SpimexTradingResults.
+    Заполняет тестовую БД двумя записями SpimexTradingResults с их инструментами и базисами,
+    дневными итогами и торговыми днями.
     Предоставляет сессию с предзаполненными данными.
     """
-    test_data = [
-        SpimexTradingResults(
+    diesel, petrol = (
+        SpimexProduct(
             exchange_product_id="1001",
             exchange_product_name="Дизель",
             oil_id="OIL_1",
             delivery_basis_id="db_1",
-            delivery_basis_name="СПб",
             delivery_type_id="dt_1",
-            volume="100.5",
-            total="100000",
-            count=3,
-            date=date(2024, 5, 1),
         ),
-        SpimexTradingResults(
+        SpimexProduct(
             exchange_product_id="1002",
             exchange_product_name="Бензин",
             oil_id="OIL_2",
             delivery_basis_id="db_2",
-            delivery_basis_name="Москва",
             delivery_type_id="dt_2",
-            volume="200.0",
-            total="200000",
+        ),
+    )
+    db_session.add_all(
+        [
+            SpimexDeliveryBasis(delivery_basis_id="db_1", delivery_basis_name="СПб"),
+            SpimexDeliveryBasis(delivery_basis_id="db_2", delivery_basis_name="Москва"),
+            diesel,
+            petrol,
+        ]
+    )
+    await db_session.flush()
+    test_data = [
+        SpimexTradingResults(
+            product_key=diesel.id,
+            volume=100,
+            total=100000,
+            count=3,
+            date=date(2024, 5, 1),
+        ),
+        SpimexTradingResults(
+            product_key=petrol.id,
+            volume=200,
+            total=200000,
             count=5,
             date=date(2024, 5, 2),
         ),
     ]
     db_session.add_all(test_data)
+    await db_session.flush()
+    dates = {trading.date for trading in test_data}
+    await refresh_daily_rollups(db_session, dates)
+    await refresh_trading_days(db_session, dates)
     await db_session.commit()
     yield db_session
 
 
 @pytest_asyncio.fixture(scope="function")
-async def async_client(db_session: AsyncSession):
+async def async_client(db_session: AsyncSession, test_sessionmaker):
     """
-    Создаёт асинхронный HTTP-клиент с переопределением зависимости get_db.
+    Создаёт асинхронный HTTP-клиент с переопределением зависимостей get_db и get_session_maker.
     Клиент используется для тестирования HTTP-эндпоинтов FastAPI с доступом к тестовой БД.
     """
 
@@ -103,6 +78,7 @@ async def async_client(db_session: AsyncSession):
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_maker] = lambda: test_sessionmaker
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
     ) as client:
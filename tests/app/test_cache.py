@@ -0,0 +1,326 @@
+import asyncio
+import importlib.util
+from datetime import date
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from httpx import ASGITransport, AsyncClient
+from starlette.requests import Request
+
+from app.cache import (DATA_VERSION_KEY, POPULAR_REQUESTS_KEY, LayeredBackend,
+                       ORJsonCoder, PopularRequests, request_url,
+                       versioned_key_builder, with_cache_headers)
+from app.trading_router import get_dynamics, get_last_trading_dates
+from db.db_depends import get_db
+
+
+class MemoryRedis:
+    """
+    Хранилище в памяти с нужными для версии данных командами Redis.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+        return self.values[key]
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+
+class MemoryPipeline:
+    """
+    Конвейер команд для MemoryRedis (только zincrby).
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def zincrby(self, key, amount, member):
+        self.commands.append((key, amount, member))
+
+    async def execute(self):
+        for key, amount, member in self.commands:
+            scores = self.redis.values.setdefault(key, {})
+            scores[member] = scores.get(member, 0) + amount
+
+
+def make_request(query_string):
+    """
+    Создаёт GET-запрос к /tradings/dynamics с заданной строкой параметров.
+    """
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/tradings/dynamics",
+            "query_string": query_string.encode(),
+            "headers": [],
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_versioned_key_builder():
+    """
+    Тестирует ключи кэша с версией данных.
+
+    Проверяет, что:
+    - ключ не зависит от порядка параметров и объекта сессии БД;
+    - разные параметры дают разные ключи;
+    - после увеличения версии данных ключ меняется.
+    """
+    redis = MemoryRedis()
+    backend = mock.Mock(redis=redis)
+
+    async def key(query_string, db):
+        return await versioned_key_builder(
+            get_dynamics,
+            "fastapi-cache:",
+            request=make_request(query_string),
+            kwargs={"db": db},
+        )
+
+    with mock.patch.object(FastAPICache, "get_backend", return_value=backend):
+        first = await key("start_date=2024-05-01&end_date=2024-05-02", object())
+        same = await key("end_date=2024-05-02&start_date=2024-05-01", object())
+        other = await key("start_date=2024-05-01&end_date=2024-05-03", object())
+        await redis.incr(DATA_VERSION_KEY)
+        bumped = await key("start_date=2024-05-01&end_date=2024-05-02", object())
+
+    assert first == same
+    assert first != other
+    assert first.startswith("fastapi-cache::v0:")
+    assert bumped.startswith("fastapi-cache::v1:")
+
+
+async def cached_call(backend, key, compute):
+    """
+    Повторяет обращение декоратора fastapi-cache к бэкенду: чтение, при промахе — вычисление и запись.
+    """
+    _, value = await backend.get_with_ttl(key)
+    if value is None:
+        value = await compute()
+        await backend.set(key, value, 60)
+    return value
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_single_flight():
+    """
+    Тестирует двухуровневый кэш при одновременных промахах.
+
+    Проверяет, что:
+    - из десяти одновременных запросов ответ вычисляется один раз;
+    - повторный запрос отдаётся из памяти процесса, не обращаясь к Redis;
+    - счётчики уровней учитывают все обращения.
+    """
+    backend = LayeredBackend(InMemoryBackend())
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return b"[]"
+
+    values = await asyncio.gather(
+        *(cached_call(backend, "single-flight", compute) for _ in range(10))
+    )
+    await cached_call(backend, "single-flight", compute)
+
+    assert values == [b"[]"] * 10
+    assert calls == 1
+    assert backend.stats.as_dict() == {
+        "l1_hits": 1,
+        "l1_misses": 10,
+        "l2_hits": 0,
+        "l2_misses": 1,
+        "coalesced": 9,
+    }
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_failed_leader_and_eviction():
+    """
+    Тестирует двухуровневый кэш при ошибке вычисления и переполнении.
+
+    Проверяет, что:
+    - если первый запрос завершился ошибкой, ожидающие запросы вычисляют ответ сами;
+    - при превышении размера из памяти процесса вытесняется давно не использованный ключ,
+      а его значение по-прежнему читается из Redis.
+    """
+    backend = LayeredBackend(InMemoryBackend(), max_entries=2)
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("ошибка вычисления")
+
+    async def compute():
+        return b"1"
+
+    results = await asyncio.gather(
+        cached_call(backend, "failed-leader", fail),
+        cached_call(backend, "failed-leader", compute),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], ValueError)
+    assert results[1] == b"1"
+
+    for key in ("evicted", "kept-1", "kept-2"):
+        await backend.set(key, key.encode(), 60)
+
+    assert list(backend.entries) == ["kept-1", "kept-2"]
+    assert (await backend.get_with_ttl("evicted"))[1] == b"evicted"
+    assert backend.stats.l2_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_waiter_timeout():
+    """
+    Тестирует истечение ожидания одного из запросов при single-flight.
+
+    Проверяет, что:
+    - ожидавший дольше `wait_timeout` запрос получает промах;
+    - остальные ожидающие запросы по-прежнему получают ответ первого запроса.
+    """
+    backend = LayeredBackend(InMemoryBackend(), wait_timeout=0.2)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.3)
+        return b"[]"
+
+    async def late_waiter():
+        await asyncio.sleep(0.15)
+        return await backend.get_with_ttl("waiter-timeout")
+
+    leader = asyncio.create_task(cached_call(backend, "waiter-timeout", compute))
+    await asyncio.sleep(0)
+    timed_out, waited = await asyncio.gather(
+        backend.get_with_ttl("waiter-timeout"), late_waiter()
+    )
+
+    assert await leader == b"[]"
+    assert timed_out == (0, None)
+    assert waited[1] == b"[]"
+    assert calls == 1
+    assert backend.stats.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_popular_requests_flushed_in_batches():
+    """
+    Тестирует учёт частых запросов для прогрева кэша.
+
+    Проверяет, что:
+    - адрес не зависит от порядка параметров;
+    - счётчики копятся в памяти и переносятся в Redis одним конвейером.
+    """
+    redis = MemoryRedis()
+    popular = PopularRequests(flush_interval=3600)
+    first = request_url(make_request("start_date=2024-05-01&end_date=2024-05-02"))
+    same = request_url(make_request("end_date=2024-05-02&start_date=2024-05-01"))
+
+    popular.record(first, redis)
+    popular.record(same, redis)
+    assert popular.flushing is None
+    assert redis.values == {}
+
+    popular.flush_interval = 0
+    popular.record(request_url(make_request("")), redis)
+    await popular.flushing
+
+    assert first == "/tradings/dynamics?end_date=2024-05-02&start_date=2024-05-01"
+    assert redis.values[POPULAR_REQUESTS_KEY] == {first: 2, "/tradings/dynamics": 1}
+    assert popular.counts == {}
+
+
+def test_orjson_coder_returns_cached_body():
+    """
+    Тестирует, что закэшированный JSON-ответ отдаётся без повторной сериализации.
+    """
+    body = ORJsonCoder.encode(ORJSONResponse([{"date": date(2024, 5, 1)}]))
+    response = ORJsonCoder.decode_as_type(body, type_=None)
+
+    assert body == b'[{"date":"2024-05-01"}]'
+    assert response.body == body
+    assert response.media_type == "application/json"
+
+
+def real_cache():
+    """
+    Возвращает настоящий декоратор cache из fastapi-cache:
+    в tests/conftest.py он заменён заглушкой до импорта приложения.
+    """
+    spec = importlib.util.find_spec("fastapi_cache.decorator")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.cache
+
+
+@pytest.mark.asyncio
+async def test_cached_endpoint_returns_cache_headers(filled_spimex_data):
+    """
+    Тестирует заголовки кэша у эндпоинта, возвращающего ORJSONResponse, с настоящим декоратором cache.
+
+    Проверяет, что:
+    - при промахе и попадании в ответе есть Cache-Control, ETag и X-FastAPI-Cache;
+    - закэшированный ответ совпадает с исходным;
+    - запрос с If-None-Match, равным ETag, получает 304 Not Modified без тела.
+    """
+    cache = real_cache()
+    application = FastAPI()
+    application.get("/last-trading-dates")(
+        with_cache_headers(cache()(get_last_trading_dates))
+    )
+
+    async def override_get_db():
+        yield filled_spimex_data
+
+    application.dependency_overrides[get_db] = override_get_db
+    FastAPICache.init(InMemoryBackend(), expire=60, coder=ORJsonCoder)
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=application), base_url="http://test"
+        ) as client:
+            miss = await client.get("/last-trading-dates")
+            hit = await client.get("/last-trading-dates")
+            not_modified = await client.get(
+                "/last-trading-dates", headers={"If-None-Match": hit.headers["etag"]}
+            )
+    finally:
+        FastAPICache.reset()
+
+    assert miss.status_code == 200
+    assert miss.headers["x-fastapi-cache"] == "MISS"
+    assert miss.headers["cache-control"] == "max-age=60"
+    assert miss.json() == ["2024-05-02", "2024-05-01"]
+
+    assert hit.status_code == 200
+    assert hit.headers["x-fastapi-cache"] == "HIT"
+    assert hit.headers["cache-control"].startswith("max-age=")
+    assert hit.headers["etag"] == miss.headers["etag"]
+    assert hit.content == miss.content
+
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
@@ -1,5 +1,12 @@
+import csv
+import io
+import json
+from datetime import date
+
 import pytest
 
+from db.model import SpimexProduct, SpimexTradingResults
+
 
 @pytest.mark.asyncio
 async def test_get_last_trading_dates(async_client, filled_spimex_data):
@@ -9,13 +16,17 @@ async def test_get_last_trading_dates(async_client, filled_spimex_data):
     Проверяет, что:
     - возвращается статус 200;
     - ответ является списком;
-    - возвращаемые даты входят в ожидаемый диапазон.
+    - даты отсортированы от новых к старым и ограничены параметром limit.
     """
     response = await async_client.get("/tradings/last-trading-dates?limit=2")
 
     assert response.status_code == 200
     assert isinstance(response.json(), list)
-    assert set(response.json()).issubset(["2024-05-01", "2024-05-02"])
+    assert response.json() == ["2024-05-02", "2024-05-01"]
+
+    response = await async_client.get("/tradings/last-trading-dates?limit=1")
+
+    assert response.json() == ["2024-05-02"]
 
 
 @pytest.mark.asyncio
@@ -93,3 +104,218 @@ async def test_get_trading_results_with_filters(async_client, filled_spimex_data
     assert response.status_code == 200
     data = response.json()
     assert all(item["oil_id"] == "OIL_1" for item in data)
+
+
+@pytest.mark.asyncio
+async def test_tradings_without_delivery_basis(async_client, filled_spimex_data):
+    """
+    Тестирует строки торгов инструментов без базиса поставки.
+
+    Проверяет, что строки инструмента без базиса и инструмента с базисом,
+    которого нет в spimex_delivery_bases, отдаются в /tradings/dynamics
+    и на страницах /tradings/dynamics/page с пустым названием базиса.
+    """
+    products = [
+        SpimexProduct(exchange_product_id="1003", oil_id="OIL_3"),
+        SpimexProduct(
+            exchange_product_id="1004", oil_id="OIL_4", delivery_basis_id="x"
+        ),
+    ]
+    filled_spimex_data.add_all(products)
+    await filled_spimex_data.flush()
+    filled_spimex_data.add_all(
+        SpimexTradingResults(
+            product_key=product.id, volume=1, total=10, count=1, date=date(2024, 5, 3)
+        )
+        for product in products
+    )
+    await filled_spimex_data.commit()
+
+    params = {"start_date": "2024-05-03", "end_date": "2024-05-03"}
+    response = await async_client.get("/tradings/dynamics", params=params)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(item["oil_id"] for item in data) == ["OIL_3", "OIL_4"]
+    assert [item["delivery_basis_name"] for item in data] == [None, None]
+
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-03", "limit": 3}
+    response = await async_client.get("/tradings/dynamics/page", params=params)
+    items = response.json()["items"]
+    params["cursor"] = response.json()["next_cursor"]
+    response = await async_client.get("/tradings/dynamics/page", params=params)
+    items += response.json()["items"]
+
+    assert len(items) == 4
+    assert response.json()["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_dynamics_page(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /tradings/dynamics/page.
+
+    Проверяет, что:
+    - страницы по одной записи идут по порядку дат;
+    - курсор первой страницы ведёт на вторую, у последней страницы курсора нет;
+    - повреждённый курсор отклоняется со статусом 400.
+    """
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-02", "limit": 1}
+    response = await async_client.get("/tradings/dynamics/page", params=params)
+
+    assert response.status_code == 200
+    first = response.json()
+    assert [item["date"] for item in first["items"]] == ["2024-05-01"]
+    assert first["next_cursor"]
+
+    params["cursor"] = first["next_cursor"]
+    response = await async_client.get("/tradings/dynamics/page", params=params)
+
+    assert response.status_code == 200
+    second = response.json()
+    assert [item["date"] for item in second["items"]] == ["2024-05-02"]
+    assert second["next_cursor"] is None
+
+    params["cursor"] = "not-a-cursor"
+    response = await async_client.get("/tradings/dynamics/page", params=params)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_dynamics(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /tradings/dynamics/stream без фильтров.
+
+    Проверяет, что:
+    - возвращается статус 200 и тип содержимого NDJSON;
+    - каждая строка ответа — отдельная запись, записи идут по порядку дат.
+    """
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-02"}
+    response = await async_client.get("/tradings/dynamics/stream", params=params)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    data = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["date"] for item in data] == ["2024-05-01", "2024-05-02"]
+    assert data[0]["oil_id"] == "OIL_1"
+    assert data[1]["volume"] == 200
+
+
+@pytest.mark.asyncio
+async def test_export_csv(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /tradings/export в формате CSV с фильтром.
+
+    Проверяет, что:
+    - возвращается статус 200, тип содержимого CSV и имя файла с периодом;
+    - первая строка — заголовки, далее только отфильтрованные торги.
+    """
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-02", "oil_id": "oil_2"}
+    response = await async_client.get("/tradings/export", params=params)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "spimex_2024-05-01_2024-05-02.csv" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["oil_id"] == "OIL_2"
+    assert rows[0]["date"] == "2024-05-02"
+
+
+@pytest.mark.asyncio
+async def test_export_parquet(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /tradings/export в формате Parquet (если установлен pyarrow).
+
+    Проверяет, что ответ читается как Parquet-файл со всеми торгами за период.
+    """
+    pq = pytest.importorskip("pyarrow.parquet")
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-02", "format": "parquet"}
+    response = await async_client.get("/tradings/export", params=params)
+
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("oil_id").to_pylist() == ["OIL_1", "OIL_2"]
+    assert table.column("volume").to_pylist() == [100, 200]
+
+
+@pytest.mark.asyncio
+async def test_get_aggregates(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /tradings/aggregates.
+
+    Проверяет, что:
+    - дневные итоги по виду топлива отдаются по каждой дате и значению;
+    - месячные итоги по базису начинаются с первого дня месяца;
+    - недельные итоги с отбором по значению начинаются с понедельника.
+    """
+    params = {"start_date": "2024-05-01", "end_date": "2024-05-31"}
+    response = await async_client.get("/tradings/aggregates", params=params)
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "period_start": "2024-05-01",
+            "oil_id": "OIL_1",
+            "volume": 100,
+            "total": 100000,
+            "count": 3,
+        },
+        {
+            "period_start": "2024-05-02",
+            "oil_id": "OIL_2",
+            "volume": 200,
+            "total": 200000,
+            "count": 5,
+        },
+    ]
+
+    params.update(period="month", dimension="delivery_basis_id")
+    response = await async_client.get("/tradings/aggregates", params=params)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [(item["period_start"], item["delivery_basis_id"]) for item in data] == [
+        ("2024-05-01", "db_1"),
+        ("2024-05-01", "db_2"),
+    ]
+
+    params.update(period="week", dimension="oil_id", value="oil_2")
+    response = await async_client.get("/tradings/aggregates", params=params)
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "period_start": "2024-04-29",
+            "oil_id": "OIL_2",
+            "volume": 200,
+            "total": 200000,
+            "count": 5,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_metrics(async_client, filled_spimex_data):
+    """
+    Тестирует эндпоинт /metrics.
+
+    Проверяет, что:
+    - метрики отдаются в текстовом формате Prometheus;
+    - время запросов учитывается по шаблону маршрута;
+    - в выводе есть время запросов к БД и состояние пулов соединений.
+    """
+    await async_client.get("/tradings/last-trading-dates?limit=1")
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE api_request_duration_seconds histogram" in text
+    assert (
+        'api_request_duration_seconds_count{method="GET",'
+        'route="/tradings/last-trading-dates",status="200"}'
+    ) in text
+    assert "# TYPE db_query_seconds histogram" in text
+    assert 'db_pool_size{engine="read"}' in text
@@ -1,3 +1,53 @@
+from typing import AsyncGenerator
 from unittest import mock
 
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
+                                    create_async_engine)
+
+from db.database import DATABASE_URL, BaseModel
+
 mock.patch("fastapi_cache.decorator.cache", lambda *args, **kwargs: lambda f: f).start()  # мокает кэширование
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_engine():
+    """
+    Создаёт и возвращает тестовый асинхронный движок SQLAlchemy.
+
+    Перед выполнением теста:
+    - проверяет, что используется тестовая БД;
+    - удаляет и создаёт все таблицы.
+
+    После теста:
+    - снова удаляет все таблицы;
+    - освобождает ресурсы движка.
+    """
+    assert DATABASE_URL.endswith("_test")
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.drop_all)
+        await conn.run_sync(BaseModel.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_sessionmaker(test_engine):
+    """
+    Возвращает асинхронный sessionmaker, связанный с тестовым движком.
+    Используется для создания сессий БД в тестах.
+    """
+    return async_sessionmaker(test_engine, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def db_session(test_sessionmaker) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Возвращает асинхронную сессию БД.
+    Используется в тестах для выполнения запросов к тестовой БД.
+    """
+    async with test_sessionmaker() as session:
+        yield session
@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.schema import TradingFilter
+from app.services import (dynamics_page_query, dynamics_query,
+                          last_trading_dates_query, trading_results_query)
+from db.migrations import apply_migrations
+
+# 10 видов топлива × 10 базисов, плюс редкий продукт R001 на базисе R01
+SEED_DIMENSIONS_SQL = """
+INSERT INTO spimex_delivery_bases (delivery_basis_id, delivery_basis_name)
+SELECT 'B' || lpad(i::text, 2, '0'), 'Базис' FROM generate_series(1, 10) i
+UNION ALL
+SELECT 'R01', 'Редкий базис';
+INSERT INTO spimex_products (
+    exchange_product_id, exchange_product_name, oil_id, delivery_basis_id,
+    delivery_type_id
+)
+SELECT o.oil || b.basis || '060F', 'Продукт', o.oil, b.basis, 'F'
+FROM (SELECT 'O' || lpad(i::text, 3, '0') FROM generate_series(1, 10) i) AS o(oil),
+    (SELECT 'B' || lpad(i::text, 2, '0') FROM generate_series(1, 10) i) AS b(basis)
+UNION ALL
+SELECT 'R001R01060F', 'Редкий продукт', 'R001', 'R01', 'F'
+"""
+
+# 3 года торговых дней по каждому продукту ≈ 78 тыс. строк,
+# а редкий продукт торгуется раз в неделю
+SEED_SQL = """
+INSERT INTO spimex_trading_results (product_key, volume, total, count, date)
+SELECT p.id, 60, 3000000, 1, d::date
+FROM generate_series('2021-01-01'::date, '2023-12-31'::date, '1 day') AS d,
+    spimex_products p
+WHERE extract(isodow FROM d) < 6 AND p.oil_id <> 'R001'
+UNION ALL
+SELECT p.id, 60, 3000000, 1, d::date
+FROM generate_series('2021-01-04'::date, '2023-12-31'::date, '7 days') AS d,
+    spimex_products p
+WHERE p.oil_id = 'R001'
+"""
+
+
+@pytest_asyncio.fixture(scope="function")
+async def seeded_engine(test_engine):
+    """
+    Заполняет тестовую БД торгами за несколько лет, производными таблицами
+    (через миграции первичного заполнения) и обновляет статистику планировщика.
+    """
+    async with test_engine.begin() as conn:
+        for statement in SEED_DIMENSIONS_SQL.split(";"):
+            await conn.execute(text(statement))
+        await conn.execute(text(SEED_SQL))
+        await apply_migrations(conn)
+        await conn.execute(text("ANALYZE"))
+    yield test_engine
+
+
+async def explain(engine, query):
+    """
+    Возвращает текст плана выполнения запроса.
+    """
+    sql = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with engine.connect() as conn:
+        rows = await conn.execute(text(f"EXPLAIN {sql}"))
+        return "\n".join(row[0] for row in rows)
+
+
+# Запросы эндпоинтов /tradings и индексы, которые они должны использовать
+QUERY_INDEXES = [
+    (last_trading_dates_query(10), "spimex_trading_days_pkey"),
+    (
+        dynamics_query(date(2023, 3, 1), date(2023, 3, 31), TradingFilter()),
+        "ix_spimex_trading_results_date_id",
+    ),
+    (
+        dynamics_page_query(
+            date(2021, 1, 1),
+            date(2023, 12, 31),
+            TradingFilter(),
+            100,
+            after=(date(2023, 6, 1), 50000),
+        ),
+        "ix_spimex_trading_results_date_id",
+    ),
+    (
+        dynamics_query(
+            date(2021, 1, 1), date(2023, 12, 31), TradingFilter(oil_id="r001")
+        ),
+        "uq_spimex_trading_results_product_date",
+    ),
+    (
+        trading_results_query(TradingFilter(delivery_basis_id="r01"), 10),
+        "uq_spimex_trading_results_product_date",
+    ),
+    (
+        dynamics_query(
+            date(2022, 1, 1), date(2022, 6, 30), TradingFilter(oil_id="o001")
+        ),
+        "_spimex_trading_results_",
+    ),
+    (
+        trading_results_query(
+            TradingFilter(oil_id="o002", delivery_basis_id="b03"), 10
+        ),
+        "_spimex_trading_results_",
+    ),
+]
+
+
+@pytest.mark.asyncio
+async def test_trading_queries_use_indexes(seeded_engine):
+    """
+    Тестирует, что запросы эндпоинтов /tradings на многолетних данных
+    используют индексы, а не последовательное чтение таблицы.
+
+    Для редких значений фильтров ожидается ключ (инструмент, дата) по инструментам,
+    выбранным из spimex_products, для частых планировщик вправе выбрать индекс по дате.
+    """
+    for query, index in QUERY_INDEXES:
+        plan = await explain(seeded_engine, query)
+
+        assert index in plan, plan
+        # таблицы измерений малы, их последовательное чтение допустимо
+        assert "Seq Scan on spimex_trading_results" not in plan, plan
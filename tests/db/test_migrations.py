@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import text
+
+from db.migrations import apply_migrations
+
+# Таблица торгов в старой схеме: без уникального ключа, объём и сумма — строки,
+# инструмент и базис поставки хранятся в каждой строке
+LEGACY_TABLE = """
+CREATE TABLE spimex_trading_results (
+    id SERIAL PRIMARY KEY,
+    exchange_product_id VARCHAR,
+    exchange_product_name VARCHAR,
+    oil_id VARCHAR,
+    delivery_basis_id VARCHAR,
+    delivery_basis_name VARCHAR,
+    delivery_type_id VARCHAR,
+    volume VARCHAR,
+    total VARCHAR,
+    count INTEGER,
+    date DATE,
+    created_on TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    updated_on TIMESTAMP WITH TIME ZONE DEFAULT now()
+)
+"""
+
+
+@pytest.mark.asyncio
+async def test_migrations_upgrade_legacy_table(test_engine):
+    """
+    Тестирует миграции на таблице в старой схеме (без уникального ключа,
+    объём и сумма — строки, инструмент и базис в каждой строке).
+
+    Проверяет, что:
+    - повторы (код инструмента, дата) удаляются, остаётся последняя строка;
+    - после миграции добавлен уникальный ключ;
+    - объём и сумма переведены в числа;
+    - инструмент и базис перенесены в таблицы измерений, а строка ссылается на инструмент;
+    - повторный запуск миграций ничего не ломает.
+    """
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP TABLE spimex_trading_results"))
+        await conn.execute(text(LEGACY_TABLE))
+        await conn.execute(
+            text(
+                "INSERT INTO spimex_trading_results (exchange_product_id, "
+                "exchange_product_name, oil_id, delivery_basis_id, delivery_basis_name, "
+                "delivery_type_id, volume, total, count, date) VALUES "
+                "('A592UFM060F', 'Бензин', 'A592', 'UFM', 'Уфа', 'F', "
+                "'60.0', '100.0', 1, '2024-05-02'), "
+                "('A592UFM060F', 'Бензин', 'A592', 'UFM', 'Уфа', 'F', "
+                "'120.0', '7200000.0', 2, '2024-05-02')"
+            )
+        )
+
+    async with test_engine.begin() as conn:
+        await apply_migrations(conn)
+        await apply_migrations(conn)
+        rows = (
+            await conn.execute(
+                text(
+                    "SELECT p.exchange_product_id, p.oil_id, b.delivery_basis_name, "
+                    "r.volume, r.total, r.count FROM spimex_trading_results r "
+                    "JOIN spimex_products p ON p.id = r.product_key "
+                    "JOIN spimex_delivery_bases b USING (delivery_basis_id)"
+                )
+            )
+        ).all()
+        constraints = await conn.scalar(
+            text(
+                "SELECT count(*) FROM pg_constraint "
+                "WHERE conname = 'uq_spimex_trading_results_product_date'"
+            )
+        )
+
+    assert rows == [("A592UFM060F", "A592", "Уфа", 120, 7200000, 2)]
+    assert constraints == 1
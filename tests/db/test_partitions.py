@@ -0,0 +1,187 @@
+import asyncio
+from datetime import date
+from parser.db_writer import save_files
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+
+from app.schema import TradingFilter
+from app.services import dynamics_query
+from db.database import BaseModel
+from db.model import SpimexTradingResults
+from db.partitions import create_tables, list_partitions, swap_partitions
+
+MAY = "tables/oil_xls_20240502162000.xls"
+MAY_3 = "tables/oil_xls_20240503162000.xls"
+JUNE = "tables/oil_xls_20240603162000.xls"
+ROWS = [
+    ("A592UFM060F", "Бензин (АИ-92-К5)", "Уфа", 60.0, 3000000.0, 1.0),
+    ("DTZ5ANK060J", "ДТ зимнее", "Ангарск", 120.0, 7200000.0, 2.0),
+]
+
+
+@pytest_asyncio.fixture(scope="function")
+async def partitioned_engine(test_engine):
+    """
+    Пересоздаёт таблицу торгов секционированной по месяцам.
+    """
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP TABLE spimex_trading_results"))
+        await conn.run_sync(create_tables, BaseModel.metadata, "month")
+    yield test_engine
+    async with test_engine.begin() as conn:
+        await conn.execute(
+            text("DROP TABLE IF EXISTS spimex_trading_results_y2024m05_detached")
+        )
+
+
+@pytest.mark.asyncio
+async def test_partitions_created_and_pruned(partitioned_engine, test_sessionmaker):
+    """
+    Тестирует запись в секционированную таблицу и отсечение секций.
+
+    Проверяет, что:
+    - секции по месяцам создаются при записи;
+    - запрос за диапазон дат читает только секции этого диапазона.
+    """
+    async with test_sessionmaker() as session:
+        await save_files([(MAY, ROWS), (JUNE, ROWS)], session, conflict="upsert")
+        partitions = await list_partitions(session)
+
+        query = dynamics_query(date(2024, 5, 1), date(2024, 5, 31), TradingFilter())
+        compiled = query.compile(compile_kwargs={"literal_binds": True})
+        plan = "\n".join(
+            (await session.execute(text(f"EXPLAIN {compiled}"))).scalars().all()
+        )
+
+    assert partitions == {
+        "spimex_trading_results_y2024m05": (date(2024, 5, 1), date(2024, 6, 1)),
+        "spimex_trading_results_y2024m06": (date(2024, 6, 1), date(2024, 7, 1)),
+    }
+    assert "spimex_trading_results_y2024m05" in plan
+    assert "spimex_trading_results_y2024m06" not in plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["truncate", "detach"])
+async def test_replace_clears_whole_partition(
+    partitioned_engine, test_sessionmaker, mode, monkeypatch
+):
+    """
+    Тестирует повторную загрузку дат в режиме replace.
+
+    Проверяет, что:
+    - секция, все даты которой загружаются заново, очищается целиком
+      (при mode="detach" прежние строки остаются в отсоединённой таблице);
+    - строки других секций не затрагиваются.
+    """
+    monkeypatch.setattr("parser.db_writer.DB_PARTITION_CLEAR", mode)
+    async with test_sessionmaker() as session:
+        await save_files([(MAY, ROWS), (JUNE, ROWS)], session, conflict="replace")
+        await save_files([(MAY, ROWS[:1])], session, conflict="replace")
+
+        counts = dict(
+            (
+                await session.execute(
+                    select(SpimexTradingResults.date, func.count())
+                    .group_by(SpimexTradingResults.date)
+                    .order_by(SpimexTradingResults.date)
+                )
+            ).all()
+        )
+        detached = await session.scalar(
+            text("SELECT to_regclass('spimex_trading_results_y2024m05_detached')")
+        )
+
+    assert counts == {date(2024, 5, 2): 1, date(2024, 6, 3): 2}
+    assert (detached is not None) == (mode == "detach")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["copy", "orm"])
+async def test_replace_does_not_block_reads_until_swap(
+    partitioned_engine, test_sessionmaker, mode, monkeypatch
+):
+    """
+    Тестирует, что повторная загрузка секции не блокирует чтение таблицы торгов.
+
+    Проверяет, что:
+    - пока строки пишутся в промежуточную таблицу, другое соединение читает
+      таблицу торгов без ожидания блокировок и видит прежние строки;
+    - после подмены секции видны только новые строки.
+    """
+    reads = []
+
+    async def swap_after_read(conn, staged, *args):
+        async with partitioned_engine.connect() as reader:
+            await reader.execute(text("SET lock_timeout = '200ms'"))
+            reads.append(
+                await reader.scalar(
+                    select(func.count()).select_from(SpimexTradingResults)
+                )
+            )
+        await swap_partitions(conn, staged, *args)
+
+    async with test_sessionmaker() as session:
+        await save_files([(MAY, ROWS), (JUNE, ROWS)], session, mode, "replace")
+        monkeypatch.setattr("parser.db_writer.swap_partitions", swap_after_read)
+        await save_files([(MAY, ROWS[:1])], session, mode, "replace")
+        count = await session.scalar(
+            select(func.count()).select_from(SpimexTradingResults)
+        )
+        partitions = await list_partitions(session)
+
+    assert reads == [4]
+    assert count == 3
+    assert set(partitions) == {
+        "spimex_trading_results_y2024m05",
+        "spimex_trading_results_y2024m06",
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("conflict", ["upsert", "replace"])
+async def test_replace_waits_for_concurrent_writer(
+    partitioned_engine, test_sessionmaker, conflict, monkeypatch
+):
+    """
+    Тестирует две загрузки в одну секцию из разных сессий.
+
+    Проверяет, что:
+    - загрузка другой даты той же секции (например, другой частью догрузки)
+      ждёт фиксации повторной загрузки, а не записывается в подменяемую секцию;
+    - после обеих загрузок в секции есть строки обеих дат.
+    """
+    async def other_writer():
+        async with test_sessionmaker() as other:
+            await save_files([(MAY_3, ROWS)], other, conflict=conflict)
+
+    writers, blocked = [], []
+
+    async def swap_during_write(conn, staged, *args):
+        if not writers:
+            writers.append(asyncio.create_task(other_writer()))
+            await asyncio.sleep(0.5)
+            blocked.append(not writers[0].done())
+        await swap_partitions(conn, staged, *args)
+
+    async with test_sessionmaker() as session:
+        await save_files([(MAY, ROWS)], session, conflict="replace")
+        monkeypatch.setattr("parser.db_writer.swap_partitions", swap_during_write)
+        await save_files([(MAY, ROWS[:1])], session, conflict="replace")
+    await asyncio.wait_for(writers[0], 10)
+
+    async with test_sessionmaker() as session:
+        counts = dict(
+            (
+                await session.execute(
+                    select(SpimexTradingResults.date, func.count())
+                    .group_by(SpimexTradingResults.date)
+                    .order_by(SpimexTradingResults.date)
+                )
+            ).all()
+        )
+
+    assert blocked == [True]
+    assert counts == {date(2024, 5, 2): 1, date(2024, 5, 3): 2}
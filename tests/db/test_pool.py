@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db.database import (DATABASE_URL, DB_QUERY_SECONDS, create_engine,
+                         instrument_engine, wait_for_replica)
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_record_checkout_wait():
+    """
+    Тестирует счётчики пула соединений движка из create_engine.
+
+    Проверяет, что:
+    - учитываются все выдачи соединений;
+    - ожидание свободного соединения в исчерпанном пуле попадает в максимум;
+    - состояние пула отражает выданные соединения.
+    """
+    assert DATABASE_URL.endswith("_test")
+    engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    pool = engine.sync_engine.pool
+
+    async def hold(seconds):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await asyncio.sleep(seconds)
+
+    try:
+        first = asyncio.create_task(hold(0.2))
+        await asyncio.sleep(0.05)
+        status = pool.status_dict()
+        await asyncio.gather(first, hold(0))
+    finally:
+        await engine.dispose()
+
+    assert (status["checked_out"], status["utilization"]) == (1, 1.0)
+    assert pool.metrics.checkouts == 2
+    assert pool.metrics.max_wait_seconds >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_wait_for_replica_on_primary():
+    """
+    Тестирует ожидание реплики, когда чтение идёт с основной БД.
+
+    Проверяет, что сервер, который не является репликой, сразу считается догнавшим
+    (запрос позиций журнала выполняется без ошибок).
+    """
+    engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    try:
+        assert await wait_for_replica(engine, engine, timeout=0)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_query_timing_survives_failed_query():
+    """
+    Тестирует замер времени запросов после запроса с ошибкой.
+
+    Проверяет, что запрос с ошибкой не оставляет в соединении отметку начала,
+    а следующий запрос замеряется от своего начала.
+    """
+    engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    instrument_engine(engine, "failed_query_test")
+    try:
+        async with engine.connect() as conn:
+            with pytest.raises(DBAPIError):
+                await conn.execute(text("SELECT 1 / 0"))
+            await conn.rollback()
+            await asyncio.sleep(0.3)
+            await conn.execute(text("SELECT 1"))
+            info = conn.info
+    finally:
+        await engine.dispose()
+
+    _, count, total = DB_QUERY_SECONDS.values[(("engine", "failed_query_test"),)]
+    assert "query_start" not in info
+    assert count == 1
+    assert total < 0.3
@@ -0,0 +1,86 @@
+import os
+from datetime import date
+from parser.backfill import backfill, load_checkpoints, parse_shard
+from parser.sync_manifest import SyncManifest, report_name
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.spimex_stub import start_server
+from benchmarks.synthetic_xls import generate_reports
+from db.model import SpimexIngestedFile, SpimexTradingResults
+
+
+def test_parse_shard():
+    """
+    Тестирует разбор номера части "i/n".
+    """
+    assert parse_shard("1/4") == (1, 4)
+    for value in ("4/4", "-1/2", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+@pytest.mark.asyncio
+async def test_backfill_shards_and_resumes(tmp_path, test_sessionmaker):
+    """
+    Тестирует догрузку диапазона дат двумя частями с локальной замены сайта Spimex.
+
+    Проверяет, что:
+    - скачиваются и загружаются только отчёты из диапазона дат;
+    - части не пересекаются и вместе покрывают весь диапазон;
+    - для каждого загруженного отчёта записана контрольная точка;
+    - повторный запуск ничего не загружает, а изменённый файл загружается заново;
+    - обычная синхронизация по контрольным точкам не загружает отчёты догрузки повторно.
+    """
+    source = tmp_path / "source"
+    generate_reports(str(source), date(2024, 4, 29), date(2024, 5, 10), rows=5)
+    folder = str(tmp_path / "tables")
+    start, end = date(2024, 5, 1), date(2024, 5, 8)
+
+    runner, url = await start_server(str(source), page_size=3)
+    try:
+        saved = []
+        for shard in range(2):
+            saved.append(
+                await backfill(
+                    start, end, shard, 2, test_sessionmaker, url=url, folder=folder
+                )
+            )
+        resumed = await backfill(
+            start, end, 0, 1, test_sessionmaker, url=url, folder=folder
+        )
+    finally:
+        await runner.cleanup()
+
+    downloaded = sorted(name for name in os.listdir(folder) if name.endswith(".xls"))
+    assert len(downloaded) == 6  # торговые дни с 1 по 8 мая
+    assert all("20240501" <= name[8:16] <= "20240508" for name in downloaded)
+    assert not set(saved[0]) & set(saved[1])
+    assert len(saved[0]) + len(saved[1]) == 6
+    assert resumed == []
+
+    async with test_sessionmaker() as session:
+        checkpoints = await session.scalar(
+            select(func.count()).select_from(SpimexIngestedFile)
+        )
+        dates = await session.scalar(
+            select(func.count(SpimexTradingResults.date.distinct()))
+        )
+    assert checkpoints == dates == 6
+
+    manifest = SyncManifest(str(tmp_path / "manifest.json"))
+    manifest.adopt_local_files(folder)
+    async with test_sessionmaker() as session:
+        done = await load_checkpoints(
+            session, [report_name(path) for path in manifest.pending()]
+        )
+    assert manifest.adopt_checkpoints(done) == 6
+    assert manifest.pending() == []
+
+    with open(os.path.join(folder, downloaded[0]), "ab") as f:
+        f.write(b"\0")
+    resumed = await backfill(
+        start, end, 0, 1, test_sessionmaker, folder=folder, download=False
+    )
+    assert [os.path.basename(path) for path in resumed] == [downloaded[0]]
@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from parser.daemon import next_window, poll_trading_day, warm_up, warmup_urls
+
+import pytest
+from aioresponses import aioresponses
+
+
+def test_next_window_skips_finished_windows_and_weekends():
+    """
+    Тестирует выбор ближайшего окна опроса.
+
+    Проверяет, что:
+    - до конца окна текущего дня выбирается текущий день;
+    - после конца окна в пятницу выбирается понедельник.
+    """
+    options = {"publish_time": "14:11", "lead": 10, "length": 60}
+
+    day, start, end = next_window(datetime(2024, 5, 2, 14, 30), **options)
+    assert day == date(2024, 5, 2)
+    assert start == datetime(2024, 5, 2, 14, 1)
+    assert end == datetime(2024, 5, 2, 15, 11)
+
+    day, start, _ = next_window(datetime(2024, 5, 3, 16, 0), **options)
+    assert day == date(2024, 5, 6)
+    assert start == datetime(2024, 5, 6, 14, 1)
+
+
+@pytest.mark.asyncio
+async def test_poll_trading_day_until_report_or_deadline():
+    """
+    Тестирует опрос сайта до появления отчёта.
+
+    Проверяет, что:
+    - ошибка одного опроса не прерывает опрос;
+    - опрос заканчивается, как только отчёт за дату загружен;
+    - после конца окна опрос прекращается без отчёта.
+    """
+    day = date(2024, 5, 2)
+    results = iter([([], False), ConnectionError("сайт недоступен"), (["f"], True)])
+
+    async def ingest(_):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    deadline = datetime(2024, 5, 2, 15, 0)
+    saved = await poll_trading_day(
+        day, deadline, ingest, interval=0, now=lambda: datetime(2024, 5, 2, 14, 0)
+    )
+    assert saved == ["f"]
+
+    async def missing(_):
+        return [], False
+
+    saved = await poll_trading_day(
+        day, deadline, missing, interval=0, now=lambda: datetime(2024, 5, 2, 15, 0)
+    )
+    assert saved == []
+
+
+@pytest.mark.asyncio
+async def test_warm_up_requests_popular_urls():
+    """
+    Тестирует прогрев кэша API.
+
+    Проверяет, что:
+    - к стандартным адресам добавляются торги за новую дату и частые запросы без повторов;
+    - каждый адрес запрашивается у API, а ошибки API не прерывают прогрев.
+    """
+    urls = warmup_urls(
+        date(2024, 5, 2),
+        ["/tradings/trading-results", "/tradings/aggregates?start_date=2024-05-01"],
+    )
+    assert urls == [
+        "/tradings/last-trading-dates",
+        "/tradings/trading-results",
+        "/tradings/dynamics?end_date=2024-05-02&start_date=2024-05-02",
+        "/tradings/aggregates?start_date=2024-05-01",
+    ]
+
+    with aioresponses() as mocked:
+        for url in urls[:-1]:
+            mocked.get(f"http://api{url}", body="[]")
+        mocked.get(f"http://api{urls[-1]}", status=500)
+        warmed = await warm_up(urls, "http://api/")
+
+    assert warmed == 3
+    assert len(mocked.requests) == 4
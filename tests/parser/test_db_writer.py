@@ -0,0 +1,156 @@
+from datetime import date
+from parser.db_writer import save_files
+
+import pytest
+from sqlalchemy import select
+
+from app.services import trading_select
+from db.dimensions import dimension_cache
+from db.model import (SpimexDailyRollup, SpimexDeliveryBasis, SpimexProduct,
+                      SpimexTradingDay, SpimexTradingResults)
+
+PATH = "tables/oil_xls_20240502162000.xls"
+ROWS = [
+    ("A592UFM060F", "Бензин (АИ-92-К5)", "Уфа", 60.0, 3000000.0, 1.0),
+    ("DTZ5ANK060J", "ДТ зимнее", "Ангарск", 120.0, 7200000.0, 2.0),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["copy", "orm"])
+@pytest.mark.parametrize("conflict", ["upsert", "replace"])
+async def test_save_files_replaces_trading_date(db_session, mode, conflict):
+    """
+    Тестирует запись строк файла в БД через COPY и через ORM.
+
+    Проверяет, что:
+    - строки записаны с разобранными идентификаторами и датой из имени файла;
+    - повторная запись того же файла заменяет строки за дату, а не дублирует их.
+    """
+    await save_files([(PATH, ROWS)], db_session, mode=mode, conflict=conflict)
+    await save_files([(PATH, ROWS[:1])], db_session, mode=mode, conflict=conflict)
+
+    result = await db_session.execute(trading_select())
+    entries = result.all()
+
+    assert len(entries) == 1
+    assert entries[0].oil_id == "A592"
+    assert entries[0].delivery_basis_id == "UFM"
+    assert entries[0].delivery_type_id == "F"
+    assert (entries[0].volume, entries[0].total, entries[0].count) == (60, 3000000, 1)
+    assert entries[0].date == date(2024, 5, 2)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["copy", "orm"])
+async def test_save_files_upsert_updates_rows_in_place(db_session, mode):
+    """
+    Тестирует, что в режиме upsert существующая строка обновляется, а не пересоздаётся.
+    """
+    await save_files([(PATH, ROWS)], db_session, mode=mode, conflict="upsert")
+    first = await db_session.scalar(
+        trading_select()
+        .with_only_columns(SpimexTradingResults.id)
+        .where(SpimexProduct.exchange_product_id == "A592UFM060F")
+    )
+
+    changed = [(*ROWS[0][:5], 4.0), ROWS[1]]
+    await save_files([(PATH, changed)], db_session, mode=mode, conflict="upsert")
+    db_session.expire_all()
+    entries = (
+        await db_session.scalars(
+            select(SpimexTradingResults).order_by(SpimexTradingResults.id)
+        )
+    ).all()
+
+    assert len(entries) == 2
+    assert (entries[0].id, entries[0].count) == (first, 4)
+
+
+@pytest.mark.asyncio
+async def test_save_files_maintains_dimensions(db_session):
+    """
+    Тестирует таблицы измерений инструментов и базисов поставки.
+
+    Проверяет, что:
+    - инструменты и базисы записываются один раз, строки торгов ссылаются на них;
+    - после фиксации ключи берутся из кэша сессии;
+    - изменённое название инструмента обновляется без нового ключа.
+    """
+    await save_files([(PATH, ROWS)], db_session)
+    cache = dimension_cache(db_session)
+    keys = {code: key for code, (key, _) in cache.products.items()}
+
+    renamed = [(ROWS[0][0], "Бензин (АИ-92)", *ROWS[0][2:]), ROWS[1]]
+    await save_files([(PATH, renamed)], db_session)
+    products = (
+        await db_session.execute(
+            select(
+                SpimexProduct.exchange_product_id,
+                SpimexProduct.id,
+                SpimexProduct.exchange_product_name,
+            ).order_by(SpimexProduct.exchange_product_id)
+        )
+    ).all()
+    bases = (
+        await db_session.scalars(
+            select(SpimexDeliveryBasis.delivery_basis_name).order_by(
+                SpimexDeliveryBasis.delivery_basis_id
+            )
+        )
+    ).all()
+    product_keys = (
+        await db_session.scalars(
+            select(SpimexTradingResults.product_key).order_by(
+                SpimexTradingResults.product_key
+            )
+        )
+    ).all()
+
+    assert keys.keys() == {"A592UFM060F", "DTZ5ANK060J"}
+    assert products == [
+        ("A592UFM060F", keys["A592UFM060F"], "Бензин (АИ-92)"),
+        ("DTZ5ANK060J", keys["DTZ5ANK060J"], "ДТ зимнее"),
+    ]
+    assert bases == ["Ангарск", "Уфа"]
+    assert product_keys == sorted(keys.values())
+    assert cache.products["A592UFM060F"][1][0] == "Бензин (АИ-92)"
+
+
+@pytest.mark.asyncio
+async def test_save_files_refreshes_daily_rollups(db_session):
+    """
+    Тестирует, что после записи файла дневные итоги за его дату пересчитаны.
+    """
+    await save_files([(PATH, ROWS)], db_session)
+    await save_files([(PATH, ROWS[:1])], db_session)
+
+    result = await db_session.execute(
+        select(
+            SpimexDailyRollup.dimension,
+            SpimexDailyRollup.value,
+            SpimexDailyRollup.volume,
+            SpimexDailyRollup.count,
+        ).order_by(SpimexDailyRollup.dimension)
+    )
+
+    assert result.all() == [
+        ("delivery_basis_id", "UFM", 60, 1),
+        ("oil_id", "A592", 60, 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_save_files_maintains_trading_days(db_session):
+    """
+    Тестирует, что дата попадает в список торговых дней при загрузке строк
+    и убирается из него, когда строк за дату не остаётся.
+    """
+    await save_files([(PATH, ROWS)], db_session)
+    days = (await db_session.scalars(select(SpimexTradingDay.date))).all()
+
+    await save_files([(PATH, [])], db_session)
+    days_after_empty = (await db_session.scalars(select(SpimexTradingDay.date))).all()
+
+    assert days == [date(2024, 5, 2)]
+    assert days_after_empty == []
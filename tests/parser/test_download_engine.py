@@ -0,0 +1,74 @@
+import hashlib
+from parser.download_engine import (STATUS_DOWNLOADED, STATUS_FAILED,
+                                    STATUS_NOT_MODIFIED, DownloadEngine)
+
+import pytest
+from aioresponses import aioresponses
+
+URL = "https://spimex.com/upload/reports/oil_xls/oil_xls_20240502162000"
+
+
+@pytest.mark.asyncio
+async def test_download_retries_transient_errors(tmp_path):
+    """
+    Тестирует повтор загрузки после временной ошибки сервера.
+
+    Проверяет, что:
+    - после ответа 503 запрос повторяется;
+    - файл записан целиком, временный файл удалён;
+    - сводка учитывает файл, байты и повтор.
+    """
+    filepath = tmp_path / "report.xls"
+    engine = DownloadEngine(retries=2, backoff=0, chunk_size=4)
+    with aioresponses() as mocked:
+        mocked.get(URL, status=503)
+        mocked.get(URL, body=b"0123456789")
+
+        async with engine.create_session() as session:
+            result = await engine.download(session, URL, str(filepath))
+
+    assert result.status == STATUS_DOWNLOADED
+    assert result.sha256 == hashlib.sha256(b"0123456789").hexdigest()
+    assert filepath.read_bytes() == b"0123456789"
+    assert not (tmp_path / "report.xls.part").exists()
+    assert (engine.stats.files, engine.stats.bytes) == (1, 10)
+    assert (engine.stats.retries, engine.stats.failures) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_download_does_not_retry_client_errors(tmp_path):
+    """
+    Тестирует, что ошибка 404 не повторяется и учитывается как неудачная загрузка.
+    """
+    filepath = tmp_path / "report.xls"
+    engine = DownloadEngine(retries=3, backoff=0)
+    with aioresponses() as mocked:
+        mocked.get(URL, status=404)
+
+        async with engine.create_session() as session:
+            result = await engine.download(session, URL, str(filepath))
+
+    assert result.status == STATUS_FAILED
+    assert not filepath.exists()
+    assert (engine.stats.retries, engine.stats.failures) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_download_conditional_request_not_modified(tmp_path):
+    """
+    Тестирует условный запрос: при ответе 304 файл не перезаписывается.
+    """
+    filepath = tmp_path / "report.xls"
+    filepath.write_bytes(b"old")
+    engine = DownloadEngine(backoff=0)
+    with aioresponses() as mocked:
+        mocked.get(URL, status=304)
+
+        async with engine.create_session() as session:
+            result = await engine.download(
+                session, URL, str(filepath), headers={"If-None-Match": '"v1"'}
+            )
+
+    assert result.status == STATUS_NOT_MODIFIED
+    assert filepath.read_bytes() == b"old"
+    assert (engine.stats.files, engine.stats.not_modified) == (0, 1)
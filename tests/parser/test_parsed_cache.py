@@ -0,0 +1,50 @@
+import os
+from datetime import date
+from parser import parsed_cache
+from parser.spimex_parser import prepare_file
+
+from benchmarks.synthetic_xls import report_filename, write_report
+
+
+def test_prepare_file_uses_parsed_cache(tmp_path, monkeypatch):
+    """
+    Тестирует кэш разобранных файлов.
+
+    Проверяет, что:
+    - при первом разборе результат сохраняется в кэш рядом с файлом;
+    - повторный разбор того же файла берёт результат из кэша без xlrd
+      и совпадает с исходным, включая отклонённые строки;
+    - после изменения файла кэш не используется.
+    """
+    trading_date = date(2024, 5, 2)
+    path = str(tmp_path / report_filename(trading_date))
+    write_report(path, trading_date, rows=20, seed=1)
+
+    first, stats = prepare_file(path)
+    assert stats["cache"] == "miss"
+    assert len(os.listdir(tmp_path / parsed_cache.PARSED_CACHE_DIR)) == 1
+
+    def fail(*args):
+        raise AssertionError("файл разобран повторно")
+
+    monkeypatch.setattr("parser.spimex_parser.parse_file_measured", fail)
+    second, stats = prepare_file(path)
+    assert stats["cache"] == "hit"
+    assert second.records() == first.records()
+    assert second.rejects == first.rejects
+
+    monkeypatch.undo()
+    write_report(path, trading_date, rows=10, seed=2)
+    third, stats = prepare_file(path)
+    assert stats["cache"] == "miss"
+    assert len(third) != len(first)
+
+
+def test_load_ignores_corrupted_cache(tmp_path):
+    """
+    Тестирует, что повреждённый файл кэша считается промахом.
+    """
+    path = tmp_path / "broken.bin"
+    path.write_bytes(parsed_cache.MAGIC + b"not zlib")
+    assert parsed_cache.load(str(path), date(2024, 5, 2)) is None
+    assert parsed_cache.load(str(tmp_path / "missing.bin"), date(2024, 5, 2)) is None
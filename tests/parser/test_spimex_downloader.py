@@ -0,0 +1,102 @@
+import os
+import re
+from datetime import date
+from parser.spimex_downloader import URLManager
+from parser.sync_manifest import SyncManifest
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+from benchmarks.spimex_stub import start_server
+from benchmarks.synthetic_xls import generate_reports
+from config import SPIMEX_URL
+
+
+def page_body(*stamps):
+    """
+    Формирует HTML-страницу со ссылками на отчёты с заданными метками времени.
+    """
+    return "".join(
+        f'<a href="/upload/reports/oil_xls/oil_xls_{stamp}">xls</a>' for stamp in stamps
+    )
+
+
+@pytest.mark.asyncio
+async def test_iter_report_links_stops_at_first_empty_page():
+    """
+    Тестирует постраничный обход окном страниц.
+
+    Проверяет, что:
+    - ссылки отдаются в порядке страниц;
+    - обход останавливается на первой пустой странице;
+    - ссылки со страниц после пустой не попадают в результат.
+    """
+    manager = URLManager(page_window=4, page_concurrency=2)
+    with aioresponses() as mocked:
+        mocked.get(f"{SPIMEX_URL}?page=page-1", body=page_body("20240502162000"))
+        mocked.get(f"{SPIMEX_URL}?page=page-2", body=page_body("20240501162000"))
+        mocked.get(f"{SPIMEX_URL}?page=page-3", body="")
+        mocked.get(f"{SPIMEX_URL}?page=page-4", body=page_body("20240430162000"))
+        mocked.get(re.compile(r".*page=page-\d+$"), body="", repeat=True)
+
+        async with aiohttp.ClientSession() as session:
+            hrefs = [href async for href in manager.iter_report_links(session)]
+
+    assert [href[-14:] for href in hrefs] == ["20240502162000", "20240501162000"]
+    assert manager.page_number == 2
+    assert manager.tables_hrefs == hrefs
+
+
+@pytest.mark.asyncio
+async def test_iter_report_links_stops_at_known_reports(tmp_path):
+    """
+    Тестирует остановку обхода на странице с уже известным отчётом.
+
+    Проверяет, что ссылки с этой страницы ещё отдаются (для условной загрузки),
+    а следующие страницы не обходятся.
+    """
+    manifest = SyncManifest(str(tmp_path / "manifest.json"))
+    manifest.entries["oil_xls_20240501162000"] = {"status": "ingested"}
+    manager = URLManager(page_window=1, manifest=manifest)
+    with aioresponses() as mocked:
+        mocked.get(f"{SPIMEX_URL}?page=page-1", body=page_body("20240503162000"))
+        mocked.get(
+            f"{SPIMEX_URL}?page=page-2",
+            body=page_body("20240502162000", "20240501162000"),
+        )
+        mocked.get(f"{SPIMEX_URL}?page=page-3", body=page_body("20240430162000"))
+
+        async with aiohttp.ClientSession() as session:
+            hrefs = [href async for href in manager.iter_report_links(session)]
+
+    assert [href[-14:] for href in hrefs] == [
+        "20240503162000",
+        "20240502162000",
+        "20240501162000",
+    ]
+    assert manager.page_number == 2
+
+
+@pytest.mark.asyncio
+async def test_download_xls_files_from_local_listing(tmp_path):
+    """
+    Тестирует скачивание отчётов с локальной замены сайта Spimex.
+
+    Проверяет, что адрес списка и папка для файлов задаются параметрами
+    и что скачиваются отчёты со всех страниц списка.
+    """
+    source = tmp_path / "source"
+    paths = generate_reports(str(source), date(2024, 4, 29), date(2024, 5, 3), rows=5)
+    runner, url = await start_server(str(source), page_size=2)
+    try:
+        manager = URLManager(url=url, folder=str(tmp_path / "tables"))
+        stats = await manager.download_xls_files()
+    finally:
+        await runner.cleanup()
+
+    assert manager.page_number == 3
+    assert stats.files == len(paths) == 5
+    assert sorted(os.listdir(tmp_path / "tables")) == sorted(
+        os.path.basename(path) for path in paths
+    )
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import date
+from parser.spimex_parser import parse_file, process_files
+from time import perf_counter
+
+import pytest
+import xlwt
+
+from benchmarks.synthetic_xls import (generate_reports, report_filename,
+                                      write_report)
+from config import SPIMEX_TABLE_NAME
+
+
+def test_fast_reader_matches_full_reader(tmp_path):
+    """
+    Тестирует быстрый способ чтения XLS-файла.
+
+    Проверяет, что:
+    - строки совпадают с результатом исходного способа;
+    - строки без договоров и таблицы в других единицах измерения пропущены.
+    """
+    path = str(tmp_path / report_filename(date(2024, 5, 2)))
+    write_report(path, date(2024, 5, 2), rows=50)
+
+    rows = parse_file(path, reader="fast")
+
+    assert rows == parse_file(path, reader="full")
+    assert 0 < len(rows) < 50
+    assert all(len(row) == 6 and row[5] > 0 for row in rows)
+
+
+def test_fast_reader_falls_back_to_full_scan(tmp_path):
+    """
+    Тестирует чтение файла, в котором название таблицы стоит не в ожидаемом столбце.
+    """
+    path = str(tmp_path / "oil_xls_20240502162000.xls")
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("TRADE_SUMMARY")
+    sheet.write(0, 0, SPIMEX_TABLE_NAME)
+    sheet.write(1, 14, "Количество")
+    for col, value in enumerate(["", "A592UFM060F", "Бензин", "Уфа", 60, 3000000, -5]):
+        sheet.write(2, col, value)
+    sheet.write(2, 14, 1)
+    sheet.write(3, 0, "Итого:")
+    workbook.save(path)
+
+    assert parse_file(path, reader="fast") == [
+        ("A592UFM060F", "Бензин", "Уфа", 60.0, 3000000.0, 1.0)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_does_not_block_event_loop(tmp_path):
+    """
+    Тестирует отмену обработки файлов во время разбора.
+
+    Проверяет, что, пока пул процессов дожидается начатого разбора,
+    цикл событий не блокируется.
+    """
+    paths = generate_reports(
+        str(tmp_path), date(2024, 5, 2), date(2024, 5, 2), rows=20000
+    )
+    task = asyncio.create_task(process_files(paths, None, workers=1))
+    await asyncio.sleep(0.1)
+    task.cancel()
+
+    start = perf_counter()
+    await asyncio.sleep(0.01)
+    blocked = perf_counter() - start
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert blocked < 0.2
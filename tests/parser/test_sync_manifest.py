@@ -0,0 +1,64 @@
+from parser.download_engine import (STATUS_DOWNLOADED, STATUS_NOT_MODIFIED,
+                                    DownloadResult)
+from parser.sync_manifest import SyncManifest
+
+URL = "https://spimex.com/upload/reports/oil_xls/oil_xls_20240502162000"
+NAME = "oil_xls_20240502162000"
+
+
+def downloaded(path, sha256):
+    """
+    Возвращает результат успешной загрузки отчёта с заданным хешем.
+    """
+    return DownloadResult(
+        url=URL, path=path, status=STATUS_DOWNLOADED, size=3, sha256=sha256
+    )
+
+
+def test_only_new_or_changed_files_are_pending(tmp_path):
+    """
+    Тестирует очередь файлов на загрузку в БД.
+
+    Проверяет, что:
+    - новый файл попадает в очередь, а после загрузки в БД — нет;
+    - файл с тем же содержимым или ответом 304 в очередь не возвращается;
+    - изменённый файл снова попадает в очередь;
+    - манифест сохраняется и читается с диска.
+    """
+    path = str(tmp_path / f"{NAME}.xls")
+    manifest = SyncManifest(str(tmp_path / "manifest.json"))
+
+    manifest.record_download(NAME, downloaded(path, "aaa"))
+    assert manifest.pending() == [path]
+    assert manifest.entries[NAME]["date"] == "2024-05-02"
+
+    manifest.mark_ingested(path)
+    manifest.record_download(NAME, downloaded(path, "aaa"))
+    manifest.record_download(
+        NAME, DownloadResult(url=URL, path=path, status=STATUS_NOT_MODIFIED)
+    )
+    assert manifest.pending() == []
+    assert manifest.is_known(NAME)
+
+    manifest.record_download(NAME, downloaded(path, "bbb"))
+    manifest.save()
+    assert SyncManifest.load(manifest.path).pending() == [path]
+
+
+def test_checkpointed_files_are_not_pending(tmp_path):
+    """
+    Тестирует учёт контрольных точек догрузки в очереди файлов.
+
+    Проверяет, что файл, загруженный догрузкой с тем же содержимым, из очереди
+    уходит, а с другим содержимым — остаётся.
+    """
+    path = str(tmp_path / f"{NAME}.xls")
+    manifest = SyncManifest(str(tmp_path / "manifest.json"))
+    manifest.record_download(NAME, downloaded(path, "bbb"))
+
+    assert manifest.adopt_checkpoints({NAME: "aaa"}) == 0
+    assert manifest.pending() == [path]
+
+    assert manifest.adopt_checkpoints({NAME: "bbb"}) == 1
+    assert manifest.pending() == []
+    assert manifest.has_ingested("2024-05-02")
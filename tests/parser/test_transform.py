@@ -0,0 +1,65 @@
+from datetime import date
+from parser.transform import transform_rows
+
+
+def test_transform_rows_builds_columns_and_rejects():
+    """
+    Тестирует преобразование строк файла в столбцы.
+
+    Проверяет, что:
+    - коды вида топлива, базиса и типа поставки выделяются из кода инструмента;
+    - числа разбираются из чисел и строк с пробелами, дата одна на весь файл;
+    - строки без договоров отбрасываются без отклонения;
+    - некорректные строки попадают в список отклонённых с причиной.
+    """
+    rows = [
+        ("A592UFM060F", "Бензин", "Уфа", "1 200", "3 000 000", 1.0),
+        ("A592UFM061F", "Бензин", "Уфа", 60.0, 3000000.0, 0.0),
+        ("A592UFM062F", "Бензин", "Уфа", 60.5, 3000000.0, 1.0),
+        ("", "Бензин", "Уфа", 60.0, 3000000.0, 1.0),
+        ("DTZ5ANK060J", "ДТ", "Ангарск", 120.0, 7200000.0, 2.0),
+        ("DTZ5ANK061J", "ДТ", "Ангарск", 120.0, "н/д", 2.0),
+    ]
+
+    result = transform_rows(rows, date(2024, 5, 2))
+
+    assert len(result) == 2
+    assert result.columns["oil_id"] == ["A592", "DTZ5"]
+    assert result.columns["delivery_basis_id"] == ["UFM", "ANK"]
+    assert result.columns["delivery_type_id"] == ["F", "J"]
+    assert result.records()[0] == (
+        "A592UFM060F",
+        "Бензин",
+        "A592",
+        "UFM",
+        "Уфа",
+        "F",
+        1200,
+        3000000,
+        1,
+        date(2024, 5, 2),
+    )
+    assert [(index, reason) for index, _, reason in result.rejects] == [
+        (2, "некорректный объём"),
+        (3, "некорректный код инструмента"),
+        (5, "некорректная сумма"),
+    ]
+
+
+def test_transform_rows_rejects_invalid_amounts():
+    """
+    Тестирует проверку объёма и суммы договоров при разборе строк.
+
+    Проверяет, что строки с дробным, отрицательным или нечисловым объёмом
+    отбрасываются, а строковые числа с пробелами принимаются.
+    """
+    rows = [
+        ("A592UFM060F", "Бензин", "Уфа", "1 200", "3 000 000", 1.0),
+        ("A592UFM061F", "Бензин", "Уфа", 60.5, 3000000.0, 1.0),
+        ("A592UFM062F", "Бензин", "Уфа", -60.0, 3000000.0, 1.0),
+        ("A592UFM063F", "Бензин", "Уфа", 60.0, "н/д", 1.0),
+    ]
+
+    records = transform_rows(rows, date(2024, 5, 2)).records()
+
+    assert [(r[0], r[6], r[7]) for r in records] == [("A592UFM060F", 1200, 3000000)]
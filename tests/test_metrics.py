@@ -0,0 +1,43 @@
+from metrics import Registry
+
+
+def test_registry_render_and_snapshot():
+    """
+    Тестирует вывод метрик в формате Prometheus и в виде словаря.
+
+    Проверяет, что:
+    - счётчик и показатель выводятся с метками и значениями;
+    - гистограмма выводит накопленные корзины, +Inf, сумму и количество;
+    - метрики сборщиков попадают в вывод;
+    - snapshot содержит только метрики со значениями.
+    """
+    registry = Registry()
+    rows = registry.counter("rows_total", "Строки")
+    rows.inc(3, mode="copy")
+    rows.inc(mode="copy")
+    registry.gauge("empty_gauge", "Без значений")
+    seconds = registry.histogram("write_seconds", "Время", buckets=(0.1, 1.0))
+    seconds.observe(0.05)
+    seconds.observe(0.5)
+
+    assert registry.counter("rows_total", "Строки") is rows
+
+    collected = Registry().gauge("collected", "Из сборщика")
+    collected.set(7)
+    registry.add_collector(lambda: [collected])
+
+    text = registry.render()
+    assert "# TYPE rows_total counter" in text
+    assert 'rows_total{mode="copy"} 4' in text
+    assert 'write_seconds_bucket{le="0.1"} 1' in text
+    assert 'write_seconds_bucket{le="1.0"} 2' in text
+    assert 'write_seconds_bucket{le="+Inf"} 2' in text
+    assert "write_seconds_sum 0.55" in text
+    assert "write_seconds_count 2" in text
+    assert "collected 7" in text
+
+    snapshot = registry.snapshot()
+    assert "empty_gauge" not in snapshot
+    assert snapshot["rows_total"] == [
+        {"name": "rows_total", "labels": {"mode": "copy"}, "value": 4}
+    ]